@@ -0,0 +1,407 @@
+"""
+Image analysis with Gemini, independent of the Streamlit UI.
+
+Holds the model call with its caches and the TDEE estimate, so both app.py
+and the headless batch CLI (cli.py) use the same logic; the prompt comes from
+prompts.py. The model answers in JSON (see meal_schema.py), parsed once into
+MealAnalysis records.
+
+The pipeline has two stages: the vision call sees only the image and prompt,
+so it is cached by image and reused across users; personalize.py then applies
+the user's profile locally.
+"""
+import functools
+import itertools
+import logging
+import os
+import re
+import time
+from contextlib import nullcontext
+
+from PIL import Image
+
+from batch import TokenBucket
+from clients import get_registry
+from image_fingerprint import NearDuplicateIndex
+from image_preprocess import PreparedImage
+from meal_schema import RESPONSE_SCHEMA, MealAnalysis, parse_meal, render_markdown
+from personalize import personalize
+from prompts import get_prompt, get_token_meter, usage_counts
+from resilience import RetryPolicy, call_with_retries, get_breaker, get_single_flight
+from result_cache import ResultCache, image_digest, make_key
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Model used for image analysis. It is part of the result cache key, with the
+# version (a hash) of the vision prompt in use, see prompts.py.
+MODEL_ID = 'gemini-1.5-flash'
+# Ask for JSON that matches the meal schema instead of free-form markdown
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": RESPONSE_SCHEMA}
+
+# User profile arguments, in the positional order used by analyze_meal() and format_analysis()
+PROFILE_FIELDS = (
+    "name", "age", "weight", "height", "activity_level", "dietary_preference",
+    "fitness_goal", "tdee", "has_bp", "has_sugar", "weather",
+)
+
+# Result cache settings (see result_cache.py)
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(".cache", "results.sqlite3"))
+RESULT_CACHE_TTL_HOURS = float(os.getenv("RESULT_CACHE_TTL_HOURS", "168"))
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "64"))
+# Max Hamming distance (out of 64 bits) for reusing the analysis of a near-duplicate image; 0 disables it
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "6"))
+NEAR_DUPLICATE_HASH = os.getenv("NEAR_DUPLICATE_HASH", "dhash")
+
+# Image preprocessing before upload (see image_preprocess.py)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1536"))
+IMAGE_MAX_KB = int(os.getenv("IMAGE_MAX_KB", "512"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG")
+
+# Retries of transient API errors (see resilience.py for the RETRY_* and BREAKER_* settings)
+RETRY_POLICY = RetryPolicy()
+
+# Batch mode: concurrent model calls and the shared request quota (requests per minute)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_RATE_PER_MINUTE = float(os.getenv("BATCH_RATE_PER_MINUTE", "15"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_result_cache():
+    """Process-wide analysis cache, shared by every Streamlit session and CLI thread."""
+    return ResultCache(
+        RESULT_CACHE_PATH,
+        ttl_seconds=RESULT_CACHE_TTL_HOURS * 3600,
+        max_disk_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_near_duplicate_index():
+    """Perceptual fingerprints of analyzed images, stored alongside the result cache."""
+    return NearDuplicateIndex(RESULT_CACHE_PATH, hash_name=NEAR_DUPLICATE_HASH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_rate_limiter():
+    """Token bucket shared by all sessions, since the API quota is per key."""
+    return TokenBucket(BATCH_RATE_PER_MINUTE / 60, capacity=BATCH_MAX_CONCURRENCY)
+
+
+class InvalidImageError(ValueError):
+    """The image passed for analysis is neither a PreparedImage nor a PIL Image."""
+
+
+def _report_error(on_error, message, exc_info=False):
+    """Logs an error and forwards it to the caller's handler (st.error in the app)."""
+    logger.error(message, exc_info=exc_info)
+    if on_error is not None:
+        on_error(message)
+
+
+def _prepare_request(image_input, use_cache):
+    """
+    Builds the model image, picks the vision prompt and looks up cached answers
+    for the vision stage. The prompt carries no user details, so answers are
+    shared by all users. Returns (model_image, prompt, cached_text, remember,
+    cache_key) where remember(text) stores a fresh model answer in the caches
+    under cache_key. Raises InvalidImageError on invalid input.
+    """
+    # Accept a preprocessed image (sent as its encoded bytes) or a PIL Image
+    if isinstance(image_input, PreparedImage):
+        pixels, model_image = image_input.image, image_input.as_blob()
+    elif isinstance(image_input, Image.Image):
+        pixels, model_image = image_input, image_input
+    else:
+        raise InvalidImageError("Invalid image input provided to Gemini.")
+    prompt = get_prompt("vision")
+    with tracing.span("analysis.prepare", prompt_version=prompt.version) as span:
+        cached_text, remember, cache_key = _lookup(pixels, prompt, use_cache)
+        span.set(cached=cached_text is not None)
+    return model_image, prompt, cached_text, remember, cache_key
+
+
+def _lookup(pixels, prompt, use_cache):
+    """Cache and near-duplicate lookup for _prepare_request(). Returns (cached_text, remember, cache_key)."""
+    # Look up a previous answer for the same image and prompt
+    cache = get_result_cache()
+    digest = image_digest(pixels)
+    cache_key = make_key(digest, MODEL_ID, prompt.version)
+    cached_text = cache.get(cache_key) if use_cache else None
+
+    # Otherwise reuse the analysis of a near-duplicate (re-saved, cropped, screenshotted) image
+    near_duplicates = get_near_duplicate_index()
+    fingerprint = near_duplicates.fingerprint(pixels)
+    if cached_text is None and use_cache and NEAR_DUPLICATE_MAX_DISTANCE > 0:
+        for similar_digest in near_duplicates.search(fingerprint, NEAR_DUPLICATE_MAX_DISTANCE):
+            if similar_digest == digest:
+                continue
+            cached_text = cache.get(make_key(similar_digest, MODEL_ID, prompt.version))
+            if cached_text is not None:
+                cache.set(cache_key, cached_text)
+                break
+
+    def remember(response_text):
+        cache.set(cache_key, response_text)
+        near_duplicates.add(fingerprint, digest)
+
+    return cached_text, remember, cache_key
+
+
+def format_analysis(analysis, name="", age=None, weight=None, height=None, activity_level=None, dietary_preference=None, fitness_goal=None, tdee=None, has_bp=None, has_sugar=None, weather=None):
+    """
+    Puts a greeting and the user's details in front of the detailed breakdown.
+    analysis is a MealAnalysis (rendered to markdown) or already rendered text.
+    """
+    # Construct a friendly greeting and intro with user details
+    greeting = f"👋 Hello {name}," if name else "👋 Hello,"
+    intro_details = []
+    if age: intro_details.append(f"- Age: {age} years")
+    if weight: intro_details.append(f"- Weight: {weight} kg")
+    if height: intro_details.append(f"- Height: {height} cm")
+    if activity_level: intro_details.append(f"- Activity Level: {activity_level}")
+    if dietary_preference: intro_details.append(f"- Dietary Preference: {dietary_preference}")
+    if fitness_goal: intro_details.append(f"- Fitness Goal: {fitness_goal}")
+    if tdee: intro_details.append(f"- Estimated Daily Calorie Needs: {tdee} kcal")
+    if has_bp: intro_details.append(f"- High Blood Pressure: {has_bp}")
+    if has_sugar: intro_details.append(f"- High Blood Sugar: {has_sugar}")
+    if weather: intro_details.append(f"- Weather: {weather}")
+
+    intro = "\nHere is the nutritional breakdown of your meal, considering your inputs:\n"
+    if intro_details:
+        intro += "\n" + "\n".join(intro_details) + "\n"
+
+    body = render_markdown(analysis) if isinstance(analysis, MealAnalysis) else analysis.strip()
+    return f"{greeting} {intro}\n\n{body}"
+
+
+def _upload_bytes(model_image):
+    """Size of the image sent to the model (the raw pixel size for a PIL Image)."""
+    if isinstance(model_image, dict):
+        return len(model_image["data"])
+    return model_image.width * model_image.height * len(model_image.getbands())
+
+
+def _claim(cached_text, cache_key):
+    """
+    Single-flight for model calls: identical requests already in flight (double
+    clicks, a popular photo) wait for the first one and then read its answer
+    from the result cache. The context manager yields True if this caller
+    should call the model.
+    """
+    if cached_text is not None:
+        return nullcontext(False)
+    return get_single_flight("analysis").claim(cache_key)
+
+
+def _contents(prompt, model_image):
+    """
+    Request contents: the static prompt first, so consecutive requests share
+    their leading tokens and a backend with prefix caching can reuse them.
+    """
+    return [prompt.text, model_image]
+
+
+def _record_usage(prompt, response, span):
+    """Token counts of a model call, put on its span and in the process token meter."""
+    counts = usage_counts(response)
+    span.set(**counts)
+    get_token_meter().record(prompt, counts)
+    logger.debug("Vision prompt %s/%s: %s", prompt.variant, prompt.version, counts)
+    return counts
+
+
+def _open_stream(model, contents):
+    """Starts a streamed generation and waits for its first chunk, so connection errors surface here and can be retried."""
+    chunks = iter(model.generate_content(contents, stream=True))
+    return next(chunks, None), chunks
+
+
+def _analyze(image_input, use_cache):
+    """Vision stage: the profile-free MealAnalysis for an image, from the cache or the model."""
+    model_image, prompt, cached_text, remember, cache_key = _prepare_request(image_input, use_cache)
+    with _claim(cached_text, cache_key) as leader:
+        if cached_text is None and not leader:
+            cached_text = get_result_cache().get(cache_key)
+        if cached_text is not None:
+            return parse_meal(cached_text)
+
+        # Generate content, retrying transient errors unless the circuit is open
+        model = get_registry().get_model(MODEL_ID, generation_config=GENERATION_CONFIG)
+        with tracing.span("analysis.generate", image_bytes=_upload_bytes(model_image)) as span:
+            response = call_with_retries(
+                model.generate_content, _contents(prompt, model_image), policy=RETRY_POLICY, breaker=get_breaker(MODEL_ID)
+            )
+            _record_usage(prompt, response, span)
+        with tracing.span("analysis.parse", chars=len(response.text)):
+            meal = parse_meal(response.text)
+            remember(meal.to_json())
+        return meal
+
+
+def analyze_image(image_input, use_cache=True, on_error=None):
+    """
+    Sends the image and the vision prompt to the Gemini API and returns the parsed,
+    profile-free MealAnalysis. image_input is a PreparedImage from preprocess_image()
+    or a plain PIL Image. Answers are cached by image content, model and prompt
+    version, and shared by all users; pass use_cache=False to skip the lookup and
+    refresh the stored entry. Errors are logged and passed to on_error (e.g.
+    st.error) if given; returns None then. Apply personalize() for a user.
+    """
+    try:
+        return _analyze(image_input, use_cache)
+    except InvalidImageError as e:
+        _report_error(on_error, str(e))
+    except Exception as e:
+        _report_error(on_error, f"🚨 An error occurred while contacting the Gemini API: {e}", exc_info=True)
+    return None
+
+
+def analyze_meal(image_input, name="", age=None, weight=None, height=None, activity_level=None, dietary_preference=None, fitness_goal=None, tdee=None, has_bp=None, has_sugar=None, weather=None, use_cache=True, on_error=None):
+    """analyze_image() followed by the local personalization stage for this profile."""
+    meal = analyze_image(image_input, use_cache=use_cache, on_error=on_error)
+    if meal is None:
+        return None
+    return personalize(meal, name, age, weight, height, activity_level, dietary_preference, fitness_goal, tdee, has_bp, has_sugar, weather)
+
+
+def get_gemini_response(image_input, name="", age=None, weight=None, height=None, activity_level=None, dietary_preference=None, fitness_goal=None, tdee=None, has_bp=None, has_sugar=None, weather=None, use_cache=True, on_error=None):
+    """
+    Like analyze_meal(), but returns the analysis as display markdown with the
+    user's greeting, or an "Error: ..." string.
+    """
+    profile = (name, age, weight, height, activity_level, dietary_preference, fitness_goal, tdee, has_bp, has_sugar, weather)
+    try:
+        meal = _analyze(image_input, use_cache)
+        with tracing.span("analysis.personalize"):
+            return format_analysis(personalize(meal, *profile), *profile)
+    except InvalidImageError as e:
+        _report_error(on_error, str(e))
+        return "Error: Invalid image format."
+    except Exception as e:
+        _report_error(on_error, f"🚨 An error occurred while contacting the Gemini API: {e}", exc_info=True)
+        return "Error: Could not get response from AI model."
+
+
+class StreamResult:
+    """Text, parsed meal, timings and token counts collected while a streamed analysis is consumed."""
+
+    def __init__(self):
+        self.text = ""
+        self.meal = None
+        self.cached = False
+        self.error = None
+        self.first_token_seconds = None
+        self.total_seconds = None
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    def summary(self):
+        if self.cached:
+            return "answered from cache"
+        summary = f"first token after {self.first_token_seconds or 0:.1f} s, complete after {self.total_seconds or 0:.1f} s"
+        if self.prompt_tokens or self.output_tokens:
+            summary += f", {self.prompt_tokens:,} tokens in ({self.cached_tokens:,} cached), {self.output_tokens:,} out"
+        return summary
+
+
+def stream_gemini_response(image_input, use_cache=True, on_error=None, result=None):
+    """
+    Streaming variant of analyze_image: yields the raw JSON text chunks as they
+    arrive (see stream_progress() for something readable). Pass a StreamResult
+    to collect the full text, the parsed profile-free result.meal,
+    time-to-first-token and time-to-complete.
+    """
+    result = result if result is not None else StreamResult()
+    start = time.perf_counter()
+    try:
+        model_image, prompt, cached_text, remember, cache_key = _prepare_request(image_input, use_cache)
+        with _claim(cached_text, cache_key) as leader:
+            if cached_text is None and not leader:
+                cached_text = get_result_cache().get(cache_key)
+            if cached_text is not None:
+                result.cached = True
+                result.text = cached_text
+                result.meal = parse_meal(cached_text)
+                result.first_token_seconds = result.total_seconds = time.perf_counter() - start
+                yield cached_text
+                return
+
+            model = get_registry().get_model(MODEL_ID, generation_config=GENERATION_CONFIG)
+            chunks = []
+            # The span includes time the caller spends rendering each chunk (st.write_stream)
+            with tracing.span("analysis.generate", image_bytes=_upload_bytes(model_image), stream=True) as span:
+                # Only the start of the stream is retried; text already shown can't be taken back
+                first, rest = call_with_retries(
+                    _open_stream, model, _contents(prompt, model_image), policy=RETRY_POLICY, breaker=get_breaker(MODEL_ID)
+                )
+                chunk = None
+                for chunk in itertools.chain([first] if first is not None else [], rest):
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if result.first_token_seconds is None:
+                        result.first_token_seconds = time.perf_counter() - start
+                        tracing.observe("analysis.first_token", result.first_token_seconds)
+                    chunks.append(text)
+                    yield text
+                # Usage metadata arrives with the last chunk
+                counts = _record_usage(prompt, chunk, span)
+                result.prompt_tokens, result.cached_tokens, result.output_tokens = (
+                    counts["prompt_tokens"], counts["cached_tokens"], counts["output_tokens"]
+                )
+            result.text = "".join(chunks)
+            result.total_seconds = time.perf_counter() - start
+            logger.info("Streamed analysis: %s", result.summary())
+            with tracing.span("analysis.parse", chars=len(result.text)):
+                result.meal = parse_meal(result.text)
+                remember(result.meal.to_json())
+
+    except InvalidImageError as e:
+        result.error = str(e)
+        _report_error(on_error, result.error)
+    except Exception as e:
+        result.error = f"🚨 An error occurred while contacting the Gemini API: {e}"
+        _report_error(on_error, result.error, exc_info=True)
+
+
+ITEM_NAME = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def stream_progress(chunks):
+    """
+    Turns streamed JSON chunks into readable progress lines, one per food item
+    as soon as its name has arrived. The full analysis is rendered from the
+    parsed records once the stream ends.
+    """
+    yield "🔎 Looking at your meal...\n\n"
+    buffer, seen = "", 0
+    for chunk in chunks:
+        buffer += chunk
+        names = ITEM_NAME.findall(buffer)
+        for name in names[seen:]:
+            yield f"- 🍽️ {name}\n"
+        seen = len(names)
+
+
+def estimate_daily_calories(weight, height, age, activity_level, on_error=None):
+    """Estimates Total Daily Energy Expenditure (TDEE) using Mifflin-St Jeor formula."""
+    # Basic validation
+    if not all([weight, height, age, activity_level]):
+        return 0 # Return 0 or None if inputs are missing
+
+    try:
+        # Mifflin-St Jeor Equation for BMR (assuming male, adjust if needed or add gender input)
+        # Using +5 for male, use -161 for female if gender is collected
+        bmr = (10 * float(weight)) + (6.25 * float(height)) - (5 * int(age)) + 5
+
+        # Activity multipliers
+        multiplier = {"Low": 1.2, "Moderate": 1.55, "High": 1.725}
+        activity_multiplier = multiplier.get(activity_level, 1.2) # Default to Low if invalid
+
+        tdee = bmr * activity_multiplier
+        return int(tdee) # Return as integer
+    except (ValueError, TypeError):
+        _report_error(on_error, "Invalid input for TDEE calculation.")
+        return 0 # Return 0 or handle error as appropriate
@@ -1,19 +1,26 @@
 import streamlit as st
-import google.generativeai as genai
-from PIL import Image
 from dotenv import load_dotenv
 import os
 import io
+import threading
 import time
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
-import matplotlib
-from textwrap import dedent
-
-# Use a non-interactive backend for Matplotlib
-matplotlib.use('Agg')
-
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from image_cache import get_image_cache
+from batch import run_concurrently
+from clients import get_registry
+from dietary_agent import AGENT_NAME, AGENT_POOL_SIZE, AGENT_WARM_UP, build_dietary_planner, get_agent_cache, run_dietary_planner
+from history import daily_chart, get_history, weekly_chart
+from nutrition_db import get_nutrition_db
+from personalize import personalize
+from prompts import get_token_meter
+from session_store import get_session_store
+from jobs import DONE, FAILED, FINISHED, TIMED_OUT, get_job_runner
+import tracing
+from analysis import (
+    BATCH_MAX_CONCURRENCY, GENERATION_CONFIG, IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_MAX_KB, MODEL_ID, PROFILE_FIELDS,
+    StreamResult, analyze_image, analyze_meal, estimate_daily_calories, format_analysis,
+    get_rate_limiter, get_result_cache, stream_gemini_response, stream_progress,
+)
 
 # Load environment variables
 #load_dotenv()
@@ -29,179 +36,657 @@ if not api_key:
     st.stop() # Stop the app if the key is missing
 
 
-# Configure the Gemini API client
-try:
-    genai.configure(api_key=api_key)
-except Exception as e:
-    st.error(f"🛑 Error configuring Gemini API: {e}")
-    st.stop()
-
-# Define the input prompt for the Gemini API (Keep your original detailed prompt)
-# --- Input Prompt remains the same as provided in the previous version ---
-input_prompt = """
-You are an expert AI nutritional consultant 🧑‍⚕️ analyzing food items and drinks from an image 📸.
-Your task is to identify each food item or drink component visible, estimate its calorie count 🔢, and provide a brief nutritional overview (like estimated protein, carbs, fats, vitamins if possible). Aim to give the best, most informative response based on the image.
-
-Please present the information clearly for each item, followed by the total estimated calories if multiple items are present. Use emojis to make it engaging!
-
-Please also include:
-1. 🕐 **Meal Time Relevance**: Based on the composition of the food, suggest the best time to consume it (e.g., breakfast, lunch, dinner, snack, avoid late night, etc.) and why.
-2. 🚦 **Health Traffic Light Indicators**: For each food item, rate the sugar, salt, and saturated fat levels using the color system:
-    - 🟢 Green: Healthy/low
-    - 🟡 Amber: Moderate/acceptable
-    - 🔴 Red: High — caution
-
-Format your response like this:
-
-**Detailed Breakdown:**
-
-1.  **[Food Item Name 1]** 🍎
-    * Calories: ~[Number] kcal
-    * Nutrition Notes: [Brief notes, e.g., Good source of fiber, High in sugar, Estimated Protein/Carbs/Fats]
-    * Meal Time Relevance: [e.g., Breakfast, Snack, etc.]
-    * Health Traffic Light Indicators: [e.g., Sugar: 🟢, Salt: 🟡, Saturated Fat: 🔴]
-2.  **[Food Item Name 2]** 🍕
-    * Calories: ~[Number] kcal
-    * Nutrition Notes: [Brief notes]
-    * Meal Time Relevance: [e.g., Breakfast, Snack, etc.]
-    * Health Traffic Light Indicators: [e.g., Sugar: 🟢, Salt: 🟡, Saturated Fat: 🔴]
-3.  **[Food/Drink Item Name 3]** (if applicable)
-    * Calories: ~[Number] kcal
-    * Nutrition Notes: [Brief notes]...
-    * Meal Time Relevance: [e.g., Breakfast, Snack, etc.]
-    * Health Traffic Light Indicators: [e.g., Sugar: 🟢, Salt: 🟡, Saturated Fat: 🔴]
-
-
----
-**Total Estimated Calories:** ~[Total Calories] kcal 📊
-
----
-**Expert Nutritional Insights & Considerations:** 💡
-[Provide a detailed nutritional summary based *specifically* on the food items identified in the image. Discuss:
-* 🍽️ **Overall Meal Profile:** (e.g., Is it balanced? High in carbs/fat/protein? etc.)
-* ✅ **Key Benefits:** (Mention positive nutritional aspects or uses of the main ingredients.)
-* ⚠️ **Potential Considerations/Side Effects:** (e.g., Mention high sodium, sugar, saturated fat content if applicable and potential effects of overconsumption. Be factual and avoid overly strong warnings.)
-* ❤️‍🩹 **Notes for Health Conditions:** (Provide general dietary considerations related to the identified foods for individuals managing conditions like high blood pressure or diabetes. For example, comment on sodium content for BP or carbohydrate/sugar content for diabetes. Suggest moderation or healthier preparation methods if relevant.)
-* ℹ️ **Disclaimer:** Conclude **explicitly** with this sentence: "Note: This information is for general awareness and educational purposes only, and does not substitute professional medical or nutritional advice. Consult with a healthcare provider for personalized guidance."]
-
----
-
-**🎯 Health & Weather Considerations:**
-- **High Blood Pressure:** ❤️‍🩹 [If the user indicated 'Yes' for high blood pressure, analyze the meal's sodium content (low/moderate/high) and suggest specific adjustments like reducing processed items or adding potassium-rich foods found in the meal or suggested additions.]
-- **High Blood Sugar:** 🩸 [If the user indicated 'Yes' for high blood sugar, analyze the meal's likely glycemic impact (low/moderate/high based on carbs/sugars) and suggest focusing on fiber, protein, or specific low-GI alternatives relevant to the meal.]
-- **Weather:** ☀️🌧️❄️ [Based on the selected weather ([Summer/Rainy/Winter]), comment if the meal is suitable (e.g., hydrating/warming) and suggest minor adjustments like portion size or adding weather-appropriate sides.]
-
----
-**✅ Personalized Suggestions:**
-- Based on the Fitness Goal ([Weight Loss/Muscle Gain/etc.]): You may want to add [lean protein/greens/healthy fats] or reduce [sugar/fried components] to better support your goal.
-- Based on Dietary Preference ([Keto/Low Carb/etc.]): This meal seems [compatible/partially compatible/not compatible] with a [Preference] diet because [reason]. Consider [specific adjustments like swapping rice for cauliflower rice, removing sugary sauce, etc.].
-"""
-
-# --- get_gemini_response function remains the same ---
-def get_gemini_response(image_input, name="", age=None, weight=None, height=None, activity_level=None, dietary_preference=None, fitness_goal=None, tdee=None, has_bp=None, has_sugar=None, weather=None):
+@st.cache_resource
+def warm_up_clients():
+    """
+    Configures the shared client registry once per process and pre-builds the
+    Gemini model (and optionally an agent) on a background thread.
+    Heavy SDKs are imported there or on first use, not during the first render.
+    """
+    registry = get_registry()
+    registry.configure(api_key)
+    registry.register_agent(AGENT_NAME, lambda: build_dietary_planner(api_key), pool_size=AGENT_POOL_SIZE)
+    # Same config as the analysis calls, so they reuse the warmed model
+    registry.warm_up_in_background(
+        models=[(MODEL_ID, {"generation_config": GENERATION_CONFIG})], agents=[AGENT_NAME] if AGENT_WARM_UP else [],
+    )
+    # Metrics file / endpoint, if tracing is enabled
+    tracing.start_exporter()
+    return registry
+
+
+warm_up_clients()
+
+def session_id():
+    """Id of the current browser session; large per-session values live under it in the session store."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def current_tdee():
+    """TDEE of the profile in the sidebar, read from session state."""
+    return estimate_daily_calories(
+        st.session_state.user_weight, st.session_state.user_height,
+        st.session_state.user_age, st.session_state.user_activity
+    )
+
+
+def current_profile(name=""):
     """
-    Sends the image and the input prompt to the Gemini API. Incorporates user context.
-    (Function code is identical to the previous version provided by the user)
+    The sidebar profile as a PROFILE_FIELDS tuple. Fragments rerun on their
+    own, so they read it from session state rather than take it as arguments.
     """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash') # Or your preferred model
-        prompt_text = input_prompt
-        context = ""
-
-        # Build context string safely
-        if name: context += f"The user's name is {name}. "
-        if age: context += f"The user is {age} years old. "
-        if weight: context += f"The user weighs {weight} kg. "
-        if height: context += f"The user is {height} cm tall. "
-        if activity_level: context += f"The user's activity level is {activity_level}. "
-        if dietary_preference: context += f"The user's dietary preference is {dietary_preference}. "
-        if fitness_goal: context += f"The user's fitness goal is {fitness_goal}. "
-        if tdee: context += f"The user's estimated daily calorie needs are {tdee} kcal. "
-        if has_bp: context += f"The user has high blood pressure: {has_bp}. "
-        if has_sugar: context += f"The user has high blood sugar: {has_sugar}. "
-        if weather: context += f"The current weather is {weather}. "
-
-        # Prepend context to the main prompt if any context exists
-        if context:
-            prompt_text = f"Here is some context about the user: {context.strip()} Please use this information to tailor your response, especially the 'Health & Weather Considerations' and 'Personalized Suggestions' sections. {input_prompt}"
-
-        # Ensure image_input is a PIL Image (Streamlit often handles this)
-        if not isinstance(image_input, Image.Image):
-             st.error("Invalid image input provided to Gemini.")
-             return "Error: Invalid image format."
-
-        # Generate content
-        response = model.generate_content([prompt_text, image_input])
-
-        # Check for safety ratings or blocks if necessary (optional)
-        # if response.prompt_feedback.block_reason:
-        #     st.warning(f"Response blocked due to: {response.prompt_feedback.block_reason}")
-        #     return "Blocked response. Please try a different image or prompt."
-
-        response_text = response.text
-
-        # Construct a friendly greeting and intro with user details
-        greeting = f"👋 Hello {name}," if name else "👋 Hello,"
-        intro_details = []
-        if age: intro_details.append(f"- Age: {age} years")
-        if weight: intro_details.append(f"- Weight: {weight} kg")
-        if height: intro_details.append(f"- Height: {height} cm")
-        if activity_level: intro_details.append(f"- Activity Level: {activity_level}")
-        if dietary_preference: intro_details.append(f"- Dietary Preference: {dietary_preference}")
-        if fitness_goal: intro_details.append(f"- Fitness Goal: {fitness_goal}")
-        if tdee: intro_details.append(f"- Estimated Daily Calorie Needs: {tdee} kcal")
-        if has_bp: intro_details.append(f"- High Blood Pressure: {has_bp}")
-        if has_sugar: intro_details.append(f"- High Blood Sugar: {has_sugar}")
-        if weather: intro_details.append(f"- Weather: {weather}")
-
-        intro = "\nHere is the nutritional breakdown of your meal, considering your inputs:\n"
-        if intro_details:
-            intro += "\n" + "\n".join(intro_details) + "\n"
-
-        # Combine greeting, intro, and the main analysis
-        # Look for the start of the detailed breakdown to ensure structure
-        if "Detailed Breakdown:" in response_text:
-            # Extract the part after "Detailed Breakdown:"
-            breakdown_part = response_text.split("Detailed Breakdown:", 1)[1]
-            # Reconstruct the full response with the greeting and intro
-            full_response = f"{greeting} {intro}\n\n**Detailed Breakdown:**\n{breakdown_part.strip()}"
+    return (
+        name, st.session_state.user_age,
+        st.session_state.user_weight, st.session_state.user_height,
+        st.session_state.user_activity, st.session_state.user_diet,
+        st.session_state.user_goal, current_tdee(), st.session_state.user_bp,
+        st.session_state.user_sugar, st.session_state.user_weather
+    )
+
+
+# Widget callbacks that rerun only the fragments depending on the widget.
+# Without one, a widget in a fragment reruns just its own fragment.
+def rerun_profile_dependents():
+    """Profile inputs change the TDEE (sidebar) and the personalized analysis or the batch total."""
+    st.rerun(["sidebar", "batch" if st.session_state.get("batch_mode") else "results"])
+
+
+def rerun_upload_checks():
+    """The pre-screen option changes the checks shown under the upload (batch mode applies it on click)."""
+    if not st.session_state.get("batch_mode"):
+        st.rerun(["sidebar", "upload"])
+
+
+def rerun_name_dependents():
+    """The name is validated with the upload, greets the user in the results and picks their history."""
+    st.rerun(["upload", "results", "history"])
+
+
+def rerun_history_dependents():
+    """The history option shows or hides the history panel of the analysis or the batch."""
+    st.rerun(["sidebar", "batch" if st.session_state.get("batch_mode") else "history"])
+
+
+def start_web_search():
+    """Runs the agent on the shared job runner; web_search_status() polls it."""
+    st.session_state.web_search_job = get_job_runner().submit(
+        run_dietary_planner, get_registry(), st.session_state.meal, st.session_state.profile,
+        use_cache=st.session_state.use_result_cache
+    )
+    st.session_state.web_search_message = None
+    get_session_store().set_text(session_id(), "additional_info", None)
+
+
+# How often the web-search status panel polls its background job
+WEB_SEARCH_POLL_SECONDS = 1.0
+
+
+@st.fragment(run_every=WEB_SEARCH_POLL_SECONDS)
+def web_search_status():
+    """
+    Polls the background web-search job and shows its partial output.
+    Only this fragment reruns while the agent works; once the job ends the
+    result is moved to the session store and the whole page reruns.
+    """
+    job = get_job_runner().get(st.session_state.web_search_job)
+    if job is None:
+        st.session_state.web_search_job = None
+        st.session_state.web_search_message = ("warning", "⚠️ The web search expired. Please search again.")
+        st.rerun()
+
+    if job.status in FINISHED or job.cancelled:
+        st.session_state.web_search_job = None
+        if job.status == DONE:
+            # Store results (once; the raw and summary views render the same text)
+            get_session_store().set_text(session_id(), "additional_info", job.result)
+        elif job.status == FAILED:
+            st.session_state.web_search_message = ("error", f"❌ Web search failed: {job.error}")
+        elif job.status == TIMED_OUT or job.timed_out:
+            st.session_state.web_search_message = ("warning", "⏱️ The web search took too long and was stopped.")
         else:
-            # If the expected structure isn't found, return the raw response after the greeting/intro
-            full_response = f"{greeting} {intro}\n\n{response_text.strip()}"
+            st.session_state.web_search_message = ("info", "⏹️ Web search cancelled.")
+        st.rerun()
+
+    st.info(f"🤖 Searching the web... {job.elapsed:.0f} s")
+    if job.partial:
+        with st.container(height=300):
+            st.markdown(job.partial, unsafe_allow_html=True)
+    if st.button("⏹️ Cancel search", key="cancel_web_search"):
+        job.cancel()
+
+
+def render_nutrition_check(meal):
+    """
+    Recomputes the meal's calories and macros from the local nutrition table.
+    Servings are editable, so portion changes don't need another model call.
+    """
+    items = [(item.name, item.kcal) for item in meal.items]
+    if not items:
+        return
+    import pandas as pd  # ~0.4 s to import; only loaded once a table is shown
+
+    with st.expander("🧮 Check calories with the local nutrition table"):
+        servings = st.data_editor(
+            pd.DataFrame({"Item": [name for name, _ in items], "Servings": [1.0] * len(items)}),
+            disabled=["Item"], hide_index=True, key=f"nutrition_servings_{len(items)}_{items[0][0]}",
+        )["Servings"].fillna(0).tolist()
+        estimate = get_nutrition_db().estimate(items, servings)
+        st.dataframe(pd.DataFrame([
+            {
+                "Item": item.name, "Matched food": item.food or "—", "Grams": item.grams,
+                "kcal": item.kcal, "Protein (g)": item.protein_g, "Carbs (g)": item.carbs_g,
+                "Fat (g)": item.fat_g, "Model kcal": item.model_kcal,
+            }
+            for item in estimate.items
+        ]).round(1), hide_index=True)
+
+        col1, col2 = st.columns(2)
+        model_total = meal.total_kcal
+        col1.metric(
+            "Recomputed total", f"{estimate.total_kcal:,.0f} kcal",
+            delta=f"{estimate.total_kcal - model_total:+,.0f} kcal vs model" if model_total else None,
+            delta_color="off",
+        )
+        col2.metric("Protein · Carbs · Fat", f"{estimate.protein_g:.0f} · {estimate.carbs_g:.0f} · {estimate.fat_g:.0f} g")
+        st.caption(
+            f"{estimate.matched} of {len(items)} items matched a typical serving in the table; "
+            "unmatched items keep the model's estimate."
+        )
+
+
+def render_history(name):
+    """Daily and weekly calorie trends of ``name`` from the meal history, with the latest meals."""
+    history = get_history()
+    daily = history.daily(name)
+    if not daily:
+        return
+    import pandas as pd  # ~0.4 s to import; only loaded once a table is shown
+
+    with st.expander("📈 Your calorie history"):
+        tab_daily, tab_weekly, tab_meals = st.tabs(["Daily", "Weekly", "Latest meals"])
+        with tab_daily:
+            st.plotly_chart(daily_chart(daily), width="stretch")
+        with tab_weekly:
+            st.plotly_chart(weekly_chart(history.weekly(name)), width="stretch")
+        with tab_meals:
+            st.dataframe(pd.DataFrame([
+                {
+                    "Time": time.strftime("%Y-%m-%d %H:%M", time.localtime(meal["eaten_at"])),
+                    "Items": ", ".join(item["name"] for item in meal["items"]),
+                    "kcal": meal["kcal"], "Protein (g)": meal["protein_g"],
+                    "Carbs (g)": meal["carbs_g"], "Fat (g)": meal["fat_g"],
+                }
+                for meal in history.recent_meals(name)
+            ]).round(1), hide_index=True)
+
+
+def render_debug_panel():
+    """Per-stage timings of recent runs, shown in the sidebar when TRACING_ENABLED=1."""
+    tracer = tracing.get_tracer()
+    with st.expander("🐞 Stage timings"):
+        stages = tracer.snapshot()
+        if not stages:
+            st.caption("No timed stages yet.")
+            return
+        import pandas as pd  # ~0.4 s to import; only loaded once a table is shown
+
+        st.dataframe(pd.DataFrame(stages).round(1), hide_index=True)
+        tokens = get_token_meter().stats()
+        if tokens:
+            st.caption("Tokens per prompt")
+            st.dataframe(pd.DataFrame(tokens).round(1), hide_index=True)
+        st.caption("Recent spans")
+        st.dataframe(pd.DataFrame(tracer.recent(limit=30)).drop(columns=["ended"]).round(1), hide_index=True)
+        st.download_button("⬇️ Prometheus metrics", tracer.render_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+
+def prescreen_upload(uploaded_file):
+    """Local checks of the upload's thumbnail (blur, exposure, color), run once per upload."""
+    from prescreen import screen  # loads OpenCV (~75 ms), so only once a photo is checked
+    digest = get_image_cache().digest(uploaded_file)
+    cached = st.session_state.get("prescreen_result")
+    if cached is None or cached[0] != digest:
+        with tracing.span("app.prescreen"):
+            cached = (digest, screen(get_image_cache().thumbnail(uploaded_file)))
+        st.session_state.prescreen_result = cached
+    return cached[1]
+
+
+def render_batch_item(item):
+    """Shows one meal of a batch run as a collapsible analysis (the text is kept in the session store)."""
+    kcal = f"{item['kcal']:,} kcal" if item["kcal"] is not None else "calories unavailable"
+    with st.expander(f"🍽️ {item['file']} — {kcal}"):
+        st.markdown(get_session_store().get_text(session_id(), item["analysis"], ""))
+
+
+def render_batch_mode():
+    """
+    Batch mode: analyzes several meal images concurrently and totals the day.
+    Results are shown as each model call finishes.
+    """
+    tdee = current_tdee()
+    use_cache, save_history, use_prescreen = (
+        st.session_state.use_result_cache, st.session_state.save_history, st.session_state.prescreen
+    )
+    if 'batch_results' not in st.session_state:
+        st.session_state.batch_results = None
+
+    uploaded_files = st.file_uploader("Choose your meal images...", type=["jpg", "jpeg", "png"],
+                                      accept_multiple_files=True, key="batch_uploader")
+    name = st.text_input("What's your name?", key="user_name_main")
+    if not uploaded_files or not name:
+        st.info("Upload one or more images and enter your name to analyze your day.")
+
+    if st.button("Analyze All Meals 🍽️", key="batch_analyze_button", disabled=not (uploaded_files and name)):
+        profile = current_profile(name)
+        if use_prescreen:
+            from prescreen import RejectedImageError, crop_prepared, screen  # loads OpenCV
+
+        def analyze(uploaded):
+            if use_prescreen:
+                result = screen(get_image_cache().thumbnail(uploaded))
+                if result.rejected:
+                    raise RejectedImageError(result.summary())
+            prepared = get_image_cache().prepared(uploaded, IMAGE_MAX_DIMENSION, IMAGE_MAX_KB * 1024, IMAGE_FORMAT)
+            if use_prescreen and result.crop:
+                prepared = crop_prepared(prepared, result.crop)
+            return analyze_meal(prepared, *profile, use_cache=use_cache, on_error=st.error)
+
+        # Worker threads need the script context to use st.* (errors, cached resources)
+        ctx = get_script_run_ctx()
+        progress = st.progress(0.0, text=f"🔍 Analyzing {len(uploaded_files)} images...")
+        store, sid = get_session_store(), session_id()
+        for item in st.session_state.batch_results or []:
+            store.delete(sid, item["analysis"])
+        st.session_state.batch_results = []
+        results = run_concurrently(
+            analyze, uploaded_files, max_concurrency=BATCH_MAX_CONCURRENCY,
+            rate_limiter=get_rate_limiter(),
+            initializer=lambda: add_script_run_ctx(threading.current_thread(), ctx)
+        )
+        for done, (uploaded, meal, error) in enumerate(results, start=1):
+            # Items keep the store name of their analysis text, not the text
+            item = {"file": uploaded.name, "analysis": f"batch_{done}", "kcal": None}
+            if meal is not None:
+                store.set_text(sid, item["analysis"], format_analysis(meal, *profile))
+                item["kcal"] = round(meal.total_kcal)
+                if save_history:
+                    get_history().add(name, meal, tdee=tdee)
+            else:
+                store.set_text(sid, item["analysis"], f"Error: {error or 'Could not get response from AI model.'}")
+            st.session_state.batch_results.append(item)
+            render_batch_item(item)
+            progress.progress(done / len(uploaded_files), text=f"✅ {done}/{len(uploaded_files)} analyzed")
+    elif st.session_state.batch_results:
+        for item in st.session_state.batch_results:
+            render_batch_item(item)
+
+    # Combine the day's meals into a single total
+    if st.session_state.batch_results:
+        st.divider()
+        counted = [item["kcal"] for item in st.session_state.batch_results if item["kcal"] is not None]
+        total = sum(counted)
+        st.metric(
+            "📊 Total Estimated Calories for the Day", f"{total:,} kcal",
+            delta=f"{total - tdee:+,} kcal vs. daily needs" if tdee else None,
+            delta_color="inverse"
+        )
+        if len(counted) < len(st.session_state.batch_results):
+            st.caption("Some meals have no calorie total and are not included.")
+    if name and st.session_state.save_history:
+        render_history(name)
+
+
+def render_sidebar():
+    """Health inputs, the TDEE they give and the app options."""
+    st.header("⚙️ Health & Fitness Inputs")
+    st.subheader("Personalize Your Analysis")
+
+    # User inputs (using keys for state); changes rerun the sections using the profile
+    age = st.number_input("Age (in years)", min_value=10, max_value=100, value=25, key="user_age", on_change=rerun_profile_dependents)
+    weight = st.number_input("Weight (in kg)", min_value=30.0, max_value=200.0, value=70.0, format="%.1f", key="user_weight", on_change=rerun_profile_dependents)
+    height = st.number_input("Height (in cm)", min_value=100.0, max_value=250.0, value=170.0, format="%.1f", key="user_height", on_change=rerun_profile_dependents)
+    activity_level = st.selectbox("Activity Level", ["Low", "Moderate", "High"], index=1, key="user_activity", on_change=rerun_profile_dependents)
+    st.selectbox("Dietary Preference", ["Balanced", "Keto", "Vegetarian", "Low Carb", "Vegan"], key="user_diet", on_change=rerun_profile_dependents)
+    st.selectbox("Fitness Goal", ["Weight Loss", "Muscle Gain", "Maintenance", "Endurance", "Flexibility"], key="user_goal", on_change=rerun_profile_dependents)
+    st.radio("High Blood Pressure?", ["No", "Yes"], key="user_bp", on_change=rerun_profile_dependents, horizontal=True)
+    st.radio("High Blood Sugar/Diabetes?", ["No", "Yes"], key="user_sugar", on_change=rerun_profile_dependents, horizontal=True)
+    st.selectbox("Current Weather", ["Summer", "Rainy", "Winter", "Moderate"], key="user_weather", on_change=rerun_profile_dependents)
+
+    # Estimate and display TDEE
+    tdee = estimate_daily_calories(weight, height, age, activity_level, on_error=st.error)
+    if tdee > 0:
+        st.markdown(f"### 🔥 Est. Daily Needs (TDEE):")
+        st.markdown(f"<p style='font-size: 24px; font-weight: bold; color: #2e7d32;'>{tdee} kcal</p>", unsafe_allow_html=True)
+    else:
+        st.warning("Provide age, weight, height for TDEE.")
+
+    # Show the analysis while it is generated instead of after a spinner
+    st.checkbox("⚡ Stream the analysis as it's written", value=True, key="stream_analysis")
+
+    # Result cache controls
+    st.checkbox("♻️ Reuse previous analyses", value=True, key="use_result_cache",
+                help="Answer repeat uploads of the same image (for any profile), and repeat web searches for the same meal, from the cache.")
+    # Off by default: the history is stored on the server and keyed only by the typed name
+    st.checkbox("📈 Save analyses to my history", value=False, key="save_history", on_change=rerun_history_dependents,
+                help="Keep each analyzed meal under your name on this server to chart daily and weekly calories.")
+    if st.session_state.save_history:
+        st.caption("⚠️ The history is shared by name: anyone using this app who types the same name can see and add to it.")
+    # Same setting as prescreen.PRESCREEN_ENABLED, read here so the sidebar doesn't load OpenCV
+    st.checkbox("🔎 Check photos before analysis", value=os.getenv("PRESCREEN_ENABLED", "1") == "1", key="prescreen", on_change=rerun_upload_checks,
+                help="Catch blurry, dark, blank or colorless photos locally instead of sending them to the model.")
+    # Filled after the button, so a clear shows up without another rerun
+    cache_caption = st.empty()
+    if st.button("🗑️ Clear cached analyses", key="clear_result_cache"):
+        get_result_cache().clear()
+        get_agent_cache().clear()
+    cache_stats = get_result_cache().stats()
+    cache_caption.caption(
+        f"Cache: {cache_stats['hits_memory'] + cache_stats['hits_disk']} hits, "
+        f"{cache_stats['misses']} misses, {cache_stats['disk_entries']} stored"
+    )
+
+    if tracing.TRACING_ENABLED:
+        render_debug_panel()
+
+
+def render_upload():
+    """Upload, preview, pre-screen and validation of one meal photo, and its analysis on click."""
+    store, sid = get_session_store(), session_id()
+    use_cache, use_prescreen = st.session_state.use_result_cache, st.session_state.prescreen
+    # File uploader
+    uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"], key="file_uploader")
+
+    # --- Processing Logic (Handles New Uploads) ---
+    if uploaded_file is not None:
+        # This block now *only* handles the initial processing of a new file
+        try:
+            # Only a thumbnail is kept and sent to the browser, not the decoded photo.
+            # It is made once per upload; reruns take it from the image cache.
+            with tracing.span("app.render_image", image_bytes=uploaded_file.size):
+                store.set_image(sid, "upload", get_image_cache().thumbnail(uploaded_file))
+                st.image(store.get_image(sid, "upload"), caption="Uploaded Image.", width="stretch")
+
+            # Blurry, dark, blank or non-food photos are caught before the model call
+            screen_result = prescreen_upload(uploaded_file) if use_prescreen else None
+            if screen_result is not None:
+                from prescreen import REJECT, crop_prepared
+                for issue in screen_result.issues:
+                    (st.error if issue.level == REJECT else st.warning)(f"🔎 {issue.message}")
+
+            # Add validation checks before allowing analysis
+            is_valid = True
+            validation_messages = []
+
+            # Check name
+            name = st.text_input("What's your name?", key="user_name_main", on_change=rerun_name_dependents)
+            if not name:
+                is_valid = False
+                validation_messages.append("Please enter your name")
+
+            # Check sidebar inputs
+            if not st.session_state.user_age:
+                is_valid = False
+                validation_messages.append("Please enter your age")
+            
+            if not st.session_state.user_weight:
+                is_valid = False
+                validation_messages.append("Please enter your weight")
+                
+            if not st.session_state.user_height:
+                is_valid = False
+                validation_messages.append("Please enter your height")
+                
+            if not st.session_state.user_activity:
+                is_valid = False
+                validation_messages.append("Please select your activity level")
+                
+            if not st.session_state.user_diet:
+                is_valid = False
+                validation_messages.append("Please select your dietary preference")
+                
+            if not st.session_state.user_goal:
+                is_valid = False
+                validation_messages.append("Please select your fitness goal")
+
+            if screen_result is not None and screen_result.rejected:
+                digest = st.session_state.prescreen_result[0]
+                if not st.checkbox("Analyze this photo anyway", key=f"prescreen_override_{digest[:16]}"):
+                    is_valid = False
+                    validation_messages.append("Please upload a clearer photo of your meal")
+
+            # Display validation messages if any
+            if validation_messages:
+                st.warning("Please complete the following required fields:")
+                for msg in validation_messages:
+                    st.markdown(f"- {msg}")
+
+            # Only show and enable the analyze button if all inputs are valid
+            if is_valid:
+                if st.button("Analyze Image for Nutritional Information 🍽️", key="analyze_button"):
+                    # Downsample and re-encode under a byte budget before upload (once per upload)
+                    with tracing.span("app.preprocess", image_bytes=uploaded_file.size) as span:
+                        prepared = get_image_cache().prepared(
+                            uploaded_file, IMAGE_MAX_DIMENSION, IMAGE_MAX_KB * 1024, IMAGE_FORMAT
+                        )
+                        if screen_result is not None and screen_result.crop:
+                            # Send only the plate found by the pre-screen (PRESCREEN_CROP=1)
+                            prepared = crop_prepared(prepared, screen_result.crop)
+                        span.set(upload_bytes=prepared.stats.output_bytes)
+                    st.session_state.preprocess_stats = prepared.stats.summary()
+
+                    if st.session_state.stream_analysis:
+                        # Show items as they are identified; the full analysis is rendered once complete
+                        st.subheader("🔬 Nutritional Analysis:")
+                        stream = StreamResult()
+                        with st.container(height=600):
+                            st.write_stream(stream_progress(stream_gemini_response(
+                                prepared, use_cache=use_cache, on_error=st.error, result=stream
+                            )))
+                        meal = stream.meal
+                        st.session_state.stream_stats = stream.summary()
+                    else:
+                        with st.spinner("🔍 Analyzing the image... Please wait.",show_time=True):
+                            meal = analyze_image(prepared, use_cache=use_cache, on_error=st.error)
+                        st.session_state.stream_stats = None
+                    if meal is not None and st.session_state.save_history:
+                        get_history().add(name, meal, tdee=current_tdee())
+
+                    # Profile-free records; personalized by the results section on every rerun
+                    st.session_state.meal = meal
+                    st.session_state.analysis_error = None if meal is not None else "Error: Could not get response from AI model."
+                    st.session_state.image_processed = True
+                    store.set_text(sid, "additional_info", None)
+                    st.session_state.creative_advice = None
+                    # The whole page, so the results section shows the new meal
+                    st.rerun()
+            else:
+                st.button("Analyze Image for Nutritional Information 🍽️", 
+                         key="analyze_button_disabled", 
+                         disabled=True)
+
+        except Exception as e:
+            st.error(f"🖼️ Error loading or processing image: {e}")
+            # Reset state on error; the results sections only need a rerun if they were showing
+            was_shown = results_shown()
+            st.session_state.analysis_error = None
+            st.session_state.meal = None
+            st.session_state.image_processed = False
+            store.set_text(sid, "additional_info", None)
+            st.session_state.creative_advice = None
+            st.session_state.preprocess_stats = None
+            if was_shown:
+                st.rerun()
+
+
+def results_shown():
+    """Whether the results sections show an analysis (or the error of the last one)."""
+    return st.session_state.image_processed and (st.session_state.meal is not None or st.session_state.analysis_error)
+
+
+def render_results():
+    """The last meal's analysis, personalized with the current profile."""
+    # --- Display Results Area (Depends *only* on Session State) ---
+    # The rendered analysis is rebuilt on each rerun rather than kept in the session
+    calorie_info = st.session_state.analysis_error
+    if st.session_state.image_processed and st.session_state.meal is not None:
+        # Personalization is local and cheap, so sidebar changes apply without another model call
+        profile = current_profile(st.session_state.get("user_name_main", ""))
+        st.session_state.profile = dict(zip(PROFILE_FIELDS, profile))
+        with tracing.span("app.personalize"):
+            calorie_info = format_analysis(personalize(st.session_state.meal, *profile), *profile)
+    if st.session_state.image_processed and calorie_info:
+        st.divider() # Add a visual separator
+
+        # --- Display Nutritional Analysis ---
+        st.subheader("🔬 Nutritional Analysis:")
+        with st.container(height=600): # Use container for scrollable results
+             st.markdown(calorie_info) # Display the analysis
+        if st.session_state.preprocess_stats:
+            st.caption(f"📦 Image sent for analysis: {st.session_state.preprocess_stats}")
+        if st.session_state.stream_stats:
+            st.caption(f"⚡ Streamed: {st.session_state.stream_stats}")
+
+
+def render_web_search():
+    """Web search of the analyzed meal with the dietary agent, its results and the footer."""
+    if not results_shown():
+        return
+    store, sid = get_session_store(), session_id()
+    # --- Additional Info Section ---
+    st.divider()
+    # 🌐 Section: Get More Context (Web Search)
+    st.subheader("🌐 Get More Context (Web Search)")
+
+    # Started from the click callback, so this section reruns with the button disabled
+    st.button("Search Web Based on Analysis", key="web_search_button", on_click=start_web_search,
+              disabled=st.session_state.web_search_job is not None or st.session_state.meal is None)
+
+    if st.session_state.web_search_job:
+        web_search_status()
+    elif st.session_state.web_search_message:
+        level, message = st.session_state.web_search_message
+        getattr(st, level)(message)
+
+
+    # ✅ Display Web Search Results if available
+    additional_info = store.get_text(sid, "additional_info")
+    if additional_info:
+        with st.expander("📄 Raw Web Search Result"):
+            st.markdown(additional_info, unsafe_allow_html=True)
+
+
+        st.markdown("### 📌 Personalized Summary Based on Your Analysis")
+        structured_output = "\n".join(
+            line for line in additional_info.splitlines()
+            if "User Data (from" not in line
+        )
+
+        # Now display the cleaned version
+        st.markdown(structured_output, unsafe_allow_html=True)            
+
+
+    # Display additional static web insights if needed
+    if additional_info:
+        formatted_info = f"""
+        ---
+
+        ### 📝 AI-Powered Recommendations:
+        - ✅ Choose low-sodium and low-sugar options where possible.
+        - 🥗 Add fiber-rich veggies (spinach, broccoli, kale) for gut health and blood sugar support.
+        - 💧 Stay hydrated: aim for 2-3 liters per day, especially in summer.
+        - 🧘 Incorporate movement (e.g., yoga, walks, light strength training) aligned with your fitness goal.
+        - 📏 Control portion sizes — especially carbs and sauces — for better calorie management.
+        - 🔁 Revisit your plan every 1–2 weeks and tweak based on your progress and energy levels.
+
+        - 🧘 **Yoga & Meditation Tips:**
+        - 🧘‍♀️ Practice a short yoga flow to increase flexibility and reduce stress.
+        - 🕉️ Consider meditation to improve mindfulness and balance.
+        - 🌅 Try morning stretches to energize your day and improve circulation.
+
+        ---
+        """
+        st.markdown(formatted_info, unsafe_allow_html=True)
+
+
+    # Footer with contact information
+    st.markdown("""
+    <div style='text-align: center; padding: 20px;'>
+        <p style='margin-bottom: 10px;'>
+            <strong>Contact</strong>
+        </p>
+        <p>
+            <a href="mailto:narendra.insights@gmail.com" style='text-decoration: none; margin: 0 10px;'>
+                📧 narendra.insights@gmail.com
+            </a>
+            |
+            <a href="https://www.linkedin.com/in/nk-analytics" target="_blank" style='text-decoration: none; margin: 0 10px;'>
+                👔 Narendra linkedin Profile
+            </a>
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+    st.markdown("---")
+    st.caption("Built with Streamlit & Google Gemini. AI estimations are approximate. Consult professionals for precise advice.")
+
+    # Add minimal styling
+    st.markdown("""
+        <style>
+        .stSelectbox {
+            margin-top: 1rem;
+        }
+        </style>
+        """, unsafe_allow_html=True)
+
+
+# Each section reruns on its own when one of its widgets changes (see the
+# rerun_* callbacks above for widgets other sections depend on). The whole
+# page only reruns on load, on the batch-mode toggle and when an analysis or
+# a web search finishes.
+@st.fragment(key="sidebar")
+def sidebar_fragment():
+    with tracing.span("app.sidebar"):
+        render_sidebar()
 
-        return full_response
 
-    except Exception as e:
-        st.error(f"🚨 An error occurred while contacting the Gemini API: {e}")
-        # You might want to log the full traceback here for debugging
-        # import traceback
-        # st.error(traceback.format_exc())
-        return "Error: Could not get response from AI model."
+@st.fragment(key="upload")
+def upload_fragment():
+    with tracing.span("app.upload"):
+        render_upload()
 
 
+@st.fragment(key="results")
+def results_fragment():
+    with tracing.span("app.results"):
+        render_results()
 
 
-# --- estimate_daily_calories function remains the same ---
-def estimate_daily_calories(weight, height, age, activity_level):
-    """Estimates Total Daily Energy Expenditure (TDEE) using Mifflin-St Jeor formula."""
-    # Basic validation
-    if not all([weight, height, age, activity_level]):
-        return 0 # Return 0 or None if inputs are missing
+@st.fragment(key="nutrition")
+def nutrition_fragment():
+    if results_shown() and st.session_state.meal is not None:
+        with tracing.span("app.nutrition_check"):
+            render_nutrition_check(st.session_state.meal)
 
-    try:
-        # Mifflin-St Jeor Equation for BMR (assuming male, adjust if needed or add gender input)
-        # Using +5 for male, use -161 for female if gender is collected
-        bmr = (10 * float(weight)) + (6.25 * float(height)) - (5 * int(age)) + 5
 
-        # Activity multipliers
-        multiplier = {"Low": 1.2, "Moderate": 1.55, "High": 1.725}
-        activity_multiplier = multiplier.get(activity_level, 1.2) # Default to Low if invalid
+@st.fragment(key="history")
+def history_fragment():
+    name = st.session_state.get("user_name_main", "")
+    if results_shown() and st.session_state.meal is not None and name and st.session_state.save_history:
+        with tracing.span("app.history"):
+            render_history(name)
 
-        tdee = bmr * activity_multiplier
-        return int(tdee) # Return as integer
-    except (ValueError, TypeError):
-        st.error("Invalid input for TDEE calculation.")
-        return 0 # Return 0 or handle error as appropriate
+
+@st.fragment(key="web_search")
+def web_search_fragment():
+    with tracing.span("app.web_search"):
+        render_web_search()
+
+
+@st.fragment(key="batch")
+def batch_fragment():
+    with tracing.span("app.batch"):
+        render_batch_mode()
 
 
 def main():
@@ -269,40 +754,31 @@ def main():
     )
 
     # --- Initialize Session State ---
-    if 'calorie_info' not in st.session_state:
-        st.session_state.calorie_info = None
+    if 'analysis_error' not in st.session_state:
+        st.session_state.analysis_error = None # Shown instead of the analysis if the last one failed
+    if 'meal' not in st.session_state:
+        st.session_state.meal = None # Profile-free MealAnalysis from the vision stage
+    if 'profile' not in st.session_state:
+        st.session_state.profile = None # Current profile, applied to the meal by personalize()
     if 'image_processed' not in st.session_state:
         st.session_state.image_processed = False # Flag to track if analysis was done
-    if 'additional_info' not in st.session_state:
-        st.session_state.additional_info = None # Store web search results
+    # Large values (web search results, image thumbnails, batch analyses) live in the session store
     if 'creative_advice' not in st.session_state:
         st.session_state.creative_advice = None
+    if 'preprocess_stats' not in st.session_state:
+        st.session_state.preprocess_stats = None # Before/after size of the image sent to the model
+    if 'web_search_job' not in st.session_state:
+        st.session_state.web_search_job = None # Id of the running background web search
+    if 'web_search_message' not in st.session_state:
+        st.session_state.web_search_message = None # (level, text) outcome of the last search if it didn't succeed
+    if 'stream_stats' not in st.session_state:
+        st.session_state.stream_stats = None # Time to first token / to complete of the last streamed analysis
 
   
   # --- Sidebar Elements ---
     with st.sidebar: # Group sidebar elements
-        st.header("⚙️ Health & Fitness Inputs")
-        st.subheader("Personalize Your Analysis")
-
-        # User inputs (using keys for state)
-        age = st.number_input("Age (in years)", min_value=10, max_value=100, value=25, key="user_age")
-        weight = st.number_input("Weight (in kg)", min_value=30.0, max_value=200.0, value=70.0, format="%.1f", key="user_weight")
-        height = st.number_input("Height (in cm)", min_value=100.0, max_value=250.0, value=170.0, format="%.1f", key="user_height")
-        activity_level = st.selectbox("Activity Level", ["Low", "Moderate", "High"], index=1, key="user_activity")
-        dietary_preference = st.selectbox("Dietary Preference", ["Balanced", "Keto", "Vegetarian", "Low Carb", "Vegan"], key="user_diet")
-        fitness_goal = st.selectbox("Fitness Goal", ["Weight Loss", "Muscle Gain", "Maintenance", "Endurance", "Flexibility"], key="user_goal")
-        has_bp = st.radio("High Blood Pressure?", ["No", "Yes"], key="user_bp", horizontal=True)
-        has_sugar = st.radio("High Blood Sugar/Diabetes?", ["No", "Yes"], key="user_sugar", horizontal=True)
-        weather = st.selectbox("Current Weather", ["Summer", "Rainy", "Winter", "Moderate"], key="user_weather")
-
-        # Estimate and display TDEE
-        tdee = estimate_daily_calories(weight, height, age, activity_level)
-        if tdee > 0:
-            st.markdown(f"### 🔥 Est. Daily Needs (TDEE):")
-            st.markdown(f"<p style='font-size: 24px; font-weight: bold; color: #2e7d32;'>{tdee} kcal</p>", unsafe_allow_html=True)
-        else:
-            st.warning("Provide age, weight, height for TDEE.")
-        
+        sidebar_fragment()
+
         st.markdown("---")  # Add a separator
         st.header("ℹ️ About This App")
         st.markdown(
@@ -320,237 +796,18 @@ def main():
     st.title("🥗 Food Calorie Estimator 📸")
     st.write("Upload an image of your meal, get nutritional insights, web context, and creative advice!")
 
-    # File uploader
-    uploaded_file = st.file_uploader("Choose an image...", type=["jpg", "jpeg", "png"], key="file_uploader")
-
-    # --- Processing Logic (Handles New Uploads) ---
-    if uploaded_file is not None:
-        # This block now *only* handles the initial processing of a new file
-        try:
-            image = Image.open(uploaded_file)
-            st.image(image, caption="Uploaded Image.", use_container_width=True)
+    # Batch mode replaces the single-image flow below
+    if st.toggle("📅 Batch mode: analyze a whole day's meals", key="batch_mode"):
+        batch_fragment()
+        return
 
-            # Add validation checks before allowing analysis
-            is_valid = True
-            validation_messages = []
-
-            # Check name
-            name = st.text_input("What's your name?", key="user_name_main")
-            if not name:
-                is_valid = False
-                validation_messages.append("Please enter your name")
-
-            # Check sidebar inputs
-            if not st.session_state.user_age:
-                is_valid = False
-                validation_messages.append("Please enter your age")
-            
-            if not st.session_state.user_weight:
-                is_valid = False
-                validation_messages.append("Please enter your weight")
-                
-            if not st.session_state.user_height:
-                is_valid = False
-                validation_messages.append("Please enter your height")
-                
-            if not st.session_state.user_activity:
-                is_valid = False
-                validation_messages.append("Please select your activity level")
-                
-            if not st.session_state.user_diet:
-                is_valid = False
-                validation_messages.append("Please select your dietary preference")
-                
-            if not st.session_state.user_goal:
-                is_valid = False
-                validation_messages.append("Please select your fitness goal")
-
-            # Display validation messages if any
-            if validation_messages:
-                st.warning("Please complete the following required fields:")
-                for msg in validation_messages:
-                    st.markdown(f"- {msg}")
-
-            # Only show and enable the analyze button if all inputs are valid
-            if is_valid:
-                if st.button("Analyze Image for Nutritional Information 🍽️", key="analyze_button"):
-                    with st.spinner("🔍 Analyzing the image... Please wait.",show_time=True):
-                        analysis_result = get_gemini_response(
-                            image, name, st.session_state.user_age,
-                            st.session_state.user_weight, st.session_state.user_height,
-                            st.session_state.user_activity, st.session_state.user_diet,
-                            st.session_state.user_goal, tdee, st.session_state.user_bp,
-                            st.session_state.user_sugar, st.session_state.user_weather
-                        )
-                        st.session_state.calorie_info = analysis_result
-                        st.session_state.image_processed = True
-                        st.session_state.additional_info = None
-                        st.session_state.creative_advice = None
-                        st.rerun()
-            else:
-                st.button("Analyze Image for Nutritional Information 🍽️", 
-                         key="analyze_button_disabled", 
-                         disabled=True)
-
-        except Exception as e:
-            st.error(f"🖼️ Error loading or processing image: {e}")
-            # Reset state on error
-            st.session_state.calorie_info = None
-            st.session_state.image_processed = False
-            st.session_state.additional_info = None
-            st.session_state.creative_advice = None
-
-
-    # --- Display Results Area (Depends *only* on Session State) ---
-    # MOVED OUTSIDE: This section is no longer inside 'if uploaded_file is not None'
-    if st.session_state.image_processed and st.session_state.calorie_info:
-        st.divider() # Add a visual separator
-
-        # --- Display Nutritional Analysis ---
-        st.subheader("🔬 Nutritional Analysis:")
-        with st.container(height=600): # Use container for scrollable results
-             st.markdown(st.session_state.calorie_info) # Display stored analysis
-  
-        # --- Additional Info Section ---
-        st.divider()
-        # 🌐 Section: Get More Context (Web Search)
-        st.subheader("🌐 Get More Context (Web Search)")
-
-        if st.button("Search Web Based on Analysis", key="web_search_button"):
-            with st.spinner("🤖 Searching the web...",show_time=True):
-                try:
-                    dietary_planner = Agent(
-                        model=Gemini(id="gemini-2.5-pro-exp-03-25", api_key=api_key),
-                        description=dedent("""\
-                            Creates personalized dietary plans based on user input.
-                            Generates customized workout routines based on fitness goals.
-                            Combines diet and workout plans into a holistic health strategy.            
-                            Expert nutritionist and dietary advisor specializing in personalized meal planning
-                            and evidence-based nutritional recommendations."""),
-                        instructions=dedent("""\
-                            "Generate a diet plan with breakfast, lunch, dinner, and snacks.",
-                            "Consider dietary preferences like Keto, Vegetarian, or Low Carb.",
-                            "Ensure proper hydration and electrolyte balance.",
-                            "Provide nutritional breakdown including macronutrients and vitamins.",
-                            "Suggest meal preparation tips for easy implementation.",
-                            "If necessary, search the web using DuckDuckGo for additional information.",
-                            "Create a workout plan including warm-ups, main exercises, and cool-downs.",
-                            "Adjust workouts based on fitness level: Beginner, Intermediate, Advanced.",
-                            "Consider weight loss, muscle gain, endurance, or flexibility goals.",
-                            "Provide safety tips and injury prevention advice.",
-                            "Suggest progress tracking methods for motivation.",
-                            "Merge personalized diet and fitness plans for a comprehensive approach, use tables if possible.",
-                            "Ensure alignment between diet and exercise for optimal results.",
-                            "Suggest lifestyle tips for motivation and consistency.",
-                            "Provide realistic, real-time nutritional advice tailored to the user's data with engaging emojis, including suggestions for meal modifications, portion control, and healthy eating practices."
-                            "Recommend specific yoga asanas based on user's fitness level and health conditions.",
-                            "Include optimal timing for yoga practice (morning/evening) with duration.",
-                            "List 3-4 specific yogasanas with their benefits and duration.",
-                            "Suggest meditation techniques aligned with user's lifestyle and goals.",
-                            """),
-                        expected_output=dedent("""\
-                            Prepare the output so that it captures the user data from st.session_state.calorie_info.
-                            Return additional information with clear bullet points, emojis in the headings (including yoga and meditation tips), and comprehensive advice merging diet, workout recommendations, and realistic nutritional advice tailored to the user's data with emoji-enhanced suggestions.
-                            Include a dedicated '🧘 Yoga & Meditation Corner' section with:
-                            - Best time to practice (morning/evening with specific timing)
-                            - 3-4 specific yogasanas names with their benefits
-                            - Duration for each asana (in minutes)
-                            - Total session duration
-                            - Meditation technique with timing
-                            - Breathing exercises (pranayama) if applicable
-                            Provide comprehensive advice merging diet, workout recommendations, and realistic nutritional advice 
-                            tailored to the user's data with emoji-enhanced suggestions.
-                            """),
-                        tools=[DuckDuckGoTools()],
-                        show_tool_calls=False,
-                        markdown=True
-                    )
-
-                    # Perform agent web search
-                    web_result = dietary_planner.run(st.session_state.calorie_info)
-
-                    # Store results
-                    st.session_state.additional_info = {
-                        "raw": web_result.content,
-                        "structured": web_result.content
-                    }
-
-                except Exception as err:
-                    st.error(f"❌ Web search failed: {err}")
-
-
-        # ✅ Display Web Search Results if available
-        if st.session_state.additional_info:
-            with st.expander("📄 Raw Web Search Result"):
-                st.markdown(st.session_state.additional_info["raw"], unsafe_allow_html=True)
-            
-            # Extract user name from greeting line (if available)
-            name_line = next((line for line in st.session_state.calorie_info.splitlines() if "👋 Hello" in line), None)
-            user_label = name_line.replace("👋 Hello", "").strip(",") if name_line else "User"
-
-            st.markdown("### 📌 Personalized Summary Based on Your Analysis")
-            structured_output = st.session_state.additional_info["structured"]
-            structured_output = "\n".join(
-                line for line in structured_output.splitlines()
-                if "User Data (from" not in line
-            )
-
-            # Now display the cleaned version
-            st.markdown(structured_output, unsafe_allow_html=True)            
-    
-
-        # Display additional static web insights if needed
-        if st.session_state.additional_info and "calorie_info" in st.session_state:
-            formatted_info = f"""
-            ---
-
-            ### 📝 AI-Powered Recommendations:
-            - ✅ Choose low-sodium and low-sugar options where possible.
-            - 🥗 Add fiber-rich veggies (spinach, broccoli, kale) for gut health and blood sugar support.
-            - 💧 Stay hydrated: aim for 2-3 liters per day, especially in summer.
-            - 🧘 Incorporate movement (e.g., yoga, walks, light strength training) aligned with your fitness goal.
-            - 📏 Control portion sizes — especially carbs and sauces — for better calorie management.
-            - 🔁 Revisit your plan every 1–2 weeks and tweak based on your progress and energy levels.
-
-            - 🧘 **Yoga & Meditation Tips:**
-            - 🧘‍♀️ Practice a short yoga flow to increase flexibility and reduce stress.
-            - 🕉️ Consider meditation to improve mindfulness and balance.
-            - 🌅 Try morning stretches to energize your day and improve circulation.
-
-            ---
-            """
-            st.markdown(formatted_info, unsafe_allow_html=True)
-
-        
-        # Footer with contact information
-        st.markdown("""
-        <div style='text-align: center; padding: 20px;'>
-            <p style='margin-bottom: 10px;'>
-                <strong>Contact</strong>
-            </p>
-            <p>
-                <a href="mailto:narendra.insights@gmail.com" style='text-decoration: none; margin: 0 10px;'>
-                    📧 narendra.insights@gmail.com
-                </a>
-                |
-                <a href="https://www.linkedin.com/in/nk-analytics" target="_blank" style='text-decoration: none; margin: 0 10px;'>
-                    👔 Narendra linkedin Profile
-                </a>
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-        st.markdown("---")
-        st.caption("Built with Streamlit & Google Gemini. AI estimations are approximate. Consult professionals for precise advice.")
-
-        # Add minimal styling
-        st.markdown("""
-            <style>
-            .stSelectbox {
-                margin-top: 1rem;
-            }
-            </style>
-            """, unsafe_allow_html=True)
+    upload_fragment()
+    results_fragment()
+    nutrition_fragment()
+    history_fragment()
+    web_search_fragment()
 
 # Entry point of the script
 if __name__ == "__main__":
-    main()
+    with tracing.span("app.run"):
+        main()
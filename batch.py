@@ -0,0 +1,67 @@
+"""
+Concurrent batch analysis with a concurrency cap and a token-bucket rate limit.
+
+Used by the batch mode in app.py to analyze a whole day's meal photos without
+N sequential model round-trips, while staying within the API's request quota.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        """Takes a token if one is available; never blocks."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def run_concurrently(func, items, max_concurrency=4, rate_limiter=None, initializer=None):
+    """Calls ``func(item)`` for every item on a thread pool.
+
+    At most ``max_concurrency`` calls run at once and each call first takes a
+    token from ``rate_limiter`` (if given). Yields ``(item, result, error)``
+    tuples in completion order, so callers can show results as they arrive;
+    ``error`` is the raised exception or None.
+    """
+    def call(item):
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return func(item)
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, initializer=initializer) as executor:
+        futures = {executor.submit(call, item): item for item in items}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
@@ -0,0 +1,143 @@
+"""
+Benchmark: time of a widget interaction in app.py, full-page rerun vs. fragments.
+
+The app is driven with Streamlit's AppTest in a realistic state: a photo
+uploaded, a meal analyzed and a month of meal history charted. Each
+interaction is timed two ways:
+- full: the whole script reruns, as every interaction did before the page
+  was split into fragments (the rerun_* callbacks are disabled, so they
+  can't narrow the rerun);
+- fragments: the browser asks for a rerun of the fragment holding the
+  widget, and its callback may widen that to the fragments depending on it
+  (e.g. a profile input reruns the sidebar and the analysis).
+AppTest itself always requests full reruns, so the fragment rerun is
+requested the way the browser does it. AppTest also compiles the script again
+on every run, which a server does once; the runs here share one compiled
+script so that cost doesn't hide the difference. No network requests are made.
+
+Usage:
+    python benchmarks/bench_app_reruns.py --reruns 10
+"""
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Chart history in a scratch file, set before history.py reads it
+HISTORY_DIR = tempfile.mkdtemp()
+os.environ["HISTORY_PATH"] = os.path.join(HISTORY_DIR, "history.sqlite3")
+
+import streamlit as st  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData  # noqa: E402
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache  # noqa: E402
+from streamlit.testing.v1 import AppTest, local_script_runner  # noqa: E402
+
+from benchmarks.bench_load import percentile  # noqa: E402
+from benchmarks.bench_preprocess import synthetic_photo  # noqa: E402
+from benchmarks.fakes import SAMPLE_RESPONSE  # noqa: E402
+from history import get_history  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = ("Asha", "Ravi")
+
+
+def photo(seed):
+    return (f"meal-{seed}.jpg", synthetic_photo(3000, 2250, seed), "image/jpeg")
+
+
+# label -> (fragment holding the widget, change made on rerun i)
+INTERACTIONS = {
+    "weight (sidebar, profile)": ("sidebar", lambda at, i: at.number_input(key="user_weight").set_value(70.0 + i % 2)),
+    "blood sugar (sidebar, profile)": ("sidebar", lambda at, i: at.radio(key="user_sugar").set_value(("No", "Yes")[i % 2])),
+    "stream option (sidebar)": ("sidebar", lambda at, i: at.checkbox(key="stream_analysis").set_value(i % 2 == 0)),
+    "name (upload)": ("upload", lambda at, i: at.text_input(key="user_name_main").input(USERS[i % 2])),
+    "new photo (upload)": ("upload", lambda at, i: at.file_uploader(key="file_uploader").set_value(photo(i % 2))),
+}
+
+
+def fragment_rerun(at, key):
+    """
+    Makes the next at.run() rerun only fragment ``key``, the way the browser
+    requests it for a widget inside the fragment.
+    """
+    fragment_ids = at._fragment_storage.resolve_target(key)
+    return mock.patch.object(local_script_runner, "RerunData", functools.partial(
+        RerunData, fragment_id_queue=fragment_ids, is_fragment_scoped_rerun=True,
+    ))
+
+
+def new_session(timeout):
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    at.secrets["GEMINI_API_KEY"] = "benchmark-key"
+    at.session_state["image_processed"] = True
+    at.session_state["meal"] = parse_meal(SAMPLE_RESPONSE)
+    at.session_state["user_name_main"] = USERS[0]
+    at.run()
+    at.file_uploader(key="file_uploader").set_value(photo(0)).run()
+    return at
+
+
+def check(at):
+    if at.exception:
+        raise RuntimeError(f"app raised: {[e.message for e in at.exception]}")
+
+
+def time_interaction(at, fragment, change, reruns, scoped):
+    times = []
+    for i in range(reruns):
+        change(at, i)
+        if scoped:
+            page = at._tree
+            with fragment_rerun(at, fragment):
+                start = time.perf_counter()
+                at.run()
+            times.append(time.perf_counter() - start)
+            check(at)
+            # AppTest now only holds the fragments that ran; keep the whole page for the next change
+            at._tree = page
+        else:
+            # Without their st.rerun(), the callbacks leave AppTest's full rerun in place
+            with mock.patch.object(st, "rerun"):
+                start = time.perf_counter()
+                at.run()
+            times.append(time.perf_counter() - start)
+            check(at)
+    return percentile(times, 0.5) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reruns", type=int, default=10, help="timed reruns per interaction and mode")
+    parser.add_argument("--history-days", type=int, default=30, help="days of meal history to chart")
+    parser.add_argument("--timeout", type=float, default=60, help="AppTest timeout per run (s)")
+    args = parser.parse_args()
+
+    meal = parse_meal(SAMPLE_RESPONSE)
+    history = get_history()
+    for user in USERS:
+        for day in range(args.history_days):
+            for meal_time in range(3):
+                history.add(user, meal, tdee=2100, eaten_at=time.time() - day * 86400 - meal_time * 4 * 3600)
+
+    script_cache = ScriptCache()
+    try:
+        with mock.patch.object(local_script_runner, "ScriptCache", lambda: script_cache):
+            at = new_session(args.timeout)
+            print(f"{'interaction':32s} {'full ms':>8s} {'fragments ms':>13s} {'speedup':>8s}")
+            for label, (fragment, change) in INTERACTIONS.items():
+                full = time_interaction(at, fragment, change, args.reruns, scoped=False)
+                scoped = time_interaction(at, fragment, change, args.reruns, scoped=True)
+                print(f"{label:32s} {full:8.1f} {scoped:13.1f} {full / scoped:7.1f}x")
+    finally:
+        shutil.rmtree(HISTORY_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: per-request client overhead, building per call vs. the shared registry.
+
+"Per call" mirrors the app before the registry: every analysis built a new
+GenerativeModel and every web search built a new agent (and, on its first
+run, a new Gemini HTTP client). No network requests are made.
+
+Usage:
+    python benchmarks/bench_clients.py --requests 50 --threads 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import GENERATION_CONFIG, MODEL_ID  # noqa: E402
+from clients import ClientRegistry  # noqa: E402
+from dietary_agent import AGENT_NAME, build_dietary_planner  # noqa: E402
+
+API_KEY = "benchmark-key"
+
+
+def per_call():
+    genai.GenerativeModel(MODEL_ID, generation_config=GENERATION_CONFIG)
+    agent = build_dietary_planner(API_KEY)
+    agent.model.get_client()
+
+
+def make_pooled(registry):
+    def pooled():
+        registry.get_model(MODEL_ID, generation_config=GENERATION_CONFIG)
+        with registry.agent(AGENT_NAME) as agent:
+            agent.model.get_client()
+    return pooled
+
+
+def measure(func, requests, threads):
+    def timed(_):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(timed, range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+    genai.configure(api_key=API_KEY)
+
+    before = measure(per_call, args.requests, args.threads)
+
+    registry = ClientRegistry()
+    registry.register_agent(AGENT_NAME, lambda: build_dietary_planner(API_KEY), pool_size=args.threads)
+    start = time.perf_counter()
+    registry.warm_up(models=[(MODEL_ID, {"generation_config": GENERATION_CONFIG})], agents=[AGENT_NAME])
+    warm_up = time.perf_counter() - start
+    after = measure(make_pooled(registry), args.requests, args.threads)
+
+    for label, samples in (("per call", before), ("registry", after)):
+        print(f"{label:9s} mean {statistics.mean(samples) * 1000:8.2f} ms   max {max(samples) * 1000:8.2f} ms")
+    print(f"one-time warm-up {warm_up * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: near-duplicate lookups in the multi-index hash table vs. a linear scan.
+
+Usage:
+    python benchmarks/bench_fingerprint_index.py --size 300000 --queries 2000 --distance 6
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_fingerprint import MultiIndexHashIndex, popcount64  # noqa: E402
+
+
+def flip_bits(fp, count, rng):
+    for bit in rng.sample(range(64), count):
+        fp ^= 1 << bit
+    return fp
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=300_000, help="stored fingerprints")
+    parser.add_argument("--queries", type=int, default=2_000)
+    parser.add_argument("--distance", type=int, default=6, help="max Hamming distance")
+    parser.add_argument("--chunks", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fingerprints = [rng.getrandbits(64) for _ in range(args.size)]
+
+    start = time.perf_counter()
+    index = MultiIndexHashIndex(chunks=args.chunks)
+    for i, fp in enumerate(fingerprints):
+        index.add(fp, i)
+    build_s = time.perf_counter() - start
+
+    # Half the queries are near-duplicates of stored fingerprints, half are unrelated
+    queries = []
+    for q in range(args.queries):
+        if q % 2 == 0:
+            target = rng.randrange(args.size)
+            queries.append((flip_bits(fingerprints[target], rng.randint(0, args.distance), rng), target))
+        else:
+            queries.append((rng.getrandbits(64), None))
+
+    mih_times, found = [], 0
+    for fp, target in queries:
+        start = time.perf_counter()
+        matches = index.search(fp, args.distance)
+        mih_times.append(time.perf_counter() - start)
+        if target is not None and any(value == target for _, value in matches):
+            found += 1
+
+    stored = np.array(fingerprints, dtype=np.uint64)
+    scan_times = []
+    for fp, _ in queries[: min(200, len(queries))]:
+        start = time.perf_counter()
+        np.flatnonzero(popcount64(stored ^ np.uint64(fp)) <= args.distance)
+        scan_times.append(time.perf_counter() - start)
+
+    print(f"fingerprints:          {args.size:,}  (build {build_s:.2f} s)")
+    print(f"max distance:          {args.distance}  chunks: {args.chunks}")
+    print(f"near-duplicate recall: {found}/{(args.queries + 1) // 2}")
+    print(f"multi-index  mean {statistics.mean(mih_times) * 1e6:9.1f} us   p99 {percentile(mih_times, 99) * 1e6:9.1f} us")
+    print(f"numpy scan   mean {statistics.mean(scan_times) * 1e6:9.1f} us   p99 {percentile(scan_times, 99) * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: meal-history inserts and chart queries as the history grows.
+
+Logs meals for one user over an increasing number of days, then times
+reading the chart data from the rollup tables against aggregating the
+meals table with GROUP BY (what the charts would cost without rollups).
+Inserts are timed to show the cost of maintaining the rollups.
+
+Usage:
+    python benchmarks/bench_history.py --sizes 1000 10000 100000 --meals-per-day 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_load import percentile  # noqa: E402
+from benchmarks.fakes import SAMPLE_RESPONSE  # noqa: E402
+from history import HISTORY_CHART_DAYS, HISTORY_CHART_WEEKS, MealHistory, day_and_week  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+
+USER = "Asha"
+
+
+def fill(history, user, meal, count, meals_per_day):
+    """Logs ``count`` meals ending today in one transaction (add() commits per meal, too slow for setup)."""
+    start = time.time() - count / meals_per_day * 86400
+    totals = (1, meal.total_kcal, meal.protein_g, meal.carbs_g, meal.fat_g)
+    with history._conn:
+        for i in range(count):
+            eaten_at = start + i * 86400 / meals_per_day
+            day, week = day_and_week(eaten_at)
+            history._conn.execute(
+                "INSERT INTO meals (user, eaten_at, day, week, kcal, protein_g, carbs_g, fat_g, tdee, items)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, 2100, '[]')", (user, eaten_at, day, week, *totals[1:]),
+            )
+            history._apply(user, day, week, totals, 2100)
+
+
+def scan_daily(history, days):
+    """The daily chart data computed from the meals table."""
+    return history._conn.execute(
+        "SELECT day, COUNT(*), SUM(kcal), SUM(protein_g), SUM(carbs_g), SUM(fat_g) FROM meals"
+        " WHERE user = ? GROUP BY day ORDER BY day DESC LIMIT ?", (USER, days),
+    ).fetchall()
+
+
+def scan_weekly(history, weeks):
+    return history._conn.execute(
+        "SELECT week, COUNT(DISTINCT day), COUNT(*), SUM(kcal) FROM meals"
+        " WHERE user = ? GROUP BY week ORDER BY week DESC LIMIT ?", (USER, weeks),
+    ).fetchall()
+
+
+def timed(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return percentile(times, 0.5) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="meals in the history")
+    parser.add_argument("--meals-per-day", type=int, default=4)
+    parser.add_argument("--other-users", type=int, default=20, help="users sharing the file, each with as many meals")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    meal = parse_meal(SAMPLE_RESPONSE)
+    directory = tempfile.mkdtemp()
+    print(f"{'meals':>8s} {'insert ms':>10s} {'rollup read ms':>15s} {'GROUP BY ms':>12s}")
+    try:
+        for size in args.sizes:
+            history = MealHistory(os.path.join(directory, f"history-{size}.sqlite3"))
+            for user in [USER] + [f"user{n}" for n in range(args.other_users)]:
+                fill(history, user, meal, size, args.meals_per_day)
+
+            inserts = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                history.add(USER, meal, tdee=2100)
+                inserts.append(time.perf_counter() - t)
+
+            today = date.today()
+            rollups = timed(lambda: (history.daily(USER, today=today), history.weekly(USER, today=today)), args.repeat)
+            scan = timed(lambda: (scan_daily(history, HISTORY_CHART_DAYS), scan_weekly(history, HISTORY_CHART_WEEKS)), args.repeat)
+            print(f"{size:8d} {percentile(inserts, 0.5) * 1000:10.3f} {rollups:15.3f} {scan:12.3f}")
+            history._conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: the web-search agent as a background job versus a blocking call.
+
+Uses a fake streaming agent (no network). Reports how long the UI thread is
+blocked by a search in each mode, when the first partial output appears,
+and how quickly cancellation and timeouts free the worker.
+
+Usage:
+    python benchmarks/bench_jobs.py --latency 2 --searches 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import SAMPLE_RESPONSE, FakeAgent  # noqa: E402
+from clients import ClientRegistry  # noqa: E402
+from dietary_agent import AGENT_NAME, run_dietary_planner  # noqa: E402
+from jobs import FINISHED, JobRunner  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+
+MEAL = parse_meal(SAMPLE_RESPONSE)
+PROFILE = {"name": "Asha", "age": 31, "fitness_goal": "Weight Loss"}
+
+
+def wait_for(runner, job_id, poll=0.01):
+    """Polls like the Streamlit fragment does; returns (job, seconds until first partial output)."""
+    start = time.perf_counter()
+    first_output = None
+    while True:
+        job = runner.get(job_id)
+        if first_output is None and job.partial:
+            first_output = time.perf_counter() - start
+        if job.status in FINISHED:
+            return job, first_output
+        time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds before the fake agent starts answering")
+    parser.add_argument("--searches", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    registry = ClientRegistry()
+    registry.register_agent(AGENT_NAME, lambda: FakeAgent(latency=args.latency), pool_size=args.workers)
+    runner = JobRunner(max_workers=args.workers)
+
+    blocking = []
+    for _ in range(args.searches):
+        start = time.perf_counter()
+        with registry.agent(AGENT_NAME) as agent:
+            agent.run("meal")
+        blocking.append(time.perf_counter() - start)
+
+    submit_ms, first_output, total = [], [], []
+    for _ in range(args.searches):
+        start = time.perf_counter()
+        job_id = runner.submit(run_dietary_planner, registry, MEAL, PROFILE, use_cache=False)
+        submit_ms.append((time.perf_counter() - start) * 1000)
+        job, first = wait_for(runner, job_id)
+        first_output.append(first)
+        total.append(job.elapsed)
+
+    job_id = runner.submit(run_dietary_planner, registry, MEAL, PROFILE, use_cache=False)
+    time.sleep(args.latency + 0.1)
+    start = time.perf_counter()
+    runner.cancel(job_id)
+    cancelled, _ = wait_for(runner, job_id)
+    cancel_seconds = time.perf_counter() - start
+
+    timed = runner.get(runner.submit(run_dietary_planner, registry, MEAL, PROFILE, use_cache=False, timeout=args.latency / 2))
+    wait_for(runner, timed.id)
+
+    print(f"blocking call: UI blocked {statistics.median(blocking):.2f} s per search")
+    print(f"background job: submit {statistics.median(submit_ms):.3f} ms, "
+          f"first output after {statistics.median(first_output):.2f} s, done after {statistics.median(total):.2f} s")
+    print(f"cancel: worker released {cancel_seconds * 1000:.0f} ms after request ({cancelled.status}, "
+          f"{len(cancelled.partial)} chars kept)")
+    print(f"timeout {args.latency / 2:.2f} s: {timed.status} after {timed.elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
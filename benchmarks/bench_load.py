@@ -0,0 +1,320 @@
+"""
+Offline load test: the analysis call, the web-search agent and full app reruns
+against the fake Gemini/agno backend (benchmarks/fakes.py).
+
+Scenarios:
+    analysis    analysis.get_gemini_response on distinct images (cache bypassed)
+    web_search  dietary_agent.run_dietary_planner through the shared agent pool
+    app         Streamlit AppTest sessions: first render, then reruns that
+                change a sidebar input (re-personalizes the stored analysis);
+                concurrent sessions run in separate processes
+
+Each scenario reports p50/p95/p99 latency, throughput, errors and process
+RSS. For the app scenario that is the RSS a worker gains per session it
+holds, after a throwaway render has loaded Streamlit and app.py, so it
+doesn't change with --concurrency. --json writes the report with the
+git commit so runs can be diffed; --compare prints the change against an
+earlier report.
+
+Usage:
+    python benchmarks/bench_load.py --requests 200 --concurrency 8 --latency 0.5 --jitter 0.1 --error-rate 0.02
+    python benchmarks/bench_load.py --scenarios app --sessions 10 --reruns 5 --json load.json
+    python benchmarks/bench_load.py --compare baseline.json --json load.json
+    python benchmarks/bench_load.py --responses recorded.jsonl
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+from PIL import Image  # noqa: E402
+
+import analysis  # noqa: E402
+from benchmarks.fakes import SAMPLE_RESPONSE, install_fakes, load_responses  # noqa: E402
+from clients import get_registry  # noqa: E402
+from dietary_agent import run_dietary_planner  # noqa: E402
+from jobs import Job  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("analysis", "web_search", "app")
+PROFILE = ("Asha", 31, 62.0, 165.0, "Moderate", "Vegetarian", "Weight Loss", 2100, "No", "Yes", "Summer")
+# Metrics compared by --compare, and whether lower is better
+COMPARED = {"p50_ms": True, "p95_ms": True, "p99_ms": True, "throughput_rps": False, "rss_mb_per_session": True}
+
+
+def rss_mb():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else None
+
+
+def summarize(latencies, errors, wall, rss_before, **extra):
+    ms = [s * 1000 for s in latencies]
+    report = {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": percentile(ms, 0.50),
+        "p95_ms": percentile(ms, 0.95),
+        "p99_ms": percentile(ms, 0.99),
+        "mean_ms": sum(ms) / len(ms) if ms else None,
+        "throughput_rps": len(latencies) / wall if wall else None,
+        "wall_seconds": wall,
+        "rss_mb_before": rss_before,
+        "rss_mb_after": rss_mb(),
+    }
+    report.update(extra)
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in report.items()}
+
+
+def drive(func, count, concurrency):
+    """Calls func(i) for i in range(count) on ``concurrency`` threads; func returns True on success."""
+    latencies, errors, lock = [], 0, threading.Lock()
+
+    def timed(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = func(i)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(count)))
+    return latencies, errors, time.perf_counter() - start, rss_before
+
+
+def run_analysis(args):
+    # A distinct image per request, so near-duplicate lookups can't short-circuit the model call
+    images = [Image.new("RGB", (640, 480), (i % 256, (i // 256) % 256, 128)) for i in range(args.requests)]
+
+    def one(i):
+        return not analysis.get_gemini_response(images[i], *PROFILE, use_cache=False).startswith("Error:")
+
+    latencies, errors, wall, rss_before = drive(one, args.requests, args.concurrency)
+    return summarize(latencies, errors, wall, rss_before, concurrency=args.concurrency)
+
+
+def run_web_search(args):
+    meal = parse_meal(SAMPLE_RESPONSE)
+    profile = dict(zip(analysis.PROFILE_FIELDS, PROFILE))
+
+    def one(i):
+        job = Job()
+        return bool(run_dietary_planner(job, get_registry(), meal, profile, use_cache=False))
+
+    latencies, errors, wall, rss_before = drive(one, args.requests, args.concurrency)
+    return summarize(latencies, errors, wall, rss_before, concurrency=args.concurrency)
+
+
+# AppTest sessions kept alive in an app worker process, so its RSS reflects them
+_app_sessions = []
+_app_worker_rss = None
+
+
+def _new_app_test(timeout):
+    """An AppTest of app.py showing a stored analysis (nothing is run yet)."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    at.secrets["GEMINI_API_KEY"] = "benchmark-key"
+    at.session_state["image_processed"] = True
+    at.session_state["meal"] = parse_meal(SAMPLE_RESPONSE)
+    return at
+
+
+def _init_app_worker(model_options, agent_options, agent_pool_size, timeout):
+    """
+    Process pool initializer: fakes in this process's registry, then one
+    throwaway render so the one-time import of Streamlit and app.py isn't
+    charged to the sessions. The RSS after it is the worker's baseline.
+    """
+    global _app_worker_rss
+    install_fakes(get_registry(), model_options, agent_options, agent_pool_size)
+    try:
+        _new_app_test(timeout).run()
+    except Exception:
+        pass  # the sessions count their own errors
+    _app_worker_rss = rss_mb()
+
+
+def app_session(timeout, reruns):
+    """
+    One AppTest session in an app worker: the first render, then reruns that
+    change a sidebar input. Every run that raises or shows an exception counts
+    as an error; a raised one ends the session. Returns (first render seconds
+    or None, rerun latencies, errors, pid, RSS of the warmed-up worker before
+    any session and now).
+    """
+    at = _new_app_test(timeout)
+    _app_sessions.append(at)
+    first, timings, errors = None, [], 0
+    try:
+        start = time.perf_counter()
+        at.run()
+        if at.exception:
+            errors += 1
+        else:
+            first = time.perf_counter() - start
+        for rerun in range(reruns):
+            at.radio(key="user_bp").set_value("Yes" if rerun % 2 == 0 else "No")
+            start = time.perf_counter()
+            at.run()
+            if at.exception:
+                errors += 1
+            else:
+                timings.append(time.perf_counter() - start)
+    except Exception:
+        errors += 1
+    return first, timings, errors, os.getpid(), _app_worker_rss, rss_mb()
+
+
+def run_app(args, model_options, agent_options):
+    """
+    AppTest isn't thread-safe (its runs share Streamlit's process-wide
+    runtime), so concurrent sessions run in separate worker processes, each
+    with its own fakes.
+    """
+    # AppTest replaces a worker's __main__ with app.py, so the worker functions are passed by their module name
+    from benchmarks import bench_load
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    latencies, first_renders, errors, workers = [], [], 0, {}
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=args.concurrency, mp_context=context, initializer=bench_load._init_app_worker,
+        initargs=(model_options, agent_options, args.concurrency, args.timeout),
+    ) as pool:
+        futures = [pool.submit(bench_load.app_session, args.timeout, args.reruns) for _ in range(args.sessions)]
+        for future in futures:
+            try:
+                first, timings, failed, pid, worker_before, worker_after = future.result()
+            except Exception:
+                errors += 1
+                continue
+            latencies.extend(timings)
+            errors += failed
+            if first is not None:
+                first_renders.append(first)
+            count, before, after = workers.get(pid, (0, worker_before, worker_after))
+            workers[pid] = (count + 1, before, max(after, worker_after))
+    wall = time.perf_counter() - start
+    rss_per_session = sum(after - before for _, before, after in workers.values()) / max(1, sum(n for n, _, _ in workers.values()))
+    return summarize(
+        latencies, errors, wall, rss_before,
+        sessions=args.sessions, reruns_per_session=args.reruns, concurrency=args.concurrency,
+        first_render_p50_ms=percentile([s * 1000 for s in first_renders], 0.5),
+        rss_mb_per_session=rss_per_session,
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base, current):
+    """Prints the relative change of the headline metrics against an earlier report."""
+    print(f"\nvs {base['meta'].get('commit')} (negative is faster/smaller where lower is better):")
+    for scenario, metrics in current["scenarios"].items():
+        old = base["scenarios"].get(scenario)
+        if not old:
+            continue
+        for metric, lower_is_better in COMPARED.items():
+            if metrics.get(metric) is None or not old.get(metric):
+                continue
+            change = (metrics[metric] - old[metric]) / old[metric]
+            better = change < 0 if lower_is_better else change > 0
+            print(f"  {scenario:10s} {metric:20s} {old[metric]:10.2f} -> {metrics[metric]:10.2f}  {change:+7.1%} {'✓' if better else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="calls per analysis/web_search scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=5, help="AppTest sessions for the app scenario")
+    parser.add_argument("--reruns", type=int, default=5, help="reruns per AppTest session")
+    parser.add_argument("--timeout", type=float, default=60, help="AppTest timeout per run (s)")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model/agent base latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation added to the latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake calls that fail")
+    parser.add_argument("--generation-seconds", type=float, default=0.0)
+    parser.add_argument("--responses", help="recorded model responses to replay (JSONL or directory)")
+    parser.add_argument("--agent-responses", help="recorded agent responses to replay (JSONL or directory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier --json report to compare against")
+    args = parser.parse_args()
+
+    common = {"jitter": args.jitter, "error_rate": args.error_rate, "seed": args.seed}
+    model_options = {"base_latency": args.latency, "generation_seconds": args.generation_seconds,
+                     "upload_bytes_per_s": float("inf"), **common}
+    agent_options = {"latency": args.latency, "chunk_seconds": 0.0, **common}
+    if args.responses:
+        model_options["responses"] = load_responses(args.responses)
+    if args.agent_responses:
+        agent_options["responses"] = load_responses(args.agent_responses)
+    install_fakes(get_registry(), model_options, agent_options, agent_pool_size=args.concurrency)
+
+    runners = {
+        "analysis": run_analysis,
+        "web_search": run_web_search,
+        "app": lambda args: run_app(args, model_options, agent_options),
+    }
+    report = {
+        "meta": {
+            "commit": git_commit(), "python": platform.python_version(), "timestamp": time.time(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+        },
+        "scenarios": {},
+    }
+    for scenario in args.scenarios:
+        result = runners[scenario](args)
+        report["scenarios"][scenario] = result
+        print(f"{scenario:10s} n={result['requests']:<5d} errors={result['errors']:<4d} "
+              f"p50={result['p50_ms']} ms  p95={result['p95_ms']} ms  p99={result['p99_ms']} ms  "
+              f"{result['throughput_rps']} req/s  rss={result['rss_mb_after']:.0f} MB"
+              + (f"  ({result['rss_mb_per_session']:.1f} MB/session)" if "rss_mb_per_session" in result else ""))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
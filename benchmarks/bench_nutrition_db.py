@@ -0,0 +1,108 @@
+"""
+Benchmark: fuzzy lookups and meal recomputation on a large nutrition table.
+
+Builds a synthetic table (default 100k foods) from word combinations, saves it
+as memory-mapped .npy files and measures load time, per-lookup latency for
+exact, misspelled and unknown names, and a full recompute of a parsed
+analysis. No network access.
+
+Usage:
+    python benchmarks/bench_nutrition_db.py --foods 100000 --queries 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import SAMPLE_RESPONSE  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+from nutrition_db import NutritionDB  # noqa: E402
+
+PREPARATIONS = ["grilled", "fried", "steamed", "baked", "roasted", "boiled", "raw", "smoked", "spicy", "creamy",
+                "stuffed", "braised", "sweet", "sour", "crispy", "mashed", "whole", "homemade", "tandoori", "glazed"]
+INGREDIENTS = ["chicken", "beef", "pork", "salmon", "tuna", "shrimp", "tofu", "paneer", "egg", "rice", "noodles",
+               "pasta", "potato", "lentil", "chickpea", "bean", "spinach", "broccoli", "carrot", "mushroom", "corn",
+               "cheese", "yogurt", "apple", "banana", "mango", "berry", "oat", "wheat", "quinoa", "coconut", "almond"]
+DISHES = ["curry", "salad", "soup", "sandwich", "wrap", "bowl", "stew", "pie", "cake", "burger", "pizza", "taco",
+          "risotto", "stir fry", "kebab", "masala", "biryani", "smoothie", "porridge", "dumplings"]
+
+
+def synthetic_records(count, rng):
+    seen = set()
+    while len(seen) < count:
+        name = f"{rng.choice(PREPARATIONS)} {rng.choice(INGREDIENTS)} {rng.choice(INGREDIENTS)} {rng.choice(DISHES)}"
+        if len(seen) % 3 == 0:
+            name += f" {len(seen)}"  # brand/variant suffix keeps names unique at 100k+
+        seen.add(name)
+    for name in seen:
+        yield (name, rng.uniform(20, 600), rng.uniform(0, 30), rng.uniform(0, 80), rng.uniform(0, 50), rng.uniform(30, 400))
+
+
+def misspell(name, rng):
+    chars = list(name)
+    i = rng.randrange(len(chars))
+    chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    return "".join(chars)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def time_lookups(db, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        db.lookup(query)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--foods", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    start = time.perf_counter()
+    db = NutritionDB.from_records(synthetic_records(args.foods, rng))
+    build = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        db.save(directory)
+        size_mb = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 1e6
+        start = time.perf_counter()
+        db = NutritionDB.load(directory)
+        load = time.perf_counter() - start
+
+        names = [str(n) for n in rng.sample(list(db.names), args.queries)]
+        cases = {
+            "exact": names,
+            "misspelled": [misspell(n, rng) for n in names],
+            "unknown": [f"zz{rng.randrange(10**6)} qq" for _ in names],
+        }
+        print(f"table: {len(db):,} foods, {size_mb:.1f} MB on disk, built in {build:.2f} s, mmap load {load * 1000:.2f} ms")
+        for case, queries in cases.items():
+            timings = time_lookups(db, queries)
+            print(f"lookup {case:11s} p50 {statistics.median(timings):7.1f} us  p95 {percentile(timings, 0.95):7.1f} us  "
+                  f"p99 {percentile(timings, 0.99):7.1f} us")
+
+        items = [(item.name, item.kcal) for item in parse_meal(SAMPLE_RESPONSE).items]
+        timings = []
+        for _ in range(args.queries // 10 or 1):
+            start = time.perf_counter()
+            db.estimate(items)
+            timings.append((time.perf_counter() - start) * 1e6)
+        print(f"recompute {len(items)}-item meal (names memoized): p50 {statistics.median(timings):.1f} us, p95 {percentile(timings, 0.95):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: raw full-resolution upload vs. preprocess_image(), against a local fake model.
+
+The raw path mirrors the app before preprocessing: `Image.open(upload)` is passed
+to `generate_content`, which the SDK serializes as lossless WebP.
+
+Usage:
+    python benchmarks/bench_preprocess.py --width 4032 --height 3024 --runs 3
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeGenerativeModel  # noqa: E402
+from image_preprocess import preprocess_image  # noqa: E402
+
+
+def synthetic_photo(width, height, seed=0):
+    """A phone-camera-like JPEG: smooth shapes plus sensor noise."""
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray((rng.random((height // 16, width // 16, 3)) * 255).astype(np.uint8))
+    base = base.resize((width, height), Image.BICUBIC).filter(ImageFilter.GaussianBlur(4))
+    noisy = np.asarray(base, dtype=np.int16) + rng.normal(0, 6, (height, width, 3)).astype(np.int16)
+    buf = io.BytesIO()
+    Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8)).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-dimension", type=int, default=1536)
+    parser.add_argument("--max-kb", type=int, default=512)
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP"])
+    parser.add_argument("--base-latency", type=float, default=0.8, help="fake model latency in seconds")
+    parser.add_argument("--bandwidth-mbps", type=float, default=16.0, help="simulated upload bandwidth")
+    args = parser.parse_args()
+
+    upload = synthetic_photo(args.width, args.height)
+    model = FakeGenerativeModel(base_latency=args.base_latency, upload_bytes_per_s=args.bandwidth_mbps * 1e6 / 8)
+    print(f"input: {args.width}x{args.height} JPEG, {len(upload) / 1024:,.0f} KB")
+
+    results = {}
+    for label in ("raw", "preprocessed"):
+        totals, prep_times, payloads = [], [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            if label == "raw":
+                image = Image.open(io.BytesIO(upload))
+                prep_times.append(0.0)
+            else:
+                prepared = preprocess_image(upload, max_dimension=args.max_dimension, max_bytes=args.max_kb * 1024, image_format=args.format)
+                image = prepared.as_blob()
+                prep_times.append(prepared.stats.seconds)
+            model.generate_content(["prompt", image])
+            totals.append(time.perf_counter() - start)
+            payloads.append(model.last_payload_bytes)
+        results[label] = (statistics.mean(totals), statistics.mean(prep_times), statistics.mean(payloads))
+
+    for label, (total, prep, payload) in results.items():
+        print(f"{label:13s} total {total:6.2f} s   preprocess {prep * 1000:6.0f} ms   payload {payload / 1024:9,.0f} KB")
+    raw, pre = results["raw"], results["preprocessed"]
+    print(f"latency reduction {1 - pre[0] / raw[0]:.0%}, payload reduction {1 - pre[2] / raw[2]:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Benchmark: accuracy, cost and savings of the local pre-screen (prescreen.py).
+
+Builds a labelled set of synthetic photos: plated meals (textured food on a
+round plate over a table), with degradations that should still pass (JPEG
+artefacts, slight blur, dim or bright light, a small upload), and unusable
+ones that should be rejected (heavy blur, near darkness, blown highlights,
+blank frames, a text document). Each is screened the way the app does it,
+on its display thumbnail. The report covers:
+- false rejects (good photos rejected) and misses (bad photos let through);
+- screening time per photo;
+- model time saved, taking each rejected photo as one model call of
+  --model-seconds;
+- the share of pixels removed by the plate crop (PRESCREEN_CROP=1) from
+  good photos.
+
+Synthetic photos are no substitute for real uploads. Re-run with --images DIR
+on a folder of real meal photos (all counted as good) to check the false
+reject rate before tightening the thresholds.
+
+Usage:
+    python benchmarks/bench_prescreen.py --meals 40 --model-seconds 4
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_load import percentile  # noqa: E402
+from prescreen import screen  # noqa: E402
+from session_store import make_thumbnail  # noqa: E402
+
+
+def synthetic_meal(seed, width=1600, height=1200):
+    """A plate with a few textured food items on a table, lightly blurred and noisy."""
+    rng = np.random.default_rng(seed)
+    table = rng.random((height // 40, width // 40, 3)) * 60 + rng.integers(60, 160, 3)
+    image = Image.fromarray(table.astype(np.uint8)).resize((width, height), Image.BICUBIC)
+    draw = ImageDraw.Draw(image)
+    cx, cy = width // 2 + rng.integers(-100, 100), height // 2 + rng.integers(-80, 80)
+    r = int(min(width, height) * rng.uniform(0.3, 0.42))
+    draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=(235, 235, 230), outline=(200, 200, 195), width=8)
+    for _ in range(rng.integers(3, 7)):
+        angle, distance = rng.uniform(0, 2 * np.pi), rng.uniform(0, r * 0.5)
+        fx, fy, fr = cx + distance * np.cos(angle), cy + distance * np.sin(angle), rng.uniform(r * 0.15, r * 0.35)
+        color = rng.integers(30, 230, 3)
+        draw.ellipse((fx - fr, fy - fr * 0.8, fx + fr, fy + fr * 0.8), fill=tuple(int(c) for c in color))
+        # Grains and pieces, so the food has texture like rice, beans or chopped vegetables
+        for _ in range(int(fr * fr / 40)):
+            gx, gy, size = fx + rng.uniform(-fr, fr) * 0.9, fy + rng.uniform(-fr, fr) * 0.7, rng.uniform(2, 6)
+            grain = np.clip(color + rng.integers(-40, 40, 3), 0, 255)
+            draw.ellipse((gx - size, gy - size / 2, gx + size, gy + size / 2), fill=tuple(int(c) for c in grain))
+    pixels = np.asarray(image.filter(ImageFilter.GaussianBlur(1.0)), dtype=np.int16)
+    pixels = pixels + rng.normal(0, 4, pixels.shape).astype(np.int16)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def scaled(image, factor):
+    return Image.fromarray(np.clip(np.asarray(image, dtype=np.float32) * factor, 0, 255).astype(np.uint8))
+
+
+def document(seed):
+    image = Image.new("RGB", (1200, 1600), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(80, 1500, 40):
+        draw.text((80, y), f"Receipt line {seed}-{y}: item, quantity, price ... " * 2, fill=(20, 20, 20))
+    return image
+
+
+GOOD = {
+    "clean": lambda image, seed: image,
+    "jpeg q40": lambda image, seed: Image.open(io.BytesIO(jpeg(image, quality=40))),
+    "slight blur": lambda image, seed: image.filter(ImageFilter.GaussianBlur(1.5)),
+    "dim": lambda image, seed: scaled(image, 0.5),
+    "bright": lambda image, seed: scaled(image, 1.2),
+    "small": lambda image, seed: image.resize((640, 480), Image.LANCZOS),
+}
+BAD = {
+    "heavy blur": lambda image, seed: image.filter(ImageFilter.GaussianBlur(6)),
+    "dark": lambda image, seed: scaled(image, 0.12),
+    "overexposed": lambda image, seed: scaled(image, 3.0),
+    "blank": lambda image, seed: Image.new("RGB", (1600, 1200), tuple(int(c) for c in np.random.default_rng(seed).integers(0, 255, 3))),
+    "document": lambda image, seed: document(seed),
+}
+
+
+def jpeg(image, quality=88):
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def screen_upload(data, crop=False):
+    """
+    Screens an upload the way the app does: on its display thumbnail. Only the
+    screen is timed, since the app makes the thumbnail for display anyway.
+    """
+    thumbnail = make_thumbnail(Image.open(io.BytesIO(data)))
+    start = time.perf_counter()
+    result = screen(thumbnail, crop=crop)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=40, help="synthetic meals; each gets every variant")
+    parser.add_argument("--images", help="folder of real meal photos, added to the good set")
+    parser.add_argument("--model-seconds", type=float, default=4.0, help="assumed time of one model call")
+    args = parser.parse_args()
+
+    rows = []  # (variant, expected reject, result, seconds)
+    for seed in range(args.meals):
+        meal = synthetic_meal(seed)
+        for variants, bad in ((GOOD, False), (BAD, True)):
+            for label, make in variants.items():
+                result, seconds = screen_upload(jpeg(make(meal, seed)))
+                rows.append((label, bad, result, seconds))
+    if args.images:
+        for filename in sorted(os.listdir(args.images)):
+            with open(os.path.join(args.images, filename), "rb") as f:
+                result, seconds = screen_upload(f.read())
+            rows.append(("real photo", False, result, seconds))
+
+    print(f"{'variant':14s} {'expected':>9s} {'rejected':>9s} {'warned':>7s} {'p50 ms':>7s}")
+    for label in dict.fromkeys(row[0] for row in rows):
+        subset = [row for row in rows if row[0] == label]
+        rejected = sum(row[2].rejected for row in subset)
+        warned = sum(bool(row[2].warnings) and not row[2].rejected for row in subset)
+        print(f"{label:14s} {'reject' if subset[0][1] else 'pass':>9s} {rejected:5d}/{len(subset):<3d} "
+              f"{warned:7d} {percentile([row[3] for row in subset], 0.5) * 1000:7.1f}")
+
+    good = [row for row in rows if not row[1]]
+    bad = [row for row in rows if row[1]]
+    false_rejects = sum(row[2].rejected for row in good)
+    misses = sum(not row[2].rejected for row in bad)
+    screen_seconds = sum(row[3] for row in rows)
+    saved = sum(row[2].rejected for row in rows) * args.model_seconds - screen_seconds
+    print(f"\nfalse rejects: {false_rejects}/{len(good)} ({false_rejects / len(good):.1%}), "
+          f"misses: {misses}/{len(bad)} ({misses / len(bad):.1%})")
+    print(f"screening: p50 {percentile([row[3] for row in rows], 0.5) * 1000:.1f} ms, "
+          f"p95 {percentile([row[3] for row in rows], 0.95) * 1000:.1f} ms per photo")
+    print(f"model time saved: {saved:,.0f} s over {len(rows)} photos "
+          f"({saved / len(rows):.2f} s per photo at {args.model_seconds:g} s per call)")
+
+    areas = []
+    for seed in range(args.meals):
+        crop = screen_upload(jpeg(synthetic_meal(seed)), crop=True)[0].crop
+        areas.append(0.0 if crop is None else 1 - (crop[2] - crop[0]) * (crop[3] - crop[1]))
+    print(f"plate crop: found on {sum(a > 0 for a in areas)}/{len(areas)} clean meals, "
+          f"{np.mean(areas):.0%} of pixels removed on average")
+
+
+if __name__ == "__main__":
+    main()
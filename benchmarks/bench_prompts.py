@@ -0,0 +1,98 @@
+"""
+Benchmark: tokens and latency per prompt variant (prompts.py), against a local fake model.
+
+Runs analysis.analyze_image on distinct images (result cache bypassed) with
+each prompt variant, with the fake's implicit prefix cache off and on, and
+reports from the token meter the input, cached and output tokens per call
+and the p50 latency. The fake charges --prefill-tokens-per-s for uncached
+input tokens, so a shorter or cached prompt answers sooner.
+
+Gemini only caches a prefix of at least --min-cached-tokens (1024 for the
+2.5 models); the vision prompts are shorter than that, so with the default
+the "on" rows show what the backend does today. Lower it to see the effect
+of a cached prefix. The fake always replays the same answer, so output
+tokens don't change here; compare real answers before switching variants.
+
+The agent's prompts are measured too: the system prompt (description,
+instructions, expected output) and the message for a sample meal and
+profile, in estimated tokens.
+
+Usage:
+    python benchmarks/bench_prompts.py --calls 20 --base-latency 0.3 --prefill-tokens-per-s 2000
+    python benchmarks/bench_prompts.py --min-cached-tokens 100
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+import analysis  # noqa: E402
+from benchmarks.bench_load import percentile  # noqa: E402
+from benchmarks.fakes import SAMPLE_RESPONSE, FakeGenerativeModel  # noqa: E402
+from clients import get_registry  # noqa: E402
+from dietary_agent import planner_request  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+from prompts import VARIANTS, estimate_tokens, get_prompt, get_token_meter, set_variant  # noqa: E402
+
+PROFILE = {
+    "name": "Asha", "age": 31, "weight": 62.0, "height": 165.0, "activity_level": "Moderate",
+    "dietary_preference": "Vegetarian", "fitness_goal": "Weight Loss", "tdee": 2100,
+    "has_bp": "No", "has_sugar": "Yes", "weather": "Summer",
+}
+
+
+def run_variant(variant, images, model_options):
+    """p50 seconds per call and the token meter row of ``variant`` with a fresh fake model."""
+    get_registry().set_model_factory(lambda model_id, **config: FakeGenerativeModel(model_id, **model_options))
+    get_token_meter().clear()
+    set_variant(variant)
+    times = []
+    for image in images:
+        start = time.perf_counter()
+        if analysis.analyze_image(image, use_cache=False) is None:
+            raise RuntimeError("analysis failed")
+        times.append(time.perf_counter() - start)
+    (row,) = get_token_meter().stats()
+    return percentile(times, 0.5), row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20, help="model calls per variant and cache setting")
+    parser.add_argument("--base-latency", type=float, default=0.3, help="seconds of fixed latency per call")
+    parser.add_argument("--prefill-tokens-per-s", type=float, default=2000, help="input tokens the fake reads per second")
+    parser.add_argument("--min-cached-tokens", type=int, default=1024, help="shortest prefix the fake caches")
+    args = parser.parse_args()
+
+    images = [Image.new("RGB", (512, 384), (40 + i * 7 % 200, 120, 60)) for i in range(args.calls)]
+    print(f"{'variant':9s} {'prefix cache':>12s} {'version':>13s} {'input':>6s} {'cached':>7s} {'output':>7s} {'p50 ms':>7s}")
+    try:
+        for variant in VARIANTS:
+            for cache in (False, True):
+                seconds, row = run_variant(variant, images, {
+                    "base_latency": args.base_latency, "upload_bytes_per_s": float("inf"),
+                    "prefill_tokens_per_s": args.prefill_tokens_per_s,
+                    "prefix_cache_min_tokens": args.min_cached_tokens if cache else None,
+                })
+                calls = row["calls"]
+                print(f"{variant:9s} {'on' if cache else 'off':>12s} {row['version']:>13s} {row['input_tokens'] / calls:6.0f} "
+                      f"{row['cached_tokens'] / calls:7.0f} {row['output_tokens'] / calls:7.0f} {seconds * 1000:7.0f}")
+    finally:
+        set_variant(None)
+
+    meal = parse_meal(SAMPLE_RESPONSE)
+    print(f"\n{'agent':9s} {'system tokens':>14s} {'message tokens':>15s}")
+    for variant in VARIANTS:
+        system = sum(get_prompt(name, variant).tokens for name in ("agent.description", "agent.instructions", "agent.expected_output"))
+        message, _ = planner_request(meal, PROFILE, variant)
+        print(f"{variant:9s} {system:14d} {estimate_tokens(message):15d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: image work per Streamlit rerun, uncached vs. the image cache.
+
+A rerun with a photo uploaded used to decode it and make the display
+thumbnail again (app.render_image), and each click on Analyze preprocessed it
+again (app.preprocess). The cached path hashes the upload once per Streamlit
+upload id and then serves both from image_cache.ImageCache. The last part
+uploads many distinct photos to check that the cache stays within its bound.
+
+Usage:
+    python benchmarks/bench_rerun_images.py --width 4032 --height 3024 --reruns 20
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_MAX_KB  # noqa: E402
+from benchmarks.bench_load import percentile  # noqa: E402
+from benchmarks.bench_preprocess import synthetic_photo  # noqa: E402
+from image_cache import ImageCache  # noqa: E402
+from image_preprocess import preprocess_image  # noqa: E402
+from session_store import make_thumbnail  # noqa: E402
+
+SETTINGS = (IMAGE_MAX_DIMENSION, IMAGE_MAX_KB * 1024, IMAGE_FORMAT)
+
+
+class Upload(io.BytesIO):
+    """Stands in for a Streamlit UploadedFile: bytes plus a file_id."""
+
+    def __init__(self, data, file_id):
+        super().__init__(data)
+        self.file_id = file_id
+
+
+def per_call_ms(func, reruns):
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return percentile(times, 0.5) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--distinct", type=int, default=40, help="distinct uploads for the memory bound check")
+    parser.add_argument("--max-mb", type=float, default=32, help="cache bound for the memory check")
+    args = parser.parse_args()
+
+    upload = Upload(synthetic_photo(args.width, args.height), file_id="upload-0")
+    print(f"input: {args.width}x{args.height} JPEG, {len(upload.getvalue()) / 1024:,.0f} KB\n")
+
+    cache = ImageCache()
+    uncached = {
+        "render (decode + thumbnail)": lambda: make_thumbnail(Image.open(io.BytesIO(upload.getvalue()))),
+        "preprocess for the model": lambda: preprocess_image(upload, *SETTINGS),
+    }
+    cached = {
+        "render (decode + thumbnail)": lambda: cache.thumbnail(upload),
+        "preprocess for the model": lambda: cache.prepared(upload, *SETTINGS),
+    }
+    # First call fills the cache; the timed reruns are hits
+    first = {label: per_call_ms(func, 1) for label, func in cached.items()}
+
+    print(f"{'per rerun':30s} {'uncached ms':>12s} {'first ms':>9s} {'cached ms':>10s}")
+    for label in uncached:
+        print(f"{label:30s} {per_call_ms(uncached[label], args.reruns):12.1f} {first[label]:9.1f} "
+              f"{per_call_ms(cached[label], args.reruns):10.3f}")
+
+    bounded = ImageCache(max_bytes=int(args.max_mb * 1024 * 1024))
+    photos = [synthetic_photo(1600, 1200, seed) for seed in range(8)]
+    for n in range(args.distinct):
+        # Distinct bytes per upload: the same pixels with a different JPEG quality
+        buf = io.BytesIO()
+        Image.open(io.BytesIO(photos[n % len(photos)])).save(buf, format="JPEG", quality=60 + n % 35)
+        photo = Upload(buf.getvalue(), file_id=f"upload-{n + 1}")
+        bounded.thumbnail(photo)
+        bounded.prepared(photo, *SETTINGS)
+    stats = bounded.stats()
+    print(f"\n{args.distinct} distinct uploads, bound {args.max_mb:.0f} MB: {stats['bytes'] / 2**20:.1f} MB held, "
+          f"{stats['entries']} entries, {stats['evictions']} evicted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: retries, circuit breaker and single-flight against a fault-injecting fake model.
+
+flaky     a share of calls fail transiently (and a few permanently); success
+          rate and latency with retries vs. a single attempt
+outage    the service is down; how long each request takes to fail with the
+          circuit breaker vs. retrying every request in full
+coalesce  many sessions analyze the same photo at once; model calls made with
+          single-flight coalescing vs. without
+
+Usage:
+    python benchmarks/bench_resilience.py --requests 200 --concurrency 8 --error-rate 0.2
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+import analysis  # noqa: E402
+import resilience  # noqa: E402
+from benchmarks.bench_load import percentile  # noqa: E402
+from benchmarks.fakes import FakeGenerativeModel  # noqa: E402
+from clients import get_registry  # noqa: E402
+
+PROFILE = ("Asha", 31, 62.0, 165.0, "Moderate", "Vegetarian", "Weight Loss", 2100, "No", "Yes", "Summer")
+_rng = np.random.default_rng(0)
+
+
+def fresh_images(n):
+    """Random images, so requests miss the result cache and its near-duplicate lookup."""
+    return [Image.fromarray(_rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)).resize((320, 240)) for _ in range(n)]
+
+
+def setup(args, **model_options):
+    """Installs a fresh fake model and breaker; returns the model."""
+    options = {"base_latency": args.latency, "upload_bytes_per_s": float("inf"), "seed": args.seed, **model_options}
+    get_registry().set_model_factory(lambda model_id, **config: FakeGenerativeModel(model_id, **options))
+    resilience.get_breaker.cache_clear()
+    return get_registry().get_model(analysis.MODEL_ID, generation_config=analysis.GENERATION_CONFIG)
+
+
+def run(images, concurrency, use_cache=False):
+    """Runs get_gemini_response over the images; returns (latencies of successes, latencies of failures)."""
+    def one(image):
+        start = time.perf_counter()
+        ok = not analysis.get_gemini_response(image, *PROFILE, use_cache=use_cache).startswith("Error:")
+        return ok, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, images))
+    return [s for ok, s in results if ok], [s for ok, s in results if not ok]
+
+
+def ms(values, q):
+    value = percentile(values, q)
+    return f"{value * 1000:7.0f}" if value is not None else "      -"
+
+
+def flaky(args):
+    print(f"flaky: {args.error_rate:.0%} transient + {args.fatal_rate:.0%} permanent errors, {args.requests} requests")
+    print(f"  {'':12s} {'success':>8s} {'model calls':>12s} {'p50 ms':>7s} {'p95 ms':>7s}")
+    for label, attempts in (("no retries", 1), ("retries", resilience.RETRY_ATTEMPTS)):
+        model = setup(args, error_rate=args.error_rate, fatal_rate=args.fatal_rate)
+        analysis.RETRY_POLICY = resilience.RetryPolicy(attempts, args.retry_base, resilience.RETRY_MAX_SECONDS)
+        # Keep the breaker out of this scenario
+        resilience.get_breaker(analysis.MODEL_ID).failure_threshold = float("inf")
+        ok, failed = run(fresh_images(args.requests), args.concurrency)
+        print(f"  {label:12s} {len(ok) / args.requests:8.1%} {model.calls:12d} {ms(ok, 0.5)} {ms(ok, 0.95)}")
+
+
+def outage(args):
+    print(f"\noutage: every call fails, {args.requests} requests")
+    print(f"  {'':12s} {'model calls':>12s} {'p50 ms to error':>16s} {'p95':>7s}")
+    for label, threshold in (("no breaker", float("inf")), ("breaker", resilience.BREAKER_FAILURES)):
+        model = setup(args)
+        model.replay.outage(3600)
+        analysis.RETRY_POLICY = resilience.RetryPolicy(resilience.RETRY_ATTEMPTS, args.retry_base, resilience.RETRY_MAX_SECONDS)
+        resilience.get_breaker(analysis.MODEL_ID).failure_threshold = threshold
+        _, failed = run(fresh_images(args.requests), args.concurrency)
+        print(f"  {label:12s} {model.calls:12d} {ms(failed, 0.5):>16s} {ms(failed, 0.95)}")
+
+
+def coalesce(args):
+    print(f"\ncoalesce: {args.requests} concurrent requests for the same photo")
+    print(f"  {'':14s} {'model calls':>12s} {'p50 ms':>7s} {'p95 ms':>7s}")
+    claim = analysis._claim
+    for label, coalescing in (("no coalescing", False), ("single-flight", True)):
+        model = setup(args)
+        analysis._claim = claim if coalescing else (lambda cached_text, cache_key: nullcontext(True))
+        image = fresh_images(1)[0]
+        ok, _ = run([image] * args.requests, args.requests, use_cache=True)
+        print(f"  {label:14s} {model.calls:12d} {ms(ok, 0.5)} {ms(ok, 0.95)}")
+    analysis._claim = claim
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--fatal-rate", type=float, default=0.02)
+    parser.add_argument("--retry-base", type=float, default=0.05, help="first backoff step (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="+", choices=["flaky", "outage", "coalesce"], default=["flaky", "outage", "coalesce"])
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)  # every injected failure is logged otherwise
+
+    scenarios = {"flaky": flaky, "outage": outage, "coalesce": coalesce}
+    for name in args.scenarios:
+        scenarios[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: memory held by many concurrent sessions, plain session state vs. session_store.
+
+Each simulated session uploads a photo, gets a rendered analysis, runs a web
+search and a small batch. "plain" keeps what the app used to keep per session:
+the rendered markdown, the agent output (as "raw" and "structured") and the
+full-resolution image st.image sends to the browser. "store" keeps what the app
+keeps now: a thumbnail and the agent output in the SessionStore, and nothing
+for the analysis, which is rebuilt from the parsed meal on each rerun. Web
+searches are answered from the plan cache for a share of the sessions, as
+when users analyze the same dish.
+
+Python-level allocations are measured with tracemalloc (deterministic) and
+process RSS alongside. The store is then swept as if all sessions went idle.
+
+Usage:
+    python benchmarks/bench_session_memory.py --sessions 300 --concurrency 16 --max-kb 256
+"""
+import argparse
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis import format_analysis  # noqa: E402
+from benchmarks.bench_load import rss_mb  # noqa: E402
+from benchmarks.bench_preprocess import synthetic_photo  # noqa: E402
+from benchmarks.fakes import SAMPLE_PLAN, SAMPLE_RESPONSE  # noqa: E402
+from meal_schema import parse_meal  # noqa: E402
+from personalize import personalize  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+PROFILE = ("Asha", 31, 62.0, 165.0, "Moderate", "Vegetarian", "Weight Loss", 2100, "No", "Yes", "Summer")
+
+
+def make_plan(seed):
+    """An agent answer of realistic length (~8 KB of markdown)."""
+    rng = random.Random(seed)
+    lines = [line.replace("20 minutes", f"{rng.randint(10, 40)} minutes") for line in SAMPLE_PLAN.splitlines()]
+    return "\n".join(lines * 40)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--photos", type=int, default=8, help="distinct photos uploaded across sessions")
+    parser.add_argument("--width", type=int, default=2000)
+    parser.add_argument("--height", type=int, default=1500)
+    parser.add_argument("--batch", type=int, default=3, help="batch analyses per session")
+    parser.add_argument("--shared-plans", type=float, default=0.5, help="share of sessions getting a cached plan")
+    parser.add_argument("--max-kb", type=int, default=256, help="per-session ceiling of the store")
+    args = parser.parse_args()
+
+    photos = [synthetic_photo(args.width, args.height, seed) for seed in range(args.photos)]
+    meal = parse_meal(SAMPLE_RESPONSE)
+    shared_plan = make_plan(-1)
+    spill_dir = tempfile.mkdtemp()
+
+    def session_values(i):
+        rng = random.Random(i)
+        plan = shared_plan if rng.random() < args.shared_plans else make_plan(i)
+        profile = (f"user{i}",) + PROFILE[1:]
+        markdown = format_analysis(personalize(meal, *profile), *profile)
+        return photos[i % len(photos)], plan, markdown, profile
+
+    def plain(i):
+        photo, plan, markdown, profile = session_values(i)
+        # st.image(Image.open(upload)) re-encoded the full-resolution image for the browser
+        buf = io.BytesIO()
+        Image.open(io.BytesIO(photo)).save(buf, format="JPEG", quality=90)
+        return {
+            "calorie_info": markdown,
+            "additional_info": {"raw": plan, "structured": plan},
+            "image": buf.getvalue(),
+            "batch_results": [{"analysis": format_analysis(meal, *profile)} for _ in range(args.batch)],
+        }
+
+    def stored(i, store):
+        photo, plan, _, profile = session_values(i)
+        sid = f"session-{i}"
+        store.set_image(sid, "upload", Image.open(io.BytesIO(photo)))
+        store.set_text(sid, "additional_info", plan)
+        for n in range(args.batch):
+            store.set_text(sid, f"batch_{n}", format_analysis(meal, *profile))
+        return {"meal": meal, "profile": dict(enumerate(profile))}
+
+    print(f"{args.sessions} sessions, {args.concurrency} concurrent, {args.width}x{args.height} photos\n")
+    print(f"{'':8s} {'python MB':>10s} {'per session':>12s} {'RSS MB':>8s} {'seconds':>8s}")
+    for label in ("plain", "store"):
+        store = SessionStore(spill_dir=spill_dir, max_session_bytes=args.max_kb * 1024)
+        tracemalloc.start()
+        rss_before = rss_mb()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            states = list(pool.map(plain if label == "plain" else lambda i: stored(i, store), range(args.sessions)))
+        seconds = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        print(f"{label:8s} {current / 2**20:10.1f} {current / args.sessions / 1024:9.1f} KB "
+              f"{rss_mb() - rss_before:8.1f} {seconds:8.2f}")
+        if label == "store":
+            print(f"         store: {store.stats()}")
+            store.sweep(now=time.time() + store.idle_seconds + 1)
+            current, _ = tracemalloc.get_traced_memory()
+            print(f"{'idle':8s} {current / 2**20:10.1f} {current / args.sessions / 1024:9.1f} KB   "
+                  f"(all sessions spilled to disk: {store.stats()['spilled_blobs']} files)")
+        tracemalloc.stop()
+        del states
+    shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: cold-start import time per module and first-render latency of app.py.
+
+Each run starts a fresh interpreter with `-X importtime`, renders the app once
+with Streamlit's AppTest and reports where the time went. No network requests
+are made (the API key is a placeholder and no analysis is triggered).
+
+Usage:
+    python benchmarks/bench_startup.py --runs 3
+    python benchmarks/bench_startup.py --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules worth watching individually; everything else is summarized by the top-N list
+WATCHED = [
+    "streamlit", "google.generativeai", "agno", "matplotlib", "pandas", "numpy", "PIL", "cv2", "plotly",
+    "analysis", "clients", "dietary_agent", "image_fingerprint", "image_preprocess", "result_cache",
+]
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def child():
+    """Runs inside the measured interpreter: one AppTest render, timings to stdout."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    at.secrets["GEMINI_API_KEY"] = "benchmark-key"
+    harness = time.perf_counter()
+    at.run()
+    done = time.perf_counter()
+    print(json.dumps({
+        "harness_seconds": harness - start,
+        "first_render_seconds": done - harness,
+        "exception": [e.message for e in at.exception],
+    }))
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds per imported module (first import only)."""
+    cumulative = {}
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            cumulative.setdefault(match.group(4), int(match.group(2)))
+    return cumulative
+
+
+def measure_once():
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings["imports_us"] = parse_importtime(proc.stderr)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="also list the N slowest app-level imports")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    if runs[0]["exception"]:
+        print("app raised during render:", runs[0]["exception"], file=sys.stderr)
+
+    first_render = statistics.median(r["first_render_seconds"] for r in runs)
+    # Modules imported in every run (includes what the AppTest harness itself loads)
+    app_modules = set.intersection(*(set(r["imports_us"]) for r in runs))
+    imports_ms = {m: statistics.median(r["imports_us"][m] for r in runs) / 1000 for m in app_modules}
+    report = {
+        "runs": args.runs,
+        "first_render_ms": round(first_render * 1000, 1),
+        "watched_imports_ms": {m: round(imports_ms.get(m, 0.0), 1) for m in WATCHED},
+        "top_imports_ms": dict(sorted(
+            ((m, round(t, 1)) for m, t in imports_ms.items() if "." not in m),
+            key=lambda item: -item[1],
+        )[: args.top]),
+    }
+
+    print(f"first render (median of {args.runs}): {report['first_render_ms']:.0f} ms")
+    print("watched modules (cumulative import ms, 0 = not imported):")
+    for module, ms in report["watched_imports_ms"].items():
+        print(f"  {module:22s} {ms:9.1f}")
+    print("slowest top-level imports:")
+    for module, ms in report["top_imports_ms"].items():
+        print(f"  {module:22s} {ms:9.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
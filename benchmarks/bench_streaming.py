@@ -0,0 +1,71 @@
+"""
+Benchmark: time until the user sees output, blocking vs. streamed analysis.
+
+Drives analysis.get_gemini_response and analysis.stream_gemini_response against
+a local fake model that generates its answer over a configurable duration.
+Both are warmed up untimed first, and the timed runs alternate their order.
+
+Usage:
+    python benchmarks/bench_streaming.py --base-latency 1.0 --generation-seconds 6 --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+import analysis  # noqa: E402
+from benchmarks.fakes import FakeGenerativeModel  # noqa: E402
+from clients import get_registry  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--base-latency", type=float, default=1.0, help="seconds before the first token")
+    parser.add_argument("--generation-seconds", type=float, default=6.0, help="seconds to generate the full answer")
+    parser.add_argument("--chunk-chars", type=int, default=80)
+    args = parser.parse_args()
+
+    get_registry().set_model_factory(lambda model_name, **kwargs: FakeGenerativeModel(
+        model_name, base_latency=args.base_latency, generation_seconds=args.generation_seconds,
+        chunk_chars=args.chunk_chars, upload_bytes_per_s=float("inf"),
+    ))
+    image = Image.new("RGB", (512, 384), (180, 120, 60))
+
+    def blocking_run():
+        start = time.perf_counter()
+        analysis.get_gemini_response(image, "Asha", use_cache=False)
+        return time.perf_counter() - start
+
+    def streaming_run():
+        result = analysis.StreamResult()
+        for _chunk in analysis.stream_gemini_response(image, use_cache=False, result=result):
+            pass
+        analysis.format_analysis(result.meal, "Asha")
+        return result.first_token_seconds, result.total_seconds
+
+    # Untimed warm-up of both paths, so neither absorbs one-time setup (model build, imports, caches)
+    blocking_run()
+    streaming_run()
+
+    blocking, streamed = [], []
+    modes = [lambda: blocking.append(blocking_run()), lambda: streamed.append(streaming_run())]
+    for run in range(args.runs):
+        # Alternate which mode goes first, so drift over the runs affects both alike
+        for mode in modes if run % 2 == 0 else reversed(modes):
+            mode()
+    first_tokens, completes = zip(*streamed)
+
+    print(f"blocking   first output {statistics.mean(blocking):5.2f} s   complete {statistics.mean(blocking):5.2f} s")
+    print(f"streaming  first output {statistics.mean(first_tokens):5.2f} s   complete {statistics.mean(completes):5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
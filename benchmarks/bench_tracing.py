@@ -0,0 +1,78 @@
+"""
+Benchmark: cost of tracing spans, disabled and enabled.
+
+Times a bare span, then analysis.get_gemini_response against the fake model
+(no network latency, so the local work dominates and any tracing overhead is
+as visible as it gets) with TRACING_ENABLED off and on.
+
+Usage:
+    python benchmarks/bench_tracing.py --calls 300 --latency 0.0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "results.sqlite3"))
+
+import analysis  # noqa: E402
+import tracing  # noqa: E402
+from benchmarks.fakes import FakeGenerativeModel  # noqa: E402
+from clients import get_registry  # noqa: E402
+
+PROFILE = ("Asha", 31, 62.0, 165.0, "Moderate", "Vegetarian", "Weight Loss", 2100, "No", "Yes", "Summer")
+
+
+def span_cost(n):
+    start = time.perf_counter()
+    for _ in range(n):
+        with tracing.span("bench.span") as span:
+            span.set(image_bytes=1024)
+    return (time.perf_counter() - start) / n
+
+
+def request_cost(images, use_cache):
+    start = time.perf_counter()
+    for image in images:
+        analysis.get_gemini_response(image, *PROFILE, use_cache=use_cache)
+    return (time.perf_counter() - start) / len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=200_000)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency (s)")
+    args = parser.parse_args()
+
+    get_registry().set_model_factory(lambda model_name, **kwargs: FakeGenerativeModel(
+        model_name, base_latency=args.latency, upload_bytes_per_s=float("inf"),
+    ))
+    # Distinct images so every call goes to the model; a second pass is answered from the cache
+    images = [Image.new("RGB", (512, 384), (i % 256, (i // 256) % 256, 90)) for i in range(args.calls)]
+    request_cost(images[:20], use_cache=False)  # warm up the model and caches
+
+    results = {}
+    for enabled in (False, True):
+        tracing.TRACING_ENABLED = enabled
+        tracing.get_tracer().reset()
+        results[enabled] = (span_cost(args.spans), request_cost(images, False), request_cost(images, True))
+
+    print(f"{'':28s} {'disabled':>12s} {'enabled':>12s} {'overhead':>10s}")
+    for index, label in enumerate(("span", "model call (fake)", "cached call")):
+        off, on = results[False][index], results[True][index]
+        overhead = f"{(on - off) / off:+.1%}" if index else ""
+        print(f"{label:28s} {off * 1e6:10.2f} µs {on * 1e6:10.2f} µs {overhead:>10s}")
+    # End-to-end differences are within run-to-run noise; bound the overhead from the span cost instead
+    spans_per_call = sum(r["count"] for r in tracing.get_tracer().snapshot() if r["stage"] != "bench.span") / (2 * args.calls)
+    print(f"\n{spans_per_call:.1f} spans per call -> estimated overhead "
+          f"{spans_per_call * results[True][0] / results[False][2]:.2%} of a cached call, "
+          f"{spans_per_call * results[True][0] / results[False][1]:.2%} of a model call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Local stand-ins for the Gemini client used by the benchmarks.
+
+Nothing here talks to the network; latencies are simulated with sleeps.
+Both fakes can replay a list of recorded responses (see load_responses()),
+add random jitter to their latency and fail a fraction of calls.
+"""
+import itertools
+import json
+import os
+import random
+import threading
+import time
+
+SAMPLE_RESPONSE = json.dumps({
+    "items": [
+        {"name": "Grilled Chicken Breast", "emoji": "🍗", "kcal": 280, "protein_g": 50, "carbs_g": 0, "fat_g": 7,
+         "notes": "High in protein, low in carbs", "meal_time": "Lunch or dinner",
+         "sugar": "green", "salt": "amber", "saturated_fat": "green"},
+        {"name": "Steamed White Rice", "emoji": "🍚", "kcal": 200, "protein_g": 4, "carbs_g": 45, "fat_g": 0.5,
+         "notes": "Mostly carbohydrates, little fiber", "meal_time": "Lunch",
+         "sugar": "green", "salt": "green", "saturated_fat": "green"},
+        {"name": "Mixed Green Salad", "emoji": "🥗", "kcal": 60, "protein_g": 2, "carbs_g": 6, "fat_g": 3,
+         "notes": "Fiber, vitamins A and K", "meal_time": "Any time",
+         "sugar": "green", "salt": "green", "saturated_fat": "green"},
+    ],
+    "total_kcal": 540,
+    "overall_profile": "Balanced, protein-forward meal.",
+    "key_benefits": "Lean protein and vegetables.",
+    "considerations": "Watch the salt in the marinade.",
+    "health_condition_notes": "Suitable in moderation for BP and diabetes.",
+    "blood_pressure": "", "blood_sugar": "", "weather": "",
+    "fitness_goal_suggestion": "", "dietary_preference_suggestion": "",
+}, ensure_ascii=False, indent=2)
+
+# Markdown answer of the web-search agent
+SAMPLE_PLAN = """\
+## 🥗 Personalized Plan
+- Breakfast: oats with berries
+- Lunch: grilled chicken, rice and salad
+
+## 🧘 Yoga & Meditation Corner
+- Morning, 20 minutes: Tadasana, Vrikshasana, Bhujangasana
+"""
+
+
+def payload_bytes(contents):
+    """Serialized request size, using the SDK's own conversion (PIL images become lossless WebP)."""
+    from google.generativeai.types import content_types
+
+    return sum(len(type(c).serialize(c)) for c in content_types.to_contents(contents))
+
+
+class FakeServiceError(ConnectionError):
+    """A transient failure injected by a fake backend (``error_rate``, outages); retried by resilience.py."""
+
+
+class FakeInvalidRequest(ValueError):
+    """A permanent failure injected by a fake backend (``fatal_rate``); not retried."""
+
+
+def load_responses(path):
+    """Recorded responses: a JSONL file of {"text": ...} lines, or a directory of .json/.txt/.md files."""
+    if os.path.isdir(path):
+        responses = []
+        for filename in sorted(os.listdir(path)):
+            if os.path.splitext(filename)[1] in (".json", ".txt", ".md"):
+                with open(os.path.join(path, filename), encoding="utf-8") as f:
+                    responses.append(f.read())
+        return responses
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["text"] for line in f if line.strip()]
+
+
+class Replay:
+    """
+    Shared behaviour of the fakes: cycles through responses, jitters delays and
+    injects faults: transient errors (``error_rate``), permanent ones
+    (``fatal_rate``) and full outages (outage()).
+    """
+
+    def __init__(self, responses, jitter=0.0, error_rate=0.0, seed=None, fatal_rate=0.0):
+        self._responses = itertools.cycle(responses)
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fatal_rate = fatal_rate
+        self.outage_until = 0.0
+        self.failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def outage(self, seconds):
+        """Fails every call for the next ``seconds``."""
+        self.outage_until = time.monotonic() + seconds
+
+    def next_response(self):
+        with self._lock:
+            return next(self._responses)
+
+    def sleep(self, seconds):
+        """Sleeps ``seconds`` plus normally distributed jitter (standard deviation ``jitter``)."""
+        if self.jitter:
+            with self._lock:
+                seconds += self._rng.gauss(0, self.jitter)
+        time.sleep(max(0.0, seconds))
+
+    def maybe_fail(self, what):
+        with self._lock:
+            roll = self._rng.random()
+            if time.monotonic() < self.outage_until:
+                error = FakeServiceError(f"injected {what} outage")
+            elif roll < self.fatal_rate:
+                error = FakeInvalidRequest(f"injected {what} invalid request")
+            elif roll < self.fatal_rate + self.error_rate:
+                error = FakeServiceError(f"injected {what} failure")
+            else:
+                return
+            self.failures += 1
+        raise error
+
+
+class FakeUsage:
+    """Rough token counts in the shape of `usage_metadata` (~4 characters per token)."""
+
+    def __init__(self, prompt_chars, output_chars, cached_chars=0):
+        self.prompt_token_count = prompt_chars // 4 + 258  # Gemini counts a small image as 258 tokens
+        self.candidates_token_count = output_chars // 4
+        self.cached_content_token_count = cached_chars // 4
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeGenerativeModel:
+    """Mimics `genai.GenerativeModel.generate_content` with payload-dependent latency.
+
+    Time to first token = ``base_latency`` (+ jitter) + request bytes / ``upload_bytes_per_s``
+    + uncached input tokens / ``prefill_tokens_per_s``; the response is then
+    generated over ``generation_seconds``, in chunks of ``chunk_chars`` when
+    called with ``stream=True``. ``responses`` are replayed in turn (default:
+    ``response_text``); ``error_rate`` of calls raise FakeServiceError and
+    ``fatal_rate`` FakeInvalidRequest.
+
+    With ``prefix_cache_min_tokens`` set, a leading text part seen in an
+    earlier call and at least that long is served from an implicit prefix
+    cache, as Gemini 2.5 models do: it is reported as
+    ``cached_content_token_count`` and skips the prefill time.
+    """
+
+    def __init__(self, model_name="gemini-1.5-flash", response_text=SAMPLE_RESPONSE, base_latency=0.8, upload_bytes_per_s=2_000_000, generation_seconds=0.0, chunk_chars=80, responses=None, jitter=0.0, error_rate=0.0, seed=None, fatal_rate=0.0, prefill_tokens_per_s=float("inf"), prefix_cache_min_tokens=None):
+        self.model_name = model_name
+        self.replay = Replay(responses or [response_text], jitter, error_rate, seed, fatal_rate)
+        self.base_latency = base_latency
+        self.upload_bytes_per_s = upload_bytes_per_s
+        self.generation_seconds = generation_seconds
+        self.chunk_chars = chunk_chars
+        self.prefill_tokens_per_s = prefill_tokens_per_s
+        self.prefix_cache_min_tokens = prefix_cache_min_tokens
+        self.calls = 0
+        self.last_payload_bytes = 0
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def _cached_chars(self, contents):
+        """Length of the leading text part if the prefix cache already holds it (and remembers it otherwise)."""
+        prefix = contents[0] if contents and isinstance(contents[0], str) else None
+        if self.prefix_cache_min_tokens is None or prefix is None or len(prefix) // 4 < self.prefix_cache_min_tokens:
+            return 0
+        with self._lock:
+            if prefix in self._prefixes:
+                return len(prefix)
+            self._prefixes.add(prefix)
+        return 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+        self.last_payload_bytes = payload_bytes(contents)
+        prompt_chars, cached_chars = sum(len(c) for c in contents if isinstance(c, str)), self._cached_chars(contents)
+        prefill = FakeUsage(prompt_chars, 0, cached_chars)
+        self.replay.sleep(
+            self.base_latency + self.last_payload_bytes / self.upload_bytes_per_s
+            + (prefill.prompt_token_count - prefill.cached_content_token_count) / self.prefill_tokens_per_s
+        )
+        self.replay.maybe_fail("model")
+        text = self.replay.next_response()
+        usage = FakeUsage(prompt_chars, len(text), cached_chars)
+        if stream:
+            return self._stream(text, usage)
+        time.sleep(self.generation_seconds)
+        return FakeResponse(text, usage)
+
+    def _stream(self, text, usage):
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        for number, chunk in enumerate(chunks, 1):
+            time.sleep(self.generation_seconds / len(chunks))
+            # Like the SDK, only the last chunk carries the final usage
+            yield FakeResponse(chunk, usage if number == len(chunks) else None)
+
+
+class FakeRunResponse:
+    def __init__(self, content, metrics=None):
+        self.content = content
+        self.metrics = metrics
+
+
+class FakeMemory:
+    def clear(self):
+        pass
+
+
+class FakeAgent:
+    """
+    Stands in for the agno dietary agent: streams a response in chunks after
+    ``latency`` seconds (+ jitter), replaying ``responses`` in turn and failing
+    ``error_rate`` of runs with FakeServiceError. Like agno, it leaves the
+    run's token counts in ``run_response.metrics``.
+    """
+
+    model = None
+    run_response = None
+
+    def __init__(self, response_text=SAMPLE_PLAN, latency=0.5, chunk_seconds=0.05, chunk_chars=80, responses=None, jitter=0.0, error_rate=0.0, seed=None, replay=None):
+        self.replay = replay or Replay(responses or [response_text], jitter, error_rate, seed)
+        self.latency = latency
+        self.chunk_seconds = chunk_seconds
+        self.chunk_chars = chunk_chars
+        self.memory = FakeMemory()
+
+    def _chunks(self, message):
+        self.replay.sleep(self.latency)
+        self.replay.maybe_fail("agent")
+        text = self.replay.next_response()
+        for i in range(0, len(text), self.chunk_chars):
+            time.sleep(self.chunk_seconds)
+            yield FakeRunResponse(text[i:i + self.chunk_chars])
+        usage = FakeUsage(len(message), len(text))
+        self.run_response = FakeRunResponse(text, {
+            "input_tokens": [usage.prompt_token_count - 258], "output_tokens": [usage.candidates_token_count],
+        })
+
+    def run(self, message, stream=False, **kwargs):
+        if stream:
+            return self._chunks(message)
+        return FakeRunResponse("".join(chunk.content for chunk in self._chunks(message)))
+
+
+def install_fakes(registry, model_options=None, agent_options=None, agent_pool_size=4):
+    """
+    Points a ``ClientRegistry`` at the fakes: every model it builds is a
+    FakeGenerativeModel and the dietary agent pool hands out FakeAgents that
+    share one Replay. Drops previously built models and agent pools.
+    """
+    from dietary_agent import AGENT_NAME
+
+    model_options = dict(model_options or {})
+    agent_options = dict(agent_options or {})
+    agent_replay = Replay(
+        agent_options.pop("responses", None) or [agent_options.pop("response_text", SAMPLE_PLAN)],
+        agent_options.pop("jitter", 0.0), agent_options.pop("error_rate", 0.0), agent_options.pop("seed", None),
+    )
+    registry.clear()
+    registry.set_model_factory(lambda model_id, **config: FakeGenerativeModel(model_id, **model_options))
+    registry.register_agent(AGENT_NAME, lambda: FakeAgent(replay=agent_replay, **agent_options), agent_pool_size)
+    return registry
@@ -0,0 +1,239 @@
+"""
+Headless batch analysis of meal photos, without Streamlit.
+
+Walks a directory (or reads a manifest with one image path per line), decodes,
+pre-screens and preprocesses images in a process pool, analyzes them with
+bounded concurrency and appends one JSON line per image to the output as soon
+as it is ready. Photos the pre-screen rejects (blurry, dark, blank) are
+recorded as "rejected" without a model call. Re-running with the same output
+skips images already analyzed.
+
+Usage:
+    python cli.py photos/ -o results.jsonl --name Asha --age 31 --weight 62 --height 165
+    python cli.py manifest.txt -o results.jsonl --concurrency 8 --rate-per-minute 60
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import asdict
+from io import BytesIO
+
+from dotenv import load_dotenv
+from PIL import Image
+
+from analysis import (
+    BATCH_MAX_CONCURRENCY, BATCH_RATE_PER_MINUTE, IMAGE_FORMAT, IMAGE_MAX_DIMENSION, IMAGE_MAX_KB,
+    analyze_meal, estimate_daily_calories, format_analysis,
+)
+from batch import TokenBucket
+from clients import get_registry
+from image_preprocess import PreparedImage, preprocess_image
+from nutrition_db import recompute_meal
+from prescreen import PRESCREEN_ENABLED, crop_prepared, screen
+import tracing
+
+logger = logging.getLogger("cli")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def iter_image_paths(source):
+    """Yields image paths from a directory tree or a manifest file, lazily."""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                    yield os.path.join(root, filename)
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as manifest:
+            for line in manifest:
+                path = line.strip()
+                if path and not path.startswith("#"):
+                    yield path if os.path.isabs(path) else os.path.join(base, path)
+
+
+def load_completed(output_path):
+    """Paths already analyzed successfully in a previous run of the same output file."""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partial line from an interrupted run
+            if record.get("status") == "ok":
+                completed.add(record["path"])
+    return completed
+
+
+def prepare(path, max_dimension, max_bytes, image_format, use_prescreen):
+    """
+    Process-pool worker: decodes, re-encodes and pre-screens one image.
+    Returns only picklable bytes, stats and the screen result (or None).
+    """
+    prepared = preprocess_image(path, max_dimension=max_dimension, max_bytes=max_bytes, image_format=image_format)
+    result = screen(prepared.image) if use_prescreen else None
+    if result is not None and result.crop and not result.rejected:
+        prepared = crop_prepared(prepared, result.crop)
+    return prepared.data, prepared.mime_type, prepared.stats, result
+
+
+def analyze(path, data, mime_type, stats, profile, rate_limiter, use_cache):
+    """Thread-pool worker: one rate-limited model call for an already preprocessed image."""
+    prepared = PreparedImage(data=data, mime_type=mime_type, image=Image.open(BytesIO(data)), stats=stats)
+    # Preprocessing ran in a worker process, so its timing is recorded here
+    tracing.observe("cli.preprocess", stats.seconds, image_bytes=stats.original_bytes, upload_bytes=stats.output_bytes)
+    with tracing.span("cli.rate_limit"):
+        rate_limiter.acquire()
+    start = time.perf_counter()
+    errors = []
+    with tracing.span("cli.analyze"):
+        meal = analyze_meal(prepared, use_cache=use_cache, on_error=errors.append, **profile)
+    if meal is None:
+        raise RuntimeError(errors[-1])
+    return meal, time.perf_counter() - start
+
+
+def make_record(path, meal=None, stats=None, seconds=None, error=None, profile=None, screen_result=None):
+    record = {"path": path}
+    if screen_result is not None and screen_result.rejected:
+        record["status"] = "rejected"
+        record["error"] = screen_result.summary()
+    elif error is not None or meal is None:
+        record["status"] = "error"
+        record["error"] = str(error) if error is not None else "Could not get response from AI model."
+    else:
+        record["status"] = "ok"
+        record["total_kcal"] = round(meal.total_kcal)
+        # Cross-check against the local nutrition table (typical servings)
+        record["local_kcal"] = round(recompute_meal(meal).total_kcal)
+        record["meal"] = meal.to_dict()
+        record["analysis"] = format_analysis(meal, **(profile or {}))
+    if stats is not None:
+        record["preprocess"] = asdict(stats)
+    if seconds is not None:
+        record["model_seconds"] = round(seconds, 3)
+    if screen_result is not None:
+        record["prescreen"] = {
+            "issues": [asdict(issue) for issue in screen_result.issues],
+            "metrics": {name: round(value, 3) for name, value in screen_result.metrics.items()},
+            "crop": screen_result.crop,
+        }
+    return record
+
+
+def run(paths, output_path, profile, workers, concurrency, rate_per_minute, use_cache, image_options):
+    """Runs the pipeline, keeping at most a fixed number of images in flight.
+
+    Bounding the in-flight window (rather than submitting every path up front)
+    keeps peak memory flat no matter how many images are processed.
+    """
+    completed = load_completed(output_path)
+    rate_limiter = TokenBucket(rate_per_minute / 60, capacity=concurrency)
+    window = workers + 2 * concurrency
+    counts = {"ok": 0, "error": 0, "rejected": 0, "skipped": 0}
+    paths = iter(paths)
+
+    with ProcessPoolExecutor(max_workers=workers) as decoders, \
+            ThreadPoolExecutor(max_workers=concurrency) as callers, \
+            open(output_path, "a", encoding="utf-8") as out:
+        pending = {}  # future -> (stage, path, stats, screen result)
+
+        def write(record):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record["status"]] += 1
+            logger.info("%s %s", record["status"], record["path"])
+
+        def refill():
+            while len(pending) < window:
+                path = next(paths, None)
+                if path is None:
+                    return
+                if path in completed:
+                    counts["skipped"] += 1
+                    continue
+                pending[decoders.submit(prepare, path, *image_options)] = ("prepare", path, None, None)
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, path, stats, screened = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    write(make_record(path, stats=stats, error=error, screen_result=screened))
+                elif stage == "prepare":
+                    data, mime_type, stats, screened = future.result()
+                    if screened is not None and screened.rejected:
+                        write(make_record(path, stats=stats, screen_result=screened))
+                        continue
+                    call = callers.submit(analyze, path, data, mime_type, stats, profile, rate_limiter, use_cache)
+                    pending[call] = ("analyze", path, stats, screened)
+                else:
+                    meal, seconds = future.result()
+                    write(make_record(path, meal, stats, seconds, profile=profile, screen_result=screened))
+            refill()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="image directory or manifest file (one path per line)")
+    parser.add_argument("-o", "--output", required=True, help="JSONL output file; existing results are skipped")
+    parser.add_argument("--name", default="")
+    parser.add_argument("--age", type=int)
+    parser.add_argument("--weight", type=float, help="kg")
+    parser.add_argument("--height", type=float, help="cm")
+    parser.add_argument("--activity-level", choices=["Low", "Moderate", "High"])
+    parser.add_argument("--dietary-preference")
+    parser.add_argument("--fitness-goal")
+    parser.add_argument("--has-bp", choices=["No", "Yes"])
+    parser.add_argument("--has-sugar", choices=["No", "Yes"])
+    parser.add_argument("--weather")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="image decode processes")
+    parser.add_argument("--concurrency", type=int, default=BATCH_MAX_CONCURRENCY, help="concurrent model calls")
+    parser.add_argument("--rate-per-minute", type=float, default=BATCH_RATE_PER_MINUTE, help="model request quota")
+    parser.add_argument("--max-dimension", type=int, default=IMAGE_MAX_DIMENSION)
+    parser.add_argument("--max-kb", type=int, default=IMAGE_MAX_KB)
+    parser.add_argument("--format", default=IMAGE_FORMAT, choices=["JPEG", "WEBP"])
+    parser.add_argument("--no-cache", action="store_true", help="skip cached analyses")
+    parser.add_argument("--no-prescreen", action="store_true", default=not PRESCREEN_ENABLED,
+                        help="send every image to the model, even blurry, dark or blank ones")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        parser.error("GEMINI_API_KEY not found. Set it in your .env file or environment variables.")
+    get_registry().configure(api_key)
+    # Writes METRICS_PATH at exit if tracing is enabled
+    tracing.start_exporter()
+
+    tdee = estimate_daily_calories(args.weight, args.height, args.age, args.activity_level)
+    profile = {
+        "name": args.name, "age": args.age, "weight": args.weight, "height": args.height,
+        "activity_level": args.activity_level, "dietary_preference": args.dietary_preference,
+        "fitness_goal": args.fitness_goal, "tdee": tdee or None, "has_bp": args.has_bp,
+        "has_sugar": args.has_sugar, "weather": args.weather,
+    }
+    counts = run(
+        iter_image_paths(args.source), args.output, profile,
+        workers=args.workers, concurrency=args.concurrency, rate_per_minute=args.rate_per_minute,
+        use_cache=not args.no_cache, image_options=(args.max_dimension, args.max_kb * 1024, args.format, not args.no_prescreen),
+    )
+    logger.info("done: %(ok)d analyzed, %(error)d failed, %(rejected)d rejected, %(skipped)d skipped", counts)
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+"""
+Process-wide registry of reusable model clients and agent instances.
+
+`genai.GenerativeModel` is stateless between calls, so one instance per model
+id and config is shared by every thread. An agno `Agent` keeps per-run state,
+so agents are kept in small pools and checked out for the duration of a run.
+Reusing both avoids rebuilding them (and their HTTP clients) on every click.
+
+The Gemini SDK is imported on first use, not at import time, to keep app
+startup fast.
+"""
+import functools
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def _config_key(config):
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+class AgentPool:
+    """Up to ``size`` agents built on demand by ``factory``; checkout blocks when all are busy."""
+
+    def __init__(self, factory, size=2):
+        self.factory = factory
+        self.size = max(size, 1)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @property
+    def created(self):
+        return self._created
+
+    def _reserve(self):
+        """Claims a slot for a new agent; False if the pool is full."""
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _build(self):
+        try:
+            agent = self.factory()
+            # Create the model's HTTP client now rather than on the first request
+            get_client = getattr(getattr(agent, "model", None), "get_client", None)
+            if callable(get_client):
+                get_client()
+            return agent
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def warm_up(self, count=1):
+        """Pre-builds agents so the first request doesn't pay for construction."""
+        for _ in range(count):
+            if not self._reserve():
+                return
+            self._idle.put(self._build())
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            agent = self._build() if self._reserve() else self._idle.get(timeout=timeout)
+        try:
+            yield agent
+        finally:
+            # Drop the run history so pooled agents don't grow or leak context between users
+            memory = getattr(agent, "memory", None)
+            if hasattr(memory, "clear"):
+                memory.clear()
+            self._idle.put(agent)
+
+
+class ClientRegistry:
+    """Shared, thread-safe model clients keyed by model id and config, plus named agent pools."""
+
+    def __init__(self, model_factory=None, api_key=None):
+        self._model_factory = model_factory
+        self._api_key = api_key
+        self._configured = False
+        self._models = {}
+        self._agent_pools = {}
+        self._lock = threading.Lock()
+
+    def configure(self, api_key):
+        """Sets the Gemini API key; the SDK is configured when the first model is built."""
+        with self._lock:
+            if api_key != self._api_key:
+                self._api_key = api_key
+                self._configured = False
+
+    def _build_model(self, model_id, **config):
+        import google.generativeai as genai  # heavy; only loaded once a model is needed
+
+        if self._api_key and not self._configured:
+            genai.configure(api_key=self._api_key)
+            self._configured = True
+        return genai.GenerativeModel(model_id, **config)
+
+    def set_model_factory(self, factory):
+        """Swaps how models are built (e.g. for a local fake) and drops already built ones."""
+        with self._lock:
+            self._model_factory = factory
+            self._models.clear()
+
+    def get_model(self, model_id, **config):
+        """Returns the shared `GenerativeModel` for ``model_id`` and ``config``, building it once."""
+        key = (model_id, _config_key(config))
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    factory = self._model_factory or self._build_model
+                    model = factory(model_id, **config)
+                    self._models[key] = model
+        return model
+
+    def register_agent(self, name, factory, pool_size=2):
+        """Registers how to build the agent called ``name``. Re-registering keeps the existing pool."""
+        with self._lock:
+            if name not in self._agent_pools:
+                self._agent_pools[name] = AgentPool(factory, pool_size)
+            return self._agent_pools[name]
+
+    @contextmanager
+    def agent(self, name, timeout=None):
+        """Checks out an agent from the ``name`` pool for one run."""
+        with self._agent_pools[name].checkout(timeout=timeout) as agent:
+            yield agent
+
+    def warm_up(self, models=(), agents=()):
+        """
+        Builds the given models and one instance of each named agent ahead of use.
+        ``models`` holds model ids or (model_id, config) pairs; the config must be
+        the one callers pass to get_model(), or the warmed model is never used.
+        """
+        for model in models:
+            model_id, config = (model, {}) if isinstance(model, str) else model
+            self.get_model(model_id, **config)
+        for name in agents:
+            self._agent_pools[name].warm_up()
+
+    def warm_up_in_background(self, models=(), agents=()):
+        """Runs warm_up() on a daemon thread so it doesn't delay the first render."""
+        def run():
+            try:
+                self.warm_up(models, agents)
+            except Exception:
+                logger.exception("Client warm-up failed")
+
+        thread = threading.Thread(target=run, name="client-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._agent_pools.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_registry():
+    """The registry shared by all Streamlit sessions and CLI threads in this process."""
+    return ClientRegistry()
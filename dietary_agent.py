@@ -0,0 +1,132 @@
+"""
+The web-search dietary planner agent shown under "Get More Context (Web Search)".
+
+agno is imported inside build_dietary_planner(): most sessions never run a
+web search, so app startup shouldn't pay for it.
+
+Finished agent runs are cached by the meal's food items and the user's profile
+(not their name), so the same meal and profile reuse an earlier plan. The
+agent's description, instructions and message come from prompts.py, in the
+PROMPT_VARIANT in use.
+"""
+import functools
+import os
+import time
+
+from analysis import RESULT_CACHE_MAX_MB, RESULT_CACHE_PATH, format_analysis
+from personalize import personalize
+from prompts import AGENT_PROMPTS, combined_version, compact_meal, compact_profile, current_variant, get_prompt, get_token_meter
+from result_cache import ResultCache, make_key
+import tracing
+
+AGENT_MODEL_ID = "gemini-2.5-pro-exp-03-25"
+AGENT_NAME = "dietary_planner"
+# Agents keep per-run state, so concurrent web searches each check out their own instance
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "2"))
+# Build an agent in the background at startup (loads agno even if no one searches)
+AGENT_WARM_UP = os.getenv("AGENT_WARM_UP", "0") == "1"
+AGENT_CACHE_TTL_HOURS = float(os.getenv("AGENT_CACHE_TTL_HOURS", "72"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_agent_cache():
+    """Process-wide cache of finished dietary plans, stored alongside the result cache."""
+    return ResultCache(
+        RESULT_CACHE_PATH,
+        table="agent_runs",
+        ttl_seconds=AGENT_CACHE_TTL_HOURS * 3600,
+        max_disk_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+    )
+
+
+def agent_prompt_version(variant=None):
+    """Version of the agent's prompts in ``variant``; changes whenever one of them does, so cached plans are not reused."""
+    return combined_version([get_prompt(name, variant) for name in AGENT_PROMPTS])
+
+
+def planner_request(meal, profile, variant=None):
+    """
+    Builds the agent message and its cache key from the parsed meal and profile.
+    The user's name is left out of both; the key only uses the normalized food
+    names, profile values and prompt version, so wording differences in the
+    model's analysis don't defeat the cache. The full message is the analysis
+    as the user sees it, the compact one a single line per meal and profile.
+    """
+    variant = variant or current_variant()
+    profile = {**profile, "name": ""}
+    prompt = get_prompt("agent.message", variant)
+    if prompt.variant == "compact":
+        message = prompt.render(total_kcal=f"{meal.total_kcal:.0f}", items=compact_meal(meal), profile=compact_profile(profile))
+    else:
+        message = prompt.render(analysis=format_analysis(personalize(meal, **profile), **profile))
+    foods = sorted({" ".join(item.name.lower().split()) for item in meal.items})
+    key = make_key(None, AGENT_MODEL_ID, agent_prompt_version(variant), {"meal": foods, "profile": profile})
+    return message, key
+
+
+def agent_usage(agent):
+    """Token counts of the agent's last run, from agno's run metrics (summed over its model calls)."""
+    metrics = getattr(getattr(agent, "run_response", None), "metrics", None) or {}
+
+    def total(name):
+        value = metrics.get(name, 0) if isinstance(metrics, dict) else getattr(metrics, name, 0)
+        return sum(value) if isinstance(value, (list, tuple)) else value or 0
+
+    return {
+        "prompt_tokens": total("input_tokens"),
+        "cached_tokens": total("cached_tokens"),
+        "output_tokens": total("output_tokens"),
+    }
+
+
+def build_dietary_planner(api_key, variant=None):
+    """Builds the dietary planner agent with its DuckDuckGo search tools and the prompts of ``variant``."""
+    from agno.agent import Agent
+    from agno.models.google import Gemini
+
+    from search_tools import CachedDuckDuckGoTools
+
+    return Agent(
+        model=Gemini(id=AGENT_MODEL_ID, api_key=api_key),
+        description=get_prompt("agent.description", variant).text,
+        instructions=get_prompt("agent.instructions", variant).text,
+        expected_output=get_prompt("agent.expected_output", variant).text,
+        tools=[CachedDuckDuckGoTools()],
+        show_tool_calls=False,
+        markdown=True
+    )
+
+
+def run_dietary_planner(job, registry, meal, profile, use_cache=True):
+    """
+    Background job task (see jobs.py): runs a pooled agent with streaming and
+    appends its output to the job as it arrives, stopping early if the job is
+    cancelled or times out. A cached plan for the same meal and profile is
+    returned directly; pass use_cache=False to refresh it.
+    """
+    variant = current_variant()
+    with tracing.span("agent.run", prompt_variant=variant) as span:
+        message, cache_key = planner_request(meal, profile, variant)
+        cache = get_agent_cache()
+        cached = cache.get(cache_key) if use_cache else None
+        span.set(cached=cached is not None, prompt_chars=len(message))
+        if cached is not None:
+            job.append(cached)
+            return cached
+
+        start, first_output = time.perf_counter(), True
+        with registry.agent(AGENT_NAME) as agent:
+            for chunk in agent.run(message, stream=True):
+                if job.cancelled:
+                    break
+                if chunk.content:
+                    if first_output:
+                        tracing.observe("agent.first_output", time.perf_counter() - start)
+                        first_output = False
+                    job.append(chunk.content)
+            counts = agent_usage(agent)
+        span.set(chars=len(job.partial), cancelled=job.cancelled, **counts)
+        get_token_meter().record(("agent", variant, agent_prompt_version(variant)), counts)
+        if not job.cancelled and job.partial:
+            cache.set(cache_key, job.partial)
+        return job.partial
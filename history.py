@@ -0,0 +1,243 @@
+"""
+Persistent meal history with daily and weekly calorie rollups.
+
+Each analyzed meal is stored in a local SQLite file (HISTORY_PATH) with its
+user, time, items, calories and macros. The ``daily`` and ``weekly`` tables
+hold per-user totals next to the user's TDEE target. They are updated by
+UPSERT in the same transaction as the insert (or delete), never by scanning
+the history. The trend charts read one rollup row per day or week, so they
+cost the same however many meals have been logged.
+"""
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+HISTORY_PATH = os.getenv("HISTORY_PATH", os.path.join(".cache", "history.sqlite3"))
+# Days and weeks shown in the trend charts
+HISTORY_CHART_DAYS = int(os.getenv("HISTORY_CHART_DAYS", "30"))
+HISTORY_CHART_WEEKS = int(os.getenv("HISTORY_CHART_WEEKS", "12"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    eaten_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    week TEXT NOT NULL,
+    kcal REAL NOT NULL,
+    protein_g REAL NOT NULL,
+    carbs_g REAL NOT NULL,
+    fat_g REAL NOT NULL,
+    tdee INTEGER,
+    items TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meals_user_time ON meals (user, eaten_at);
+CREATE INDEX IF NOT EXISTS meals_user_day ON meals (user, day);
+CREATE TABLE IF NOT EXISTS daily (
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    meals INTEGER NOT NULL,
+    kcal REAL NOT NULL,
+    protein_g REAL NOT NULL,
+    carbs_g REAL NOT NULL,
+    fat_g REAL NOT NULL,
+    tdee INTEGER,
+    PRIMARY KEY (user, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS weekly (
+    user TEXT NOT NULL,
+    week TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    meals INTEGER NOT NULL,
+    kcal REAL NOT NULL,
+    protein_g REAL NOT NULL,
+    carbs_g REAL NOT NULL,
+    fat_g REAL NOT NULL,
+    target_kcal REAL NOT NULL,
+    PRIMARY KEY (user, week)
+) WITHOUT ROWID;
+"""
+
+
+def day_and_week(timestamp):
+    """Local calendar day of ``timestamp`` and the Monday starting its week, as ISO dates."""
+    day = datetime.fromtimestamp(timestamp).date()
+    return day.isoformat(), (day - timedelta(days=day.weekday())).isoformat()
+
+
+class MealHistory:
+    """Meals and their rollups in one SQLite file. Thread-safe; shared by all sessions."""
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def add(self, user, meal, tdee=None, eaten_at=None):
+        """Logs a MealAnalysis for ``user`` and updates the rollups; returns the meal id."""
+        eaten_at = eaten_at if eaten_at is not None else time.time()
+        day, week = day_and_week(eaten_at)
+        items = [
+            {"name": item.name, "kcal": item.kcal, "protein_g": item.protein_g, "carbs_g": item.carbs_g, "fat_g": item.fat_g}
+            for item in meal.items
+        ]
+        totals = (1, meal.total_kcal, meal.protein_g, meal.carbs_g, meal.fat_g)
+        with self._lock, self._conn:
+            meal_id = self._conn.execute(
+                "INSERT INTO meals (user, eaten_at, day, week, kcal, protein_g, carbs_g, fat_g, tdee, items)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (user, eaten_at, day, week, *totals[1:], tdee or None,
+                 json.dumps(items, ensure_ascii=False, separators=(",", ":"))),
+            ).lastrowid
+            self._apply(user, day, week, totals, tdee or None)
+        return meal_id
+
+    def delete(self, meal_id):
+        """Removes a logged meal and takes it out of the rollups. Returns False if there was none."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+            # The day keeps the TDEE of its latest remaining meal
+            latest = self._conn.execute(
+                "SELECT tdee FROM meals WHERE user = ? AND day = ? ORDER BY id DESC LIMIT 1", (row["user"], row["day"])
+            ).fetchone()
+            self._apply(row["user"], row["day"], row["week"], (-1, -row["kcal"], -row["protein_g"], -row["carbs_g"], -row["fat_g"]),
+                        latest["tdee"] if latest is not None else None)
+        return True
+
+    def _apply(self, user, day, week, totals, tdee=None):
+        """
+        Adds ``totals`` (meals, kcal, protein, carbs, fat; negative to remove a
+        meal) to the user's day and week. A day counts towards the week's
+        target once, with the TDEE of its most recently logged meal. Called
+        inside the write transaction.
+        """
+        previous = self._conn.execute(
+            "SELECT meals, tdee FROM daily WHERE user = ? AND day = ?", (user, day)
+        ).fetchone()
+        old_meals, old_tdee = (previous["meals"], previous["tdee"]) if previous is not None else (0, None)
+        new_tdee = tdee if tdee is not None else old_tdee
+        meals = old_meals + totals[0]
+        if meals <= 0:
+            self._conn.execute("DELETE FROM daily WHERE user = ? AND day = ?", (user, day))
+            days, target = -1, -(old_tdee or 0)
+        else:
+            self._conn.execute(
+                "INSERT INTO daily (user, day, meals, kcal, protein_g, carbs_g, fat_g, tdee) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (user, day) DO UPDATE SET meals = meals + excluded.meals, kcal = kcal + excluded.kcal,"
+                " protein_g = protein_g + excluded.protein_g, carbs_g = carbs_g + excluded.carbs_g,"
+                " fat_g = fat_g + excluded.fat_g, tdee = excluded.tdee",
+                (user, day, *totals, new_tdee),
+            )
+            days, target = int(previous is None), (new_tdee or 0) - (old_tdee or 0)
+
+        self._conn.execute(
+            "INSERT INTO weekly (user, week, days, meals, kcal, protein_g, carbs_g, fat_g, target_kcal)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (user, week) DO UPDATE SET days = days + excluded.days, meals = meals + excluded.meals,"
+            " kcal = kcal + excluded.kcal, protein_g = protein_g + excluded.protein_g,"
+            " carbs_g = carbs_g + excluded.carbs_g, fat_g = fat_g + excluded.fat_g,"
+            " target_kcal = target_kcal + excluded.target_kcal",
+            (user, week, days, *totals, target),
+        )
+        if totals[0] < 0:
+            self._conn.execute("DELETE FROM weekly WHERE user = ? AND week = ? AND meals <= 0", (user, week))
+
+    def recent_meals(self, user, limit=20):
+        """The user's latest meals, newest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, eaten_at, day, kcal, protein_g, carbs_g, fat_g, items FROM meals"
+                " WHERE user = ? ORDER BY eaten_at DESC LIMIT ?", (user, limit),
+            ).fetchall()
+        return [dict(row, items=json.loads(row["items"])) for row in rows]
+
+    def daily(self, user, days=HISTORY_CHART_DAYS, today=None):
+        """Daily rollups of the last ``days`` days (days without meals are absent), oldest first."""
+        start = (today or date.today()) - timedelta(days=days - 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM daily WHERE user = ? AND day >= ? ORDER BY day", (user, start.isoformat())
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def weekly(self, user, weeks=HISTORY_CHART_WEEKS, today=None):
+        """Weekly rollups of the last ``weeks`` weeks, oldest first."""
+        today = today or date.today()
+        start = today - timedelta(days=today.weekday(), weeks=weeks - 1)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM weekly WHERE user = ? AND week >= ? ORDER BY week", (user, start.isoformat())
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rebuild_rollups(self):
+        """Recomputes the rollups from the meals table, e.g. after editing the file by hand."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM daily")
+            self._conn.execute("DELETE FROM weekly")
+            rows = self._conn.execute("SELECT user, day, week, kcal, protein_g, carbs_g, fat_g, tdee FROM meals ORDER BY id").fetchall()
+            for row in rows:
+                self._apply(row["user"], row["day"], row["week"], (1, row["kcal"], row["protein_g"], row["carbs_g"], row["fat_g"]), row["tdee"])
+
+    def clear_user(self, user):
+        """Deletes everything logged for ``user``."""
+        with self._lock, self._conn:
+            for table in ("meals", "daily", "weekly"):
+                self._conn.execute(f"DELETE FROM {table} WHERE user = ?", (user,))
+
+    def stats(self):
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("meals", "daily", "weekly")
+            }
+
+
+def daily_chart(rows):
+    """Plotly bar chart of daily calories against the TDEE of each day."""
+    import plotly.graph_objects as go
+
+    days = [row["day"] for row in rows]
+    fig = go.Figure()
+    fig.add_bar(x=days, y=[row["kcal"] for row in rows], name="Eaten", marker_color="#81c784",
+                customdata=[row["meals"] for row in rows], hovertemplate="%{y:,.0f} kcal in %{customdata} meals")
+    fig.add_scatter(x=days, y=[row["tdee"] for row in rows], name="Daily needs (TDEE)", mode="lines+markers",
+                    line={"color": "#e65100", "dash": "dash"}, connectgaps=True)
+    fig.update_layout(title="Daily calories", yaxis_title="kcal", xaxis_type="date", height=350,
+                      margin={"l": 10, "r": 10, "t": 40, "b": 10}, legend={"orientation": "h"})
+    return fig
+
+
+def weekly_chart(rows):
+    """Plotly bar chart of weekly calories against the summed TDEE of the logged days."""
+    import plotly.graph_objects as go
+
+    weeks = [row["week"] for row in rows]
+    fig = go.Figure()
+    fig.add_bar(x=weeks, y=[row["kcal"] for row in rows], name="Eaten", marker_color="#4fc3f7",
+                customdata=[row["days"] for row in rows], hovertemplate="%{y:,.0f} kcal over %{customdata} logged days")
+    fig.add_scatter(x=weeks, y=[row["target_kcal"] or None for row in rows], name="Needs on logged days",
+                    mode="lines+markers", line={"color": "#e65100", "dash": "dash"})
+    fig.update_layout(title="Weekly calories (weeks start on Monday)", yaxis_title="kcal", xaxis_type="date",
+                      height=350, margin={"l": 10, "r": 10, "t": 40, "b": 10}, legend={"orientation": "h"})
+    return fig
+
+
+@functools.lru_cache(maxsize=None)
+def get_history():
+    """The meal history shared by every Streamlit session and CLI thread."""
+    return MealHistory()
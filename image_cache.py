@@ -0,0 +1,141 @@
+"""
+Decoded-image cache shared by Streamlit reruns and sessions.
+
+Every widget interaction reruns the script. Without a cache, each rerun would
+decode the uploaded photo again and re-encode it for display, even while the
+user is only typing. This cache is keyed by a hash of the upload bytes and
+holds two things:
+- the display thumbnail (JPEG bytes, see session_store.make_thumbnail);
+- the model-ready PreparedImage for each set of preprocessing settings.
+PreparedImage keeps its resized pixels, so this is the decoded form that gets
+reused. The full-resolution decode is never kept.
+
+Entries are evicted least recently used first once IMAGE_CACHE_MB is
+exceeded. A rerun with the same upload does no image work.
+"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image
+
+from image_preprocess import preprocess_image
+from session_store import make_thumbnail
+
+IMAGE_CACHE_MB = float(os.getenv("IMAGE_CACHE_MB", "64"))
+# Upload ids remembered to skip hashing a known upload again
+_MAX_UPLOAD_IDS = 1024
+
+
+def upload_bytes(upload):
+    """The raw bytes of a Streamlit upload, a file-like object or bytes."""
+    if isinstance(upload, (bytes, bytearray)):
+        return bytes(upload)
+    if hasattr(upload, "getvalue"):
+        return upload.getvalue()
+    upload.seek(0)
+    return upload.read()
+
+
+def _prepared_size(prepared):
+    return len(prepared.data) + prepared.image.width * prepared.image.height * len(prepared.image.getbands())
+
+
+class ImageCache:
+    """LRU of thumbnails and prepared images by upload hash, bounded in bytes. Thread-safe."""
+
+    def __init__(self, max_bytes=int(IMAGE_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (kind, digest, *settings) -> (value, size)
+        self._size = 0
+        self._upload_ids = OrderedDict()  # Streamlit file_id -> digest
+        self._lock = threading.Lock()
+
+    def digest(self, upload):
+        """Hash of the upload bytes; remembered per Streamlit upload so reruns don't rehash it."""
+        file_id = getattr(upload, "file_id", None)
+        if file_id is not None:
+            with self._lock:
+                digest = self._upload_ids.get(file_id)
+                if digest is not None:
+                    self._upload_ids.move_to_end(file_id)
+                    return digest
+        digest = hashlib.blake2b(upload_bytes(upload), digest_size=20).hexdigest()
+        if file_id is not None:
+            with self._lock:
+                self._upload_ids[file_id] = digest
+                while len(self._upload_ids) > _MAX_UPLOAD_IDS:
+                    self._upload_ids.popitem(last=False)
+        return digest
+
+    def thumbnail(self, upload):
+        """Display-size JPEG bytes of the upload (accepted by st.image)."""
+        key = ("thumbnail", self.digest(upload))
+        found = self._get(key)
+        if found is not None:
+            return found
+        data = make_thumbnail(Image.open(BytesIO(upload_bytes(upload))))
+        self._put(key, data, len(data))
+        return data
+
+    def prepared(self, upload, max_dimension, max_bytes, image_format):
+        """The upload preprocessed for the model (see preprocess_image), computed once per settings."""
+        key = ("prepared", self.digest(upload), max_dimension, max_bytes, image_format)
+        found = self._get(key)
+        if found is not None:
+            return found
+        prepared = preprocess_image(upload, max_dimension=max_dimension, max_bytes=max_bytes, image_format=image_format)
+        self._put(key, prepared, _prepared_size(prepared))
+        return prepared
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._upload_ids.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+            }
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def _put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+                self.evictions += 1
+
+
+@functools.lru_cache(maxsize=None)
+def get_image_cache():
+    """The image cache shared by all Streamlit sessions in this process."""
+    return ImageCache()
@@ -0,0 +1,201 @@
+"""
+Perceptual image fingerprints and a Hamming-distance index over them.
+
+A re-saved, slightly cropped or screenshotted meal photo has different bytes
+but nearly the same 64-bit dHash/pHash. The index finds previously analyzed
+images within a small Hamming distance so their analysis can be reused.
+"""
+import itertools
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+
+def _grayscale(image, size):
+    return np.asarray(image.convert("L").resize(size, Image.LANCZOS), dtype=np.float32)
+
+
+def _pack_bits(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(image):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail."""
+    pixels = _grayscale(image, (9, 8))
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    m[0] /= np.sqrt(2)
+    return m.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(image):
+    """64-bit perceptual hash: low-frequency 8x8 DCT block of a 32x32 thumbnail vs. its median."""
+    pixels = _grayscale(image, (32, 32))
+    coeffs = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    median = np.median(coeffs.ravel()[1:])  # skip the DC term
+    return _pack_bits(coeffs > median)
+
+
+HASH_FUNCTIONS = {"dhash": dhash, "phash": phash}
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def popcount64(values):
+    """Per-element popcount of a uint64 array."""
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class MultiIndexHashIndex:
+    """Multi-index hashing over 64-bit fingerprints.
+
+    Each fingerprint is split into ``chunks`` substrings, each with its own
+    hash table. If two fingerprints are within distance r, at least one
+    substring is within r // chunks (pigeonhole), so a query only probes the
+    few buckets near each of its substrings and verifies those candidates
+    with a vectorized popcount, instead of scanning every stored fingerprint.
+
+    Probing is done in Python, so for large radii (where the probe count
+    explodes) the index falls back to a vectorized scan of the flat array.
+    """
+
+    # Rough cost of handling one probed candidate in Python vs. one element of a NumPy scan
+    SCAN_COST_RATIO = 250
+
+    def __init__(self, chunks=4, bits=HASH_BITS):
+        if bits % chunks:
+            raise ValueError("bits must be divisible by chunks")
+        self.chunks = chunks
+        self.chunk_bits = bits // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._fingerprints = np.empty(1024, dtype=np.uint64)
+        self._values = []
+        self._probe_masks = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def _split(self, fp):
+        return [(fp >> (i * self.chunk_bits)) & self._chunk_mask for i in range(self.chunks)]
+
+    def _masks(self, radius):
+        """All chunk-sized bit masks with at most ``radius`` bits set."""
+        masks = self._probe_masks.get(radius)
+        if masks is None:
+            masks = [0]
+            for r in range(1, radius + 1):
+                for positions in itertools.combinations(range(self.chunk_bits), r):
+                    masks.append(sum(1 << p for p in positions))
+            self._probe_masks[radius] = masks
+        return masks
+
+    def add(self, fp, value):
+        idx = len(self._values)
+        if idx == len(self._fingerprints):
+            self._fingerprints = np.resize(self._fingerprints, 2 * idx)
+        self._fingerprints[idx] = fp
+        self._values.append(value)
+        for table, part in zip(self._tables, self._split(fp)):
+            table.setdefault(part, []).append(idx)
+
+    def search(self, fp, max_distance):
+        """Returns ``(distance, value)`` pairs within ``max_distance``, closest first."""
+        count = len(self._values)
+        if not count:
+            return []
+        masks = self._masks(max_distance // self.chunks)
+        expected_candidates = len(masks) * self.chunks * count / (1 << self.chunk_bits)
+        if expected_candidates * self.SCAN_COST_RATIO > count:
+            distances = popcount64(self._fingerprints[:count] ^ np.uint64(fp))
+            keep = np.flatnonzero(distances <= max_distance)
+            return sorted(((int(distances[i]), self._values[i]) for i in keep), key=lambda m: m[0])
+
+        buckets = []
+        for table, part in zip(self._tables, self._split(fp)):
+            for mask in masks:
+                bucket = table.get(part ^ mask)
+                if bucket:
+                    buckets.append(bucket)
+        if not buckets:
+            return []
+        candidates = np.fromiter(itertools.chain.from_iterable(buckets), dtype=np.int64)
+
+        distances = popcount64(self._fingerprints[candidates] ^ np.uint64(fp))
+        keep = np.flatnonzero(distances <= max_distance)
+        # A candidate may come from several substring tables; keep one copy
+        matches = {int(candidates[i]): int(distances[i]) for i in keep}
+        return sorted(((d, self._values[i]) for i, d in matches.items()), key=lambda m: m[0])
+
+
+class NearDuplicateIndex:
+    """Thread-safe fingerprint -> image digest index, optionally persisted to SQLite."""
+
+    def __init__(self, path=None, hash_name="dhash", chunks=4):
+        self.hash_name = hash_name
+        self._hash = HASH_FUNCTIONS[hash_name]
+        self._index = MultiIndexHashIndex(chunks=chunks)
+        self._known = set()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " digest TEXT NOT NULL, hash TEXT NOT NULL, fp INTEGER NOT NULL,"
+                " PRIMARY KEY (digest, hash))"
+            )
+            self._conn.commit()
+            rows = self._conn.execute("SELECT digest, fp FROM fingerprints WHERE hash = ?", (hash_name,))
+            for digest, fp in rows:
+                self._add(fp & ((1 << HASH_BITS) - 1), digest)
+
+    def __len__(self):
+        return len(self._index)
+
+    def fingerprint(self, image):
+        return self._hash(image)
+
+    def _add(self, fp, digest):
+        if digest not in self._known:
+            self._known.add(digest)
+            self._index.add(fp, digest)
+            return True
+        return False
+
+    def add(self, fp, digest):
+        """Records that the image with ``digest`` has fingerprint ``fp``."""
+        with self._lock:
+            if self._add(fp, digest) and self._conn is not None:
+                # SQLite integers are signed 64-bit
+                signed = fp - (1 << HASH_BITS) if fp >> (HASH_BITS - 1) else fp
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO fingerprints (digest, hash, fp) VALUES (?, ?, ?)",
+                    (digest, self.hash_name, signed),
+                )
+                self._conn.commit()
+
+    def search(self, fp, max_distance):
+        """Digests of known images within ``max_distance`` bits, closest first."""
+        with self._lock:
+            return [digest for _, digest in self._index.search(fp, max_distance)]
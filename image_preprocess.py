@@ -0,0 +1,144 @@
+"""
+Image preprocessing before upload to Gemini.
+
+Phone photos are often 12+ MP; sent as-is, the SDK re-encodes them as
+lossless WebP, and both upload time and model latency grow with the pixel
+count. `preprocess_image` fixes the orientation, downsamples to a maximum
+dimension and re-encodes to JPEG/WebP under a byte budget.
+"""
+import io
+import time
+from dataclasses import dataclass
+
+from PIL import Image, ImageOps
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+@dataclass
+class PreprocessStats:
+    """Before/after sizes and time spent for one image."""
+    original_bytes: int
+    original_size: tuple
+    output_bytes: int
+    output_size: tuple
+    image_format: str
+    quality: int
+    seconds: float
+
+    def summary(self):
+        return (
+            f"{self.original_size[0]}x{self.original_size[1]}, {self.original_bytes / 1024:,.0f} KB → "
+            f"{self.output_size[0]}x{self.output_size[1]} {self.image_format} q{self.quality}, "
+            f"{self.output_bytes / 1024:,.0f} KB in {self.seconds * 1000:.0f} ms"
+        )
+
+
+@dataclass
+class PreparedImage:
+    """An encoded, model-ready image plus the resized pixels it was encoded from."""
+    data: bytes
+    mime_type: str
+    image: Image.Image
+    stats: PreprocessStats
+
+    def as_blob(self):
+        """The inline-data dict accepted by `GenerativeModel.generate_content`."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def _read_source(source):
+    """Returns (PIL image, original byte count) for bytes, a file-like object or a PIL image."""
+    if isinstance(source, Image.Image):
+        return source, len(source.tobytes())
+    if isinstance(source, (bytes, bytearray)):
+        return Image.open(io.BytesIO(source)), len(source)
+    if hasattr(source, "getvalue"):  # Streamlit UploadedFile, BytesIO
+        data = source.getvalue()
+        return Image.open(io.BytesIO(data)), len(data)
+    with open(source, "rb") as f:
+        data = f.read()
+    return Image.open(io.BytesIO(data)), len(data)
+
+
+def _to_rgb(image):
+    """Converts any color mode to RGB, flattening transparency onto white."""
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def _encode(image, image_format, quality):
+    buf = io.BytesIO()
+    image.save(buf, format=image_format, quality=quality, optimize=image_format == "JPEG")
+    return buf.getvalue()
+
+
+def _encode_under_budget(image, image_format, max_bytes, min_quality, max_quality):
+    """Binary-searches the highest quality whose encoding fits in ``max_bytes``.
+
+    Returns (data, quality); data is None if even ``min_quality`` is too large.
+    """
+    data = _encode(image, image_format, max_quality)
+    if max_bytes is None or len(data) <= max_bytes:
+        return data, max_quality
+
+    best = None
+    lo, hi = min_quality, max_quality - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        candidate = _encode(image, image_format, mid)
+        if len(candidate) <= max_bytes:
+            best = (candidate, mid)
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best if best else (None, min_quality)
+
+
+def preprocess_image(source, max_dimension=1536, max_bytes=512 * 1024, image_format="JPEG", min_quality=40, max_quality=90):
+    """Orients, converts, downsamples and re-encodes an image for the model.
+
+    ``source`` may be raw bytes, a file-like object (e.g. a Streamlit upload), a
+    path or a PIL image. If no quality between ``min_quality`` and
+    ``max_quality`` fits ``max_bytes``, the image is shrunk further until it does.
+    """
+    image_format = image_format.upper()
+    if image_format not in MIME_TYPES:
+        raise ValueError(f"Unsupported output format: {image_format}")
+
+    start = time.perf_counter()
+    image, original_bytes = _read_source(source)
+    original_size = image.size
+
+    # Let the JPEG decoder downscale by a power of two while decoding
+    if max_dimension and image.format == "JPEG":
+        image.draft("RGB", (max_dimension, max_dimension))
+
+    image = _to_rgb(ImageOps.exif_transpose(image))
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+
+    while True:
+        data, quality = _encode_under_budget(image, image_format, max_bytes, min_quality, max_quality)
+        if data is not None or max(image.size) <= 256:
+            break
+        image = image.resize((int(image.width * 0.75), int(image.height * 0.75)), Image.LANCZOS)
+    if data is None:
+        data = _encode(image, image_format, min_quality)
+
+    stats = PreprocessStats(
+        original_bytes=original_bytes,
+        original_size=original_size,
+        output_bytes=len(data),
+        output_size=image.size,
+        image_format=image_format,
+        quality=quality,
+        seconds=time.perf_counter() - start,
+    )
+    return PreparedImage(data=data, mime_type=MIME_TYPES[image_format], image=image, stats=stats)
@@ -0,0 +1,137 @@
+"""
+Background job runner for long tasks such as the web-search dietary agent.
+
+Jobs run on a shared worker pool; the Streamlit session only keeps the job id
+and polls for status and partial output, so the UI stays responsive while
+the agent works. Cancellation and timeouts are cooperative: the task checks
+`job.cancelled` between chunks of output.
+"""
+import functools
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED = {DONE, FAILED, CANCELLED, TIMED_OUT}
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "300"))
+# Finished jobs are kept this long so a session can still collect the result
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+
+class Job:
+    """State of one background task. Updated by the worker, read by the UI."""
+
+    def __init__(self, timeout=None):
+        self.id = uuid.uuid4().hex
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.deadline = self.created + timeout if timeout else None
+        self._chunks = []
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def partial(self):
+        """Output produced so far."""
+        with self._lock:
+            return "".join(self._chunks)
+
+    @property
+    def cancelled(self):
+        """True once the job was cancelled or ran past its deadline; tasks should stop."""
+        if self.deadline is not None and time.time() > self.deadline:
+            self._cancel.set()
+        return self._cancel.is_set()
+
+    @property
+    def timed_out(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def append(self, text):
+        """Adds a chunk of partial output."""
+        with self._lock:
+            self._chunks.append(text)
+
+    def cancel(self):
+        self._cancel.set()
+
+
+class JobRunner:
+    """Runs ``func(job, *args, **kwargs)`` on a thread pool and tracks the jobs by id."""
+
+    def __init__(self, max_workers=JOB_WORKERS, default_timeout=JOB_TIMEOUT_SECONDS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.default_timeout = default_timeout
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, timeout=None, **kwargs):
+        """Queues a task and returns its job id. The task's return value becomes ``job.result``."""
+        job = Job(timeout=timeout if timeout is not None else self.default_timeout)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancelled:
+            job.status = TIMED_OUT if job.timed_out else CANCELLED
+            job.finished = time.time()
+            return
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            result = func(job, *args, **kwargs)
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        else:
+            job.result = result
+            if job.cancelled:
+                job.status = TIMED_OUT if job.timed_out else CANCELLED
+            else:
+                job.status = DONE
+        job.finished = time.time()
+
+    def get(self, job_id):
+        """Returns the job, or None if it is unknown or was pruned."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for job_id in [i for i, j in self._jobs.items() if j.finished and j.finished < cutoff]:
+            del self._jobs[job_id]
+
+
+@functools.lru_cache(maxsize=None)
+def get_job_runner():
+    """The job runner shared by all Streamlit sessions in this process."""
+    return JobRunner()
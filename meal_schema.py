@@ -0,0 +1,210 @@
+"""
+Typed records for a meal analysis and the JSON schema the model is asked to fill.
+
+The model answers with JSON matching RESPONSE_SCHEMA; parse_meal() turns it
+into slotted dataclasses once, and everything downstream (totals, nutrition
+checks, caching, the CLI) reads the records. render_markdown() produces the
+markdown shown in the app from the records.
+
+The schema only covers what can be seen in the image. The profile-specific
+fields of MealAnalysis are filled in afterwards by personalize.py.
+"""
+import json
+from dataclasses import asdict, dataclass, field
+
+LIGHTS = ("green", "amber", "red")
+LIGHT_EMOJI = {"green": "🟢", "amber": "🟡", "red": "🔴"}
+
+_STRING = {"type": "string"}
+_NUMBER = {"type": "number"}
+_LIGHT = {"type": "string", "enum": list(LIGHTS)}
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": _STRING,
+                    "emoji": _STRING,
+                    "kcal": _NUMBER,
+                    "protein_g": _NUMBER,
+                    "carbs_g": _NUMBER,
+                    "fat_g": _NUMBER,
+                    "notes": _STRING,
+                    "meal_time": _STRING,
+                    "sugar": _LIGHT,
+                    "salt": _LIGHT,
+                    "saturated_fat": _LIGHT,
+                },
+                "required": ["name", "kcal", "protein_g", "carbs_g", "fat_g", "notes", "meal_time", "sugar", "salt", "saturated_fat"],
+            },
+        },
+        "total_kcal": _NUMBER,
+        "overall_profile": _STRING,
+        "key_benefits": _STRING,
+        "considerations": _STRING,
+        "health_condition_notes": _STRING,
+    },
+    "required": ["items", "total_kcal", "overall_profile", "key_benefits", "considerations", "health_condition_notes"],
+}
+
+DISCLAIMER = (
+    "Note: This information is for general awareness and educational purposes only, and does not "
+    "substitute professional medical or nutritional advice. Consult with a healthcare provider for "
+    "personalized guidance."
+)
+
+
+@dataclass(slots=True)
+class FoodItem:
+    name: str
+    kcal: float
+    protein_g: float = 0.0
+    carbs_g: float = 0.0
+    fat_g: float = 0.0
+    emoji: str = ""
+    notes: str = ""
+    meal_time: str = ""
+    sugar: str = "amber"
+    salt: str = "amber"
+    saturated_fat: str = "amber"
+
+
+@dataclass(slots=True)
+class MealAnalysis:
+    items: list = field(default_factory=list)
+    total_kcal: float = 0.0
+    overall_profile: str = ""
+    key_benefits: str = ""
+    considerations: str = ""
+    health_condition_notes: str = ""
+    # Profile-specific, see personalize.py
+    calorie_budget: str = ""
+    blood_pressure: str = ""
+    blood_sugar: str = ""
+    weather: str = ""
+    fitness_goal_suggestion: str = ""
+    dietary_preference_suggestion: str = ""
+
+    @property
+    def protein_g(self):
+        return sum(item.protein_g for item in self.items)
+
+    @property
+    def carbs_g(self):
+        return sum(item.carbs_g for item in self.items)
+
+    @property
+    def fat_g(self):
+        return sum(item.fat_g for item in self.items)
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+def _number(value):
+    try:
+        return float(str(value).replace(",", "").lstrip("~"))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _light(value):
+    value = str(value or "").strip().lower()
+    return value if value in LIGHTS else "amber"
+
+
+def meal_from_dict(data):
+    """Builds records from decoded JSON, tolerating missing or loosely typed fields."""
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object for the meal analysis.")
+    items = []
+    for raw in data.get("items") or []:
+        if not isinstance(raw, dict) or not raw.get("name"):
+            continue
+        items.append(FoodItem(
+            name=str(raw["name"]).strip(),
+            kcal=_number(raw.get("kcal")),
+            protein_g=_number(raw.get("protein_g")),
+            carbs_g=_number(raw.get("carbs_g")),
+            fat_g=_number(raw.get("fat_g")),
+            emoji=str(raw.get("emoji") or ""),
+            notes=str(raw.get("notes") or ""),
+            meal_time=str(raw.get("meal_time") or ""),
+            sugar=_light(raw.get("sugar")),
+            salt=_light(raw.get("salt")),
+            saturated_fat=_light(raw.get("saturated_fat")),
+        ))
+    total = _number(data.get("total_kcal")) or sum(item.kcal for item in items)
+    text_fields = {
+        name: str(data.get(name) or "").strip()
+        for name in MealAnalysis.__dataclass_fields__ if name not in ("items", "total_kcal")
+    }
+    return MealAnalysis(items=items, total_kcal=total, **text_fields)
+
+
+def parse_meal(text):
+    """Parses the model's JSON answer (or a cached one). Raises ValueError if it isn't valid."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        # Tolerate a fenced answer: ```json ... ```
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"The model did not return valid JSON: {e}") from e
+    return meal_from_dict(data)
+
+
+def render_markdown(meal):
+    """Markdown for the app, laid out like the original free-text format."""
+    lines = ["**Detailed Breakdown:**", ""]
+    for number, item in enumerate(meal.items, 1):
+        lines.append(f"{number}.  **{item.name}** {item.emoji}".rstrip())
+        lines.append(f"    * Calories: ~{item.kcal:,.0f} kcal")
+        macros = f"Protein ~{item.protein_g:.0f}g, Carbs ~{item.carbs_g:.0f}g, Fat ~{item.fat_g:.0f}g"
+        lines.append(f"    * Nutrition Notes: {item.notes} ({macros})" if item.notes else f"    * Nutrition Notes: {macros}")
+        if item.meal_time:
+            lines.append(f"    * Meal Time Relevance: {item.meal_time}")
+        lines.append(
+            "    * Health Traffic Light Indicators: "
+            f"Sugar: {LIGHT_EMOJI[item.sugar]}, Salt: {LIGHT_EMOJI[item.salt]}, "
+            f"Saturated Fat: {LIGHT_EMOJI[item.saturated_fat]}"
+        )
+    lines += ["", "---", f"**Total Estimated Calories:** ~{meal.total_kcal:,.0f} kcal 📊", ""]
+    if meal.calorie_budget:
+        lines += [f"🔥 {meal.calorie_budget}", ""]
+    lines += ["---"]
+
+    lines += ["**Expert Nutritional Insights & Considerations:** 💡"]
+    for label, text in (
+        ("🍽️ **Overall Meal Profile:**", meal.overall_profile),
+        ("✅ **Key Benefits:**", meal.key_benefits),
+        ("⚠️ **Potential Considerations/Side Effects:**", meal.considerations),
+        ("❤️‍🩹 **Notes for Health Conditions:**", meal.health_condition_notes),
+    ):
+        if text:
+            lines.append(f"* {label} {text}")
+    lines += [f"* ℹ️ **Disclaimer:** {DISCLAIMER}", "", "---"]
+
+    health = [
+        (f"- **High Blood Pressure:** ❤️‍🩹 {meal.blood_pressure}", meal.blood_pressure),
+        (f"- **High Blood Sugar:** 🩸 {meal.blood_sugar}", meal.blood_sugar),
+        (f"- **Weather:** ☀️🌧️❄️ {meal.weather}", meal.weather),
+    ]
+    if any(text for _, text in health):
+        lines += ["", "**🎯 Health & Weather Considerations:**"]
+        lines += [line for line, text in health if text]
+        lines += ["", "---"]
+
+    suggestions = [text for text in (meal.fitness_goal_suggestion, meal.dietary_preference_suggestion) if text]
+    if suggestions:
+        lines += ["**✅ Personalized Suggestions:**"]
+        lines += [f"- {text}" for text in suggestions]
+    return "\n".join(lines)
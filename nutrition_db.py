@@ -0,0 +1,250 @@
+"""
+Offline food-composition table for checking and recomputing calorie totals.
+
+Nutrients are kept per 100 g in a float32 matrix, names in a fixed-width
+string array, and a character-trigram index in CSR form (offsets into one
+postings array), all plain numpy arrays. A compiled table is saved as .npy
+files and memory-mapped on load, so even a large table opens instantly and
+is shared between processes through the page cache.
+
+Item names from a parsed MealAnalysis (see meal_schema.py) are matched against
+the table by trigram similarity; per-item kcal and macros, and the totals,
+are then recomputed locally with no model call. Rows are sorted by name so
+exact names resolve with a binary search, and resolved names are memoized,
+so recomputing a meal after a portion change never touches the index again.
+"""
+import csv
+import functools
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+NUTRIENTS = ("kcal", "protein_g", "carbs_g", "fat_g")
+
+NUTRITION_DB_PATH = os.getenv(
+    "NUTRITION_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv")
+)
+# Minimum trigram similarity (Dice coefficient, 0-1) to accept a table match
+NUTRITION_MIN_SCORE = float(os.getenv("NUTRITION_MIN_SCORE", "0.45"))
+# Resolved item names remembered per table
+NUTRITION_LOOKUP_CACHE_SIZE = 4096
+
+ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789"
+_CHAR_CODES = {c: i for i, c in enumerate(ALPHABET)}
+TRIGRAM_SPACE = len(ALPHABET) ** 3
+
+
+def normalize_name(name):
+    """Lower-case ASCII letters and digits separated by single spaces."""
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode().lower()
+    text = re.sub(r"\([^)]*\)", " ", text)  # "(if applicable)", "(1 cup)"
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def trigrams(name):
+    """Distinct trigram codes of an already normalized name, padded with spaces."""
+    padded = f"  {name} "
+    codes = {
+        (_CHAR_CODES[a] * len(ALPHABET) + _CHAR_CODES[b]) * len(ALPHABET) + _CHAR_CODES[c]
+        for a, b, c in zip(padded, padded[1:], padded[2:])
+    }
+    return np.fromiter(sorted(codes), dtype=np.int32, count=len(codes))
+
+
+@dataclass
+class FoodMatch:
+    row: int
+    name: str
+    score: float
+
+
+@dataclass
+class ItemEstimate:
+    name: str  # as written by the model
+    food: str = None  # matched table entry, None if nothing was close enough
+    score: float = 0.0
+    servings: float = 1.0
+    grams: float = None
+    kcal: float = None
+    protein_g: float = None
+    carbs_g: float = None
+    fat_g: float = None
+    model_kcal: float = None
+
+
+@dataclass
+class MealEstimate:
+    items: list = field(default_factory=list)
+    total_kcal: float = 0.0
+    protein_g: float = 0.0
+    carbs_g: float = 0.0
+    fat_g: float = 0.0
+    model_total_kcal: float = None
+
+    @property
+    def matched(self):
+        return sum(item.food is not None for item in self.items)
+
+
+class NutritionDB:
+    """Food table with a trigram name index. Build with from_csv() or load()."""
+
+    def __init__(self, names, values, servings, offsets=None, postings=None, trigram_counts=None):
+        self.names = names  # (n,) fixed-width str, sorted
+        self.values = values  # (n, 4) float32, NUTRIENTS per 100 g
+        self.servings = servings  # (n,) float32, typical serving in grams
+        if offsets is None:
+            offsets, postings, trigram_counts = self._build_index(names)
+        self.offsets = offsets  # (TRIGRAM_SPACE + 1,) int64
+        self.postings = postings  # row ids grouped by trigram
+        self.trigram_counts = trigram_counts  # (n,) distinct trigrams per name
+        self._memo = OrderedDict()  # (normalized name, min_score) -> FoodMatch or None
+        self._memo_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _build_index(names):
+        per_name = [trigrams(str(name)) for name in names]
+        counts = np.fromiter((len(t) for t in per_name), dtype=np.int16, count=len(per_name))
+        codes = np.concatenate(per_name) if per_name else np.empty(0, dtype=np.int32)
+        rows = np.repeat(np.arange(len(per_name), dtype=np.int32), counts)
+        order = np.argsort(codes, kind="stable")
+        offsets = np.zeros(TRIGRAM_SPACE + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=TRIGRAM_SPACE), out=offsets[1:])
+        return offsets, rows[order], counts
+
+    @classmethod
+    def from_records(cls, records):
+        """Builds a table from (name, kcal, protein_g, carbs_g, fat_g, serving_g) tuples."""
+        records = sorted(records, key=lambda r: normalize_name(r[0]))
+        names = np.array([normalize_name(r[0]) for r in records], dtype=str)
+        values = np.array([r[1:5] for r in records], dtype=np.float32).reshape(-1, len(NUTRIENTS))
+        servings = np.array([r[5] for r in records], dtype=np.float32)
+        return cls(names, values, servings)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return cls.from_records(
+                (row["name"], float(row["kcal_per_100g"]), float(row["protein_g"]), float(row["carbs_g"]),
+                 float(row["fat_g"]), float(row["serving_g"]))
+                for row in reader
+            )
+
+    def save(self, directory):
+        """Writes the table and index as .npy files that load() can memory-map."""
+        os.makedirs(directory, exist_ok=True)
+        for attr in ("names", "values", "servings", "offsets", "postings", "trigram_counts"):
+            np.save(os.path.join(directory, f"{attr}.npy"), getattr(self, attr))
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        mode = "r" if mmap else None
+        arrays = {
+            attr: np.load(os.path.join(directory, f"{attr}.npy"), mmap_mode=mode)
+            for attr in ("names", "values", "servings", "offsets", "postings", "trigram_counts")
+        }
+        return cls(**arrays)
+
+    def lookup(self, name, min_score=NUTRITION_MIN_SCORE):
+        """Best table entry for ``name`` by trigram Dice similarity, or None below ``min_score``."""
+        query = normalize_name(name)
+        if not query:
+            return None
+        key = (query, min_score)
+        with self._memo_lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        match = self._exact(query) or self._fuzzy(query, min_score)
+        with self._memo_lock:
+            self._memo[key] = match
+            if len(self._memo) > NUTRITION_LOOKUP_CACHE_SIZE:
+                self._memo.popitem(last=False)
+        return match
+
+    def _exact(self, query):
+        row = int(np.searchsorted(self.names, query))
+        if row < len(self.names) and self.names[row] == query:
+            return FoodMatch(row=row, name=query, score=1.0)
+        return None
+
+    def _fuzzy(self, query, min_score):
+        codes = trigrams(query)
+        starts, ends = self.offsets[codes], self.offsets[codes + 1]
+        if not (ends > starts).any():
+            return None
+        candidates = np.concatenate([self.postings[s:e] for s, e in zip(starts, ends)])
+        shared = np.bincount(candidates, minlength=len(self.names))
+        # Dice >= min_score needs at least this many shared trigrams, whatever the name's length
+        rows = np.flatnonzero(shared >= max(1, math.ceil(min_score * len(codes) / (2 - min_score))))
+        if not len(rows):
+            return None
+        scores = 2.0 * shared[rows] / (len(codes) + self.trigram_counts[rows])
+        best = int(np.argmax(scores))
+        if scores[best] < min_score:
+            return None
+        row = int(rows[best])
+        return FoodMatch(row=row, name=str(self.names[row]), score=float(scores[best]))
+
+    def estimate(self, items, servings=None, min_score=NUTRITION_MIN_SCORE):
+        """
+        Recomputes kcal and macros for ``items`` [(name, model_kcal), ...].
+        ``servings`` optionally gives a portion multiplier per item (default 1
+        typical serving). Unmatched items keep the model's kcal and add no macros.
+        """
+        servings = list(servings) if servings is not None else [1.0] * len(items)
+        estimate = MealEstimate()
+        matched, rows, portions = [], [], []
+        for (name, model_kcal), portion in zip(items, servings):
+            item = ItemEstimate(name=name, servings=portion, model_kcal=model_kcal)
+            match = self.lookup(name, min_score)
+            if match is not None:
+                item.food, item.score = match.name, match.score
+                matched.append(item)
+                rows.append(match.row)
+                portions.append(portion)
+            elif model_kcal is not None:
+                item.kcal = model_kcal * portion
+                estimate.total_kcal += item.kcal
+            estimate.items.append(item)
+
+        if rows:
+            rows = np.asarray(rows)
+            grams = self.servings[rows] * np.asarray(portions, dtype=np.float32)
+            nutrients = self.values[rows] * (grams / 100.0)[:, None]
+            for item, g, (kcal, protein, carbs, fat) in zip(matched, grams.tolist(), nutrients.tolist()):
+                item.grams, item.kcal, item.protein_g, item.carbs_g, item.fat_g = g, kcal, protein, carbs, fat
+            kcal, protein, carbs, fat = nutrients.sum(axis=0).tolist()
+            estimate.total_kcal += kcal
+            estimate.protein_g, estimate.carbs_g, estimate.fat_g = protein, carbs, fat
+        return estimate
+
+
+def load_nutrition_db(path=NUTRITION_DB_PATH):
+    """Loads a CSV seed table, or memory-maps a table compiled with NutritionDB.save()."""
+    if os.path.isdir(path):
+        return NutritionDB.load(path)
+    return NutritionDB.from_csv(path)
+
+
+@functools.lru_cache(maxsize=None)
+def get_nutrition_db():
+    """The nutrition table shared by all Streamlit sessions and CLI threads."""
+    return load_nutrition_db()
+
+
+def recompute_meal(meal, servings=None):
+    """Recomputes a MealAnalysis's items and totals from the local table."""
+    estimate = get_nutrition_db().estimate([(item.name, item.kcal) for item in meal.items], servings)
+    estimate.model_total_kcal = meal.total_kcal
+    return estimate
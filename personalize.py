@@ -0,0 +1,186 @@
+"""
+Personalization of a meal analysis with local rules, no model call.
+
+The vision stage (analysis.analyze_image) only depends on the image, so it can
+be cached and shared between users. This stage turns its items, macros and
+traffic lights into the profile-specific parts of the answer: share of daily
+needs, blood pressure and blood sugar notes, weather, fitness goal and diet.
+It runs in microseconds, so the app reapplies it whenever the sidebar changes.
+"""
+from dataclasses import replace
+
+LIGHT_RANK = {"green": 0, "amber": 1, "red": 2}
+LEVEL = ("low", "moderate", "high")
+
+MEAT_WORDS = {
+    "chicken", "beef", "pork", "mutton", "lamb", "goat", "fish", "salmon", "tuna", "shrimp", "prawn", "prawns",
+    "crab", "bacon", "ham", "sausage", "pepperoni", "salami", "turkey", "duck", "meat", "steak", "anchovy",
+}
+ANIMAL_WORDS = MEAT_WORDS | {
+    "egg", "eggs", "omelette", "milk", "cheese", "paneer", "butter", "ghee", "yogurt", "curd", "cream", "honey",
+    "mayonnaise", "mayo", "lassi", "raita",
+}
+# Words that mark fried or deep-fried items
+FRIED_WORDS = {"fried", "fries", "deep", "pakora", "samosa", "crispy", "tempura", "nuggets", "battered"}
+
+
+def _words(items):
+    return {word.strip(",.()").lower() for item in items for word in item.name.split()}
+
+
+def _matching(items, vocabulary):
+    return [item.name for item in items if _words([item]) & vocabulary]
+
+
+def _macro_shares(meal):
+    """Share of calories from carbs, protein and fat (4/4/9 kcal per gram)."""
+    carbs, protein, fat = meal.carbs_g * 4, meal.protein_g * 4, meal.fat_g * 9
+    total = carbs + protein + fat
+    if not total:
+        return 0.0, 0.0, 0.0
+    return carbs / total, protein / total, fat / total
+
+
+def _worst(items, light):
+    ranks = [LIGHT_RANK[getattr(item, light)] for item in items]
+    return max(ranks) if ranks else 0
+
+
+def _names(names):
+    return ", ".join(names[:3])
+
+
+def calorie_budget(meal, tdee):
+    if not tdee:
+        return ""
+    share = meal.total_kcal / tdee
+    note = "a light meal" if share < 0.2 else "a typical main meal" if share <= 0.35 else "a large share of the day"
+    return f"This meal provides ~{share:.0%} of your estimated daily needs ({tdee:,} kcal) — {note}."
+
+
+def blood_pressure_note(meal):
+    level = _worst(meal.items, "salt")
+    salty = [item.name for item in meal.items if item.salt == "red"]
+    text = f"Sodium content looks {LEVEL[level]}."
+    if salty:
+        text += f" Go easy on {_names(salty)} and skip added salt, pickles and salty sauces."
+    elif level == 1:
+        text += " Avoid adding extra salt or salty sauces."
+    return text + " Adding potassium-rich foods (banana, spinach, beans, yogurt) helps balance sodium."
+
+
+def blood_sugar_note(meal):
+    carbs_share, protein_share, _ = _macro_shares(meal)
+    sugary = [item.name for item in meal.items if item.sugar == "red"]
+    if sugary or carbs_share > 0.55:
+        level = "high"
+    elif carbs_share > 0.35 or any(item.sugar == "amber" for item in meal.items):
+        level = "moderate"
+    else:
+        level = "low"
+    text = f"Likely glycemic impact: {level} (~{meal.carbs_g:.0f} g carbs, {carbs_share:.0%} of calories)."
+    if sugary:
+        text += f" Limit {_names(sugary)}."
+    if level != "low":
+        text += " Eat the protein and vegetables first, prefer whole grains or low-GI swaps, and keep starchy portions small."
+    if protein_share < 0.15:
+        text += " Adding protein or fiber would slow the sugar rise."
+    return text
+
+
+def weather_note(meal, weather):
+    _, _, fat_share = _macro_shares(meal)
+    heavy = fat_share > 0.4 or meal.total_kcal > 900 or bool(_matching(meal.items, FRIED_WORDS))
+    if weather == "Summer":
+        text = "Hot weather: favour hydrating sides (cucumber, curd, fruit, water)."
+        if heavy:
+            text += " This meal is on the heavy side; a smaller portion will feel better in the heat."
+        return text
+    if weather == "Rainy":
+        text = "Rainy season: freshly cooked, warm food is the safer choice."
+        if _matching(meal.items, FRIED_WORDS):
+            text += " Fried items are tempting now, but keep them occasional."
+        return text
+    if weather == "Winter":
+        text = "Cold weather: warm, hearty meals like this are fine; add a soup or warm drink for hydration."
+        if heavy:
+            text += " Watch portion sizes, since activity tends to drop in winter."
+        return text
+    if weather:
+        return "Moderate weather: no special adjustments needed; stay hydrated."
+    return ""
+
+
+def fitness_goal_note(meal, goal, tdee):
+    carbs_share, protein_share, fat_share = _macro_shares(meal)
+    share = meal.total_kcal / tdee if tdee else None
+    fried = _matching(meal.items, FRIED_WORDS)
+    if goal == "Weight Loss":
+        advice = []
+        if share is not None and share > 0.35:
+            advice.append("reduce the portion size")
+        if fried or fat_share > 0.4:
+            advice.append(f"swap fried components{' (' + _names(fried) + ')' if fried else ''} for grilled or steamed ones")
+        advice.append("fill half the plate with vegetables for volume")
+        text = "; ".join(advice)
+        return f"Based on the Fitness Goal (Weight Loss): {text[0].upper()}{text[1:]}."
+    if goal == "Muscle Gain":
+        if meal.protein_g < 25:
+            return f"Based on the Fitness Goal (Muscle Gain): ~{meal.protein_g:.0f} g protein is low; add lean protein (eggs, chicken, paneer, legumes) to reach 25-40 g."
+        return f"Based on the Fitness Goal (Muscle Gain): ~{meal.protein_g:.0f} g protein is a good amount; pair it with complex carbs around training."
+    if goal == "Endurance":
+        if carbs_share < 0.45:
+            return "Based on the Fitness Goal (Endurance): add complex carbs (rice, oats, potatoes, fruit) to fuel longer sessions."
+        return "Based on the Fitness Goal (Endurance): good carbohydrate base; add fluids and some protein for recovery."
+    if goal == "Maintenance":
+        if share is not None and share > 0.4:
+            return "Based on the Fitness Goal (Maintenance): this is a big meal; keep the rest of the day lighter."
+        return "Based on the Fitness Goal (Maintenance): a reasonable meal; keep the plate balanced across the day."
+    if goal == "Flexibility":
+        return "Based on the Fitness Goal (Flexibility): add anti-inflammatory foods (leafy greens, berries, nuts, turmeric) and stay hydrated."
+    return ""
+
+
+def dietary_preference_note(meal, preference):
+    carbs_share, _, _ = _macro_shares(meal)
+    if preference == "Keto":
+        if carbs_share <= 0.1:
+            return f"Based on Dietary Preference (Keto): compatible — only ~{meal.carbs_g:.0f} g carbs."
+        return (f"Based on Dietary Preference (Keto): not compatible (~{meal.carbs_g:.0f} g carbs). "
+                "Swap starches for cauliflower rice, extra vegetables or more protein and healthy fats.")
+    if preference == "Low Carb":
+        if carbs_share <= 0.26:
+            return "Based on Dietary Preference (Low Carb): compatible."
+        return (f"Based on Dietary Preference (Low Carb): partially compatible (~{carbs_share:.0%} of calories from carbs). "
+                "Halve the starchy portion and add vegetables or protein.")
+    if preference in ("Vegetarian", "Vegan"):
+        avoid = MEAT_WORDS if preference == "Vegetarian" else ANIMAL_WORDS
+        swaps = "tofu, tempeh or legumes" if preference == "Vegan" else "paneer, tofu, legumes or eggs (if you eat them)"
+        conflicts = _matching(meal.items, avoid)
+        if conflicts:
+            return (f"Based on Dietary Preference ({preference}): not compatible because of {_names(conflicts)}. "
+                    f"Try {swaps} instead.")
+        return f"Based on Dietary Preference ({preference}): compatible."
+    if preference == "Balanced":
+        missing = []
+        if carbs_share > 0.6:
+            missing.append("more protein and vegetables")
+        if meal.protein_g < 15:
+            missing.append("a protein source")
+        if missing:
+            return f"Based on Dietary Preference (Balanced): add {' and '.join(missing)} to balance the plate."
+        return "Based on Dietary Preference (Balanced): compatible — a reasonably balanced plate."
+    return ""
+
+
+def personalize(meal, name="", age=None, weight=None, height=None, activity_level=None, dietary_preference=None, fitness_goal=None, tdee=None, has_bp=None, has_sugar=None, weather=None):
+    """Returns a copy of the profile-free ``meal`` with the profile-specific fields filled in."""
+    return replace(
+        meal,
+        calorie_budget=calorie_budget(meal, tdee),
+        blood_pressure=blood_pressure_note(meal) if has_bp == "Yes" else "",
+        blood_sugar=blood_sugar_note(meal) if has_sugar == "Yes" else "",
+        weather=weather_note(meal, weather),
+        fitness_goal_suggestion=fitness_goal_note(meal, fitness_goal, tdee),
+        dietary_preference_suggestion=dietary_preference_note(meal, dietary_preference),
+    )
@@ -0,0 +1,237 @@
+"""
+Local pre-screen of meal photos before the Gemini call.
+
+A blurry, dark, blank or non-food photo still costs a full model round-trip
+and gives a poor answer. screen() measures a downscaled copy with OpenCV in a
+few milliseconds:
+- sharpness: variance of the Laplacian, scaled to a standard contrast so a
+  dim but sharp photo isn't taken for a blurry one;
+- exposure: mean brightness and the share of clipped highlights;
+- contrast: standard deviation of the brightness (a blank frame has none);
+- colorfulness (Hasler and Süsstrunk): food is rarely gray, documents and
+  screenshots of text usually are;
+- an optional local classifier (PRESCREEN_MODEL_PATH, an ONNX model run with
+  cv2.dnn, or any callable set with set_classifier) that scores "food".
+
+Each failed check is an Issue that either rejects the photo (the app and CLI
+skip the model call) or only warns. All thresholds are PRESCREEN_*
+settings. With PRESCREEN_CROP=1 the largest round plate found is also
+returned as a crop box, and crop_prepared() cuts the model image down to it,
+so fewer pixels are sent.
+"""
+import functools
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_preprocess import preprocess_image
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "1") == "1"
+PRESCREEN_CROP = os.getenv("PRESCREEN_CROP", "0") == "1"
+# Longest side of the copy that is measured; thresholds below are for this size
+PRESCREEN_SIZE = int(os.getenv("PRESCREEN_SIZE", "512"))
+# Optional ONNX food/non-food classifier, the output index of the "food" class and the score needed
+PRESCREEN_MODEL_PATH = os.getenv("PRESCREEN_MODEL_PATH", "")
+PRESCREEN_FOOD_CLASS = int(os.getenv("PRESCREEN_FOOD_CLASS", "1"))
+
+# Brightness standard deviation that sharpness is normalized to
+REFERENCE_CONTRAST = 50.0
+
+REJECT = "reject"
+WARN = "warn"
+
+
+class RejectedImageError(ValueError):
+    """The pre-screen rejected a photo, so it was not sent for analysis."""
+
+
+@dataclass
+class Thresholds:
+    """Limits of the checks; the defaults come from the PRESCREEN_* environment variables."""
+    blur_reject: float = float(os.getenv("PRESCREEN_BLUR_REJECT", "12"))
+    blur_warn: float = float(os.getenv("PRESCREEN_BLUR_WARN", "40"))
+    dark_mean: float = float(os.getenv("PRESCREEN_DARK_MEAN", "35"))
+    clipped_share: float = float(os.getenv("PRESCREEN_CLIPPED_SHARE", "0.5"))
+    contrast_min: float = float(os.getenv("PRESCREEN_CONTRAST_MIN", "10"))
+    colorfulness_warn: float = float(os.getenv("PRESCREEN_COLORFULNESS_WARN", "12"))
+    food_score_min: float = float(os.getenv("PRESCREEN_FOOD_SCORE_MIN", "0.3"))
+    # A plate is only cropped to if that removes at least this share of the pixels
+    crop_min_saving: float = float(os.getenv("PRESCREEN_CROP_MIN_SAVING", "0.25"))
+
+
+@dataclass
+class Issue:
+    check: str
+    level: str
+    message: str
+
+
+@dataclass
+class ScreenResult:
+    """Outcome of screen(): issues found, the measured values and an optional plate crop."""
+    issues: list = field(default_factory=list)
+    metrics: dict = field(default_factory=dict)
+    # (left, top, right, bottom) as fractions of the width and height
+    crop: tuple = None
+    seconds: float = 0.0
+
+    @property
+    def rejected(self):
+        return any(issue.level == REJECT for issue in self.issues)
+
+    @property
+    def warnings(self):
+        return [issue for issue in self.issues if issue.level == WARN]
+
+    def summary(self):
+        return "; ".join(issue.message for issue in self.issues) or "ok"
+
+
+def _to_rgb_array(image, size):
+    """RGB uint8 array of ``image`` (PIL image, encoded bytes or array) with its longest side at most ``size``."""
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(BytesIO(image))
+    if isinstance(image, Image.Image):
+        if image.format == "JPEG":
+            image.draft("RGB", (size, size))
+        array = np.asarray(image.convert("RGB"))
+    else:
+        array = np.ascontiguousarray(image)
+    scale = size / max(array.shape[:2])
+    if scale < 1:
+        array = cv2.resize(array, (round(array.shape[1] * scale), round(array.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+    return array
+
+
+def colorfulness(rgb):
+    """Hasler and Süsstrunk's colorfulness: ~0 for gray images, 15-35 for muted and 45+ for vivid photos."""
+    r, g, b = (rgb[..., i].astype(np.float32) for i in range(3))
+    rg = r - g
+    yb = 0.5 * (r + g) - b
+    return float(np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean()))
+
+
+def find_plate(gray, min_saving):
+    """Bounding box (as fractions) of the largest round plate, or None if none is found or it fills the frame."""
+    height, width = gray.shape
+    short = min(height, width)
+    circles = cv2.HoughCircles(
+        cv2.medianBlur(gray, 5), cv2.HOUGH_GRADIENT, dp=1.5, minDist=short,
+        param1=120, param2=60, minRadius=int(short * 0.25), maxRadius=int(short * 0.75),
+    )
+    if circles is None:
+        return None
+    x, y, radius = max(circles[0], key=lambda circle: circle[2])
+    radius *= 1.08  # keep the rim
+    left, top = max(x - radius, 0) / width, max(y - radius, 0) / height
+    right, bottom = min(x + radius, width) / width, min(y + radius, height) / height
+    if (right - left) * (bottom - top) > 1 - min_saving:
+        return None
+    return float(left), float(top), float(right), float(bottom)
+
+
+def screen(image, thresholds=None, classifier=None, crop=PRESCREEN_CROP):
+    """
+    Checks a photo before analysis; ``image`` is a PIL image, encoded bytes
+    (e.g. the display thumbnail) or an RGB array. ``classifier`` defaults to
+    get_classifier().
+    """
+    start = time.perf_counter()
+    thresholds = thresholds or Thresholds()
+    classifier = classifier if classifier is not None else get_classifier()
+    rgb = _to_rgb_array(image, PRESCREEN_SIZE)
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+
+    contrast = float(gray.std())
+    metrics = {
+        "sharpness": float(cv2.Laplacian(gray, cv2.CV_64F).var()) * (REFERENCE_CONTRAST / max(contrast, 1.0)) ** 2,
+        "brightness": float(gray.mean()),
+        "clipped": float(np.count_nonzero(gray >= 250) / gray.size),
+        "contrast": contrast,
+        "colorfulness": colorfulness(rgb),
+    }
+    issues = []
+    if metrics["brightness"] < thresholds.dark_mean:
+        issues.append(Issue("dark", REJECT, "The photo is too dark to see the food; add light or turn on the flash."))
+    elif metrics["clipped"] > thresholds.clipped_share:
+        issues.append(Issue("overexposed", REJECT, "Most of the photo is pure white; it is overexposed or shows no food."))
+    elif metrics["contrast"] < thresholds.contrast_min:
+        issues.append(Issue("blank", REJECT, "The photo looks blank or almost uniform."))
+    else:
+        if metrics["sharpness"] < thresholds.blur_reject:
+            issues.append(Issue("blur", REJECT, "The photo is too blurry; hold the camera steady and tap to focus."))
+        elif metrics["sharpness"] < thresholds.blur_warn:
+            issues.append(Issue("blur", WARN, "The photo is a little blurry; estimates may be less accurate."))
+        if metrics["colorfulness"] < thresholds.colorfulness_warn:
+            issues.append(Issue("color", WARN, "The photo is nearly colorless; it may not show food."))
+        if classifier is not None:
+            metrics["food_score"] = float(classifier(rgb))
+            if metrics["food_score"] < thresholds.food_score_min:
+                issues.append(Issue("not_food", REJECT, "No food was recognized in the photo."))
+
+    plate = find_plate(gray, thresholds.crop_min_saving) if crop and not issues else None
+    return ScreenResult(issues=issues, metrics=metrics, crop=plate, seconds=time.perf_counter() - start)
+
+
+def crop_prepared(prepared, crop):
+    """A PreparedImage of ``prepared`` cut to a crop box from screen(), re-encoded with the same settings."""
+    image = prepared.image
+    left, top, right, bottom = crop
+    box = (round(left * image.width), round(top * image.height), round(right * image.width), round(bottom * image.height))
+    stats = prepared.stats
+    cropped = preprocess_image(
+        image.crop(box), max_dimension=None, max_bytes=stats.output_bytes, image_format=stats.image_format,
+        max_quality=max(stats.quality, 40),
+    )
+    # Report the original upload in the stats, not the intermediate image
+    cropped.stats = replace(
+        cropped.stats, original_bytes=stats.original_bytes, original_size=stats.original_size,
+        seconds=stats.seconds + cropped.stats.seconds,
+    )
+    return cropped
+
+
+class OnnxClassifier:
+    """Food score from an ONNX image classifier run with OpenCV's DNN module (ImageNet-style input)."""
+
+    def __init__(self, path, food_class=PRESCREEN_FOOD_CLASS, size=224):
+        self.net = cv2.dnn.readNetFromONNX(path)
+        self.food_class = food_class
+        self.size = size
+        self._lock = threading.Lock()  # a cv2.dnn network can't run two inputs at once
+
+    def __call__(self, rgb):
+        blob = cv2.dnn.blobFromImage(
+            rgb, scalefactor=1 / 255, size=(self.size, self.size), mean=(0.485 * 255, 0.456 * 255, 0.406 * 255),
+            swapRB=False, crop=True,
+        ) / np.array([0.229, 0.224, 0.225], dtype=np.float32).reshape(1, 3, 1, 1)
+        with self._lock:
+            self.net.setInput(blob)
+            logits = self.net.forward().ravel()
+        scores = np.exp(logits - logits.max())
+        return float(scores[self.food_class] / scores.sum())
+
+
+_classifier = None
+
+
+def set_classifier(classifier):
+    """Installs a callable(rgb array) -> food score in [0, 1] used by screen(); None restores the default."""
+    global _classifier
+    _classifier = classifier
+
+
+@functools.lru_cache(maxsize=None)
+def _load_default_classifier():
+    return OnnxClassifier(PRESCREEN_MODEL_PATH) if PRESCREEN_MODEL_PATH else None
+
+
+def get_classifier():
+    """The classifier set with set_classifier(), else the PRESCREEN_MODEL_PATH model, else None."""
+    return _classifier if _classifier is not None else _load_default_classifier()
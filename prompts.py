@@ -0,0 +1,277 @@
+"""
+Prompt templates of the vision call and the dietary planner agent.
+
+Every template is compiled once at import: its text is normalized, its
+$placeholders are parsed (string.Template), and it gets a version, a short
+hash of the text. Those versions go into the result and agent cache keys, so
+editing a prompt retires the answers cached for the old text without a
+version number to bump by hand.
+
+Each prompt comes in two variants, picked with PROMPT_VARIANT (or
+set_variant()):
+- full: the original wording;
+- compact: the same instructions and the same JSON output schema (it is
+  enforced by meal_schema.RESPONSE_SCHEMA either way) in far fewer tokens.
+
+The static prompt always leads the request, ahead of the image or the
+per-meal data, so a backend with prefix caching (implicit caching of
+Gemini 2.5 models) can reuse it; the tokens it served from cache are
+reported as cached_tokens. TokenMeter adds up the input, cached and output
+tokens of every call by prompt and version.
+"""
+import functools
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from string import Template
+from textwrap import dedent
+
+import tracing
+
+PROMPT_VARIANT = os.getenv("PROMPT_VARIANT", "full")
+VARIANTS = ("full", "compact")
+# Rough size of a token, for estimates before a call (the model's count comes back with the response)
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximate token count of ``text``; good enough to compare prompts, not to bill them."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """A compiled template: normalized text, its placeholders, version hash and estimated size."""
+    name: str
+    variant: str
+    text: str
+    template: Template
+    fields: tuple
+    version: str
+    tokens: int
+
+    def render(self, **values):
+        """The prompt with its placeholders filled in; raises KeyError for a missing one."""
+        return self.template.substitute(values) if self.fields else self.text
+
+
+def compile_prompt(name, variant, text):
+    # Trailing spaces and indentation change the hash (and the tokens) but not the meaning
+    text = "\n".join(line.rstrip() for line in dedent(text).strip().splitlines())
+    template = Template(text)
+    if not template.is_valid():
+        raise ValueError(f"Prompt {name}/{variant} has an invalid $placeholder.")
+    return Prompt(
+        name=name,
+        variant=variant,
+        text=text,
+        template=template,
+        fields=tuple(template.get_identifiers()),
+        version=hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest(),
+        tokens=estimate_tokens(text),
+    )
+
+
+def combined_version(prompts):
+    """One version for prompts that are used together, e.g. the agent's description and instructions."""
+    return hashlib.blake2b("/".join(p.version for p in prompts).encode("ascii"), digest_size=6).hexdigest()
+
+
+TEMPLATES = {
+    ("vision", "full"): """
+        You are an expert AI nutritional consultant 🧑‍⚕️ analyzing food items and drinks from an image 📸.
+        Your task is to identify each food item or drink component visible, estimate its calorie count 🔢, and provide a brief nutritional overview (like estimated protein, carbs, fats, vitamins if possible). Aim to give the best, most informative response based on the image.
+
+        Please also include:
+        1. 🕐 **Meal Time Relevance**: Based on the composition of the food, suggest the best time to consume it (e.g., breakfast, lunch, dinner, snack, avoid late night, etc.) and why.
+        2. 🚦 **Health Traffic Light Indicators**: For each food item, rate the sugar, salt, and saturated fat levels using the color system:
+            - green: Healthy/low
+            - amber: Moderate/acceptable
+            - red: High — caution
+
+        Respond with a single JSON object (no markdown) with these fields:
+        - "items": one entry per food item or drink component, each with
+            - "name": short food name, e.g. "Grilled Chicken Breast"
+            - "emoji": one emoji for the item
+            - "kcal": estimated calories as a number
+            - "protein_g", "carbs_g", "fat_g": estimated grams as numbers
+            - "notes": brief nutrition notes, e.g. good source of fiber, high in sugar
+            - "meal_time": meal time relevance, e.g. "Breakfast or lunch — slow-release energy"
+            - "sugar", "salt", "saturated_fat": traffic lights, each "green", "amber" or "red"
+        - "total_kcal": total estimated calories as a number
+        - "overall_profile": 🍽️ Is the meal balanced? High in carbs/fat/protein?
+        - "key_benefits": ✅ positive nutritional aspects of the main ingredients
+        - "considerations": ⚠️ potential considerations/side effects, e.g. high sodium, sugar or saturated fat and the effects of overconsumption. Be factual and avoid overly strong warnings.
+        - "health_condition_notes": ❤️‍🩹 general dietary considerations for people managing high blood pressure or diabetes, e.g. sodium for BP, carbohydrates/sugar for diabetes, with moderation or healthier preparation tips
+        """,
+    ("vision", "compact"): """
+        Nutritionist: identify every food and drink in the image and estimate its nutrition.
+        Reply with one JSON object:
+        - items: per food, name, emoji, kcal, protein_g, carbs_g, fat_g (numbers), notes (brief), meal_time (best time to eat it and why), sugar/salt/saturated_fat (green, amber or red)
+        - total_kcal (number)
+        - overall_profile: is it balanced?
+        - key_benefits
+        - considerations: factual, e.g. sodium, sugar, saturated fat
+        - health_condition_notes: for high blood pressure and diabetes
+        """,
+    ("agent.description", "full"): """
+        Creates personalized dietary plans based on user input.
+        Generates customized workout routines based on fitness goals.
+        Combines diet and workout plans into a holistic health strategy.
+        Expert nutritionist and dietary advisor specializing in personalized meal planning
+        and evidence-based nutritional recommendations.
+        """,
+    ("agent.description", "compact"): """
+        Nutritionist and fitness coach writing personalized diet, workout, yoga and meditation plans.
+        """,
+    ("agent.instructions", "full"): """
+        "Generate a diet plan with breakfast, lunch, dinner, and snacks.",
+        "Consider dietary preferences like Keto, Vegetarian, or Low Carb.",
+        "Ensure proper hydration and electrolyte balance.",
+        "Provide nutritional breakdown including macronutrients and vitamins.",
+        "Suggest meal preparation tips for easy implementation.",
+        "If necessary, search the web using DuckDuckGo for additional information.",
+        "Create a workout plan including warm-ups, main exercises, and cool-downs.",
+        "Adjust workouts based on fitness level: Beginner, Intermediate, Advanced.",
+        "Consider weight loss, muscle gain, endurance, or flexibility goals.",
+        "Provide safety tips and injury prevention advice.",
+        "Suggest progress tracking methods for motivation.",
+        "Merge personalized diet and fitness plans for a comprehensive approach, use tables if possible.",
+        "Ensure alignment between diet and exercise for optimal results.",
+        "Suggest lifestyle tips for motivation and consistency.",
+        "Provide realistic, real-time nutritional advice tailored to the user's data with engaging emojis, including suggestions for meal modifications, portion control, and healthy eating practices."
+        "Recommend specific yoga asanas based on user's fitness level and health conditions.",
+        "Include optimal timing for yoga practice (morning/evening) with duration.",
+        "List 3-4 specific yogasanas with their benefits and duration.",
+        "Suggest meditation techniques aligned with user's lifestyle and goals.",
+        """,
+    ("agent.instructions", "compact"): """
+        - Diet plan (breakfast, lunch, dinner, snacks) for the user's preference, with macros and hydration.
+        - Workout (warm-up, main, cool-down) for their goal and level, with safety tips.
+        - Changes to this meal: portions, swaps; respect blood pressure and diabetes.
+        - Search DuckDuckGo only if needed. Use tables where they help.
+        """,
+    ("agent.expected_output", "full"): """
+        Prepare the output so that it captures the user data from st.session_state.calorie_info.
+        Return additional information with clear bullet points, emojis in the headings (including yoga and meditation tips), and comprehensive advice merging diet, workout recommendations, and realistic nutritional advice tailored to the user's data with emoji-enhanced suggestions.
+        Include a dedicated '🧘 Yoga & Meditation Corner' section with:
+        - Best time to practice (morning/evening with specific timing)
+        - 3-4 specific yogasanas names with their benefits
+        - Duration for each asana (in minutes)
+        - Total session duration
+        - Meditation technique with timing
+        - Breathing exercises (pranayama) if applicable
+        Provide comprehensive advice merging diet, workout recommendations, and realistic nutritional advice
+        tailored to the user's data with emoji-enhanced suggestions.
+        """,
+    ("agent.expected_output", "compact"): """
+        Markdown, bullet points, emoji headings: diet plan, workout plan, advice on this meal, and a
+        '🧘 Yoga & Meditation Corner' with the best time to practice, 3-4 asanas with benefits and
+        minutes each, total duration, a meditation technique and pranayama if useful.
+        """,
+    # The message of one run: the analysis as shown to the user, or a one-line digest of it
+    ("agent.message", "full"): "$analysis",
+    ("agent.message", "compact"): """
+        Meal ($total_kcal kcal): $items
+        User: $profile
+        """,
+}
+
+PROMPTS = {key: compile_prompt(*key, text) for key, text in TEMPLATES.items()}
+AGENT_PROMPTS = ("agent.description", "agent.instructions", "agent.expected_output", "agent.message")
+
+_variant = None
+
+
+def set_variant(variant):
+    """Switches the prompt variant used by default in this process; None restores PROMPT_VARIANT."""
+    global _variant
+    if variant is not None and variant not in VARIANTS:
+        raise ValueError(f"Unknown prompt variant {variant!r}; expected one of {', '.join(VARIANTS)}.")
+    _variant = variant
+
+
+def current_variant():
+    return _variant or PROMPT_VARIANT
+
+
+def get_prompt(name, variant=None):
+    """The compiled prompt ``name`` in ``variant`` (default: current_variant())."""
+    variant = variant or current_variant()
+    try:
+        return PROMPTS[name, variant]
+    except KeyError:
+        raise ValueError(f"No prompt {name!r} in variant {variant!r}; variants: {', '.join(VARIANTS)}.") from None
+
+
+def _number(value):
+    return f"{value:g}" if isinstance(value, (int, float)) else str(value)
+
+
+def compact_meal(meal):
+    """The food items of a MealAnalysis on one line, for the compact agent message."""
+    return "; ".join(
+        f"{item.name} {item.kcal:.0f} kcal (P{_number(item.protein_g)} C{_number(item.carbs_g)} F{_number(item.fat_g)}, "
+        f"sugar {item.sugar}, salt {item.salt}, sat fat {item.saturated_fat})"
+        for item in meal.items
+    )
+
+
+def compact_profile(profile):
+    """The user's profile (analysis.PROFILE_FIELDS, without the name) on one line."""
+    formats = {
+        "age": "age {}", "weight": "{} kg", "height": "{} cm", "activity_level": "{} activity",
+        "dietary_preference": "{} diet", "fitness_goal": "goal {}", "tdee": "TDEE {} kcal",
+        "has_bp": "high BP {}", "has_sugar": "high blood sugar {}", "weather": "{} weather",
+    }
+    return ", ".join(
+        text.format(_number(profile[key])) for key, text in formats.items() if profile.get(key) not in (None, "")
+    )
+
+
+def usage_counts(response):
+    """Input, cached and output tokens from a Gemini response (or the last stream chunk); zeros if it has no usage."""
+    usage = tracing.usage_attributes(response)
+    return {name: usage.get(name, 0) for name in ("prompt_tokens", "cached_tokens", "output_tokens")}
+
+
+class TokenMeter:
+    """Calls and tokens per prompt (name, variant, version), as reported by the model. Thread-safe."""
+
+    def __init__(self):
+        self._totals = {}  # (name, variant, version) -> [calls, prompt, cached, output]
+        self._lock = threading.Lock()
+
+    def record(self, prompt, counts):
+        """Adds one call of ``prompt`` (a Prompt, or a (name, variant, version) tuple) with usage_counts()."""
+        key = (prompt.name, prompt.variant, prompt.version) if isinstance(prompt, Prompt) else tuple(prompt)
+        with self._lock:
+            totals = self._totals.setdefault(key, [0, 0, 0, 0])
+            totals[0] += 1
+            totals[1] += counts.get("prompt_tokens", 0)
+            totals[2] += counts.get("cached_tokens", 0)
+            totals[3] += counts.get("output_tokens", 0)
+
+    def stats(self):
+        """One row per prompt version with its calls, token totals and means per call."""
+        with self._lock:
+            items = [(key, list(totals)) for key, totals in self._totals.items()]
+        return [
+            {
+                "prompt": name, "variant": variant, "version": version, "calls": calls,
+                "input_tokens": prompt, "cached_tokens": cached, "output_tokens": output,
+                "input_per_call": prompt / calls, "output_per_call": output / calls,
+            }
+            for (name, variant, version), (calls, prompt, cached, output) in items
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_token_meter():
+    """The token meter shared by all sessions and CLI workers in this process."""
+    return TokenMeter()
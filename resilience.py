@@ -0,0 +1,199 @@
+"""
+Retries, circuit breaking and request coalescing for calls to remote APIs.
+
+- call_with_retries() retries transient failures (rate limits, 5xx, timeouts,
+  dropped connections) with exponential backoff and full jitter, so many
+  sessions failing at once don't retry in lockstep.
+- CircuitBreaker stops calling a service after repeated transient failures
+  and fails fast with CircuitOpenError until a cool-down has passed; then a
+  single trial call decides whether to close it again.
+- SingleFlight lets one caller per key do the work while concurrent callers
+  with the same key wait for it and then read its result from a cache.
+
+Errors that aren't transient (bad requests, invalid keys, parse errors) are
+raised at once and don't count against the breaker.
+"""
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = float(os.getenv("RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("RETRY_MAX_SECONDS", "8"))
+# Consecutive transient failures that open the circuit, and how long it stays open
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose circuit is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} is unavailable after repeated errors; retrying in {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+@functools.lru_cache(maxsize=None)
+def _transient_types():
+    types = [ConnectionError, TimeoutError]
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return tuple(types)
+    return tuple(types + [
+        exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.InternalServerError,
+        exceptions.BadGateway, exceptions.ServiceUnavailable, exceptions.GatewayTimeout,
+    ])
+
+
+def is_transient(error):
+    """True for errors worth retrying: rate limits, server errors, timeouts and connection drops."""
+    return isinstance(error, _transient_types())
+
+
+class RetryPolicy:
+    """Up to ``attempts`` tries; before retry n, sleeps uniform(0, min(max_delay, base_delay * 2**n))."""
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base_delay=RETRY_BASE_SECONDS, max_delay=RETRY_MAX_SECONDS):
+        self.attempts = max(attempts, 1)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive transient failures; thread-safe."""
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raises CircuitOpenError unless a call may go ahead now."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == OPEN and waited >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._trial_running:
+                # Let one trial call through; the others keep failing fast until it reports back
+                self._trial_running = True
+                return
+            raise CircuitOpenError(self.name, max(self.reset_seconds - waited, 0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit %s closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Circuit %s opened after %d failures", self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def record_neutral(self):
+        """The call failed for a non-transient reason: it says nothing about the service."""
+        with self._lock:
+            self._trial_running = False
+
+
+def call_with_retries(func, *args, policy=None, breaker=None, **kwargs):
+    """
+    Calls ``func(*args, **kwargs)``, retrying transient errors per ``policy``
+    and reporting each attempt to ``breaker``. Raises CircuitOpenError when the
+    breaker is open, or the last error once the attempts are used up.
+    """
+    policy = policy or RetryPolicy()
+    for attempt in range(policy.attempts):
+        if breaker is not None:
+            breaker.allow()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                if breaker is not None:
+                    breaker.record_neutral()
+                raise
+            if breaker is not None:
+                breaker.record_failure()
+            if attempt + 1 == policy.attempts:
+                raise
+            delay = policy.delay(attempt)
+            logger.warning("Transient error (%s), retry %d/%d in %.2f s", e, attempt + 1, policy.attempts - 1, delay)
+            time.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+class SingleFlight:
+    """Coalesces concurrent work on the same key."""
+
+    def __init__(self):
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def claim(self, key):
+        """
+        Yields True for the first caller with ``key`` (the leader, which should
+        do the work and store its result), or False for callers that arrived
+        while it was running, once the leader has finished. Followers should
+        then look for the stored result and do the work themselves if the
+        leader failed.
+        """
+        with self._lock:
+            done = self._in_flight.get(key)
+            leader = done is None
+            if leader:
+                done = self._in_flight[key] = threading.Event()
+        if not leader:
+            done.wait()
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            done.set()
+
+
+@functools.lru_cache(maxsize=None)
+def get_breaker(name):
+    """The circuit breaker for a service (e.g. a model id), shared by all sessions."""
+    return CircuitBreaker(name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_single_flight(name):
+    """The in-flight registry for one kind of request, shared by all sessions."""
+    return SingleFlight()
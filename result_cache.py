@@ -0,0 +1,180 @@
+"""
+Two-tier cache for model analysis results.
+
+Entries live in a small in-process LRU and in an on-disk SQLite table, so a
+repeat upload of the same image (and model/prompt version) is answered
+without another Gemini round-trip, even after a restart. The key doesn't
+include the profile; it is applied locally to the cached result afterwards.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_digest(image):
+    """Returns a stable hash of the decoded pixels of a PIL image.
+
+    The image is normalized to RGB first, so the same photo saved as PNG or
+    opened in a different mode still maps to the same digest.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    h = hashlib.blake2b(digest_size=20)
+    h.update(f"{image.width}x{image.height}".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def make_key(image_hash, model_id, prompt_version, context=None):
+    """Builds a cache key from the image hash, model, prompt version and user context."""
+    payload = json.dumps(
+        {
+            "image": image_hash,
+            "model": model_id,
+            "prompt": prompt_version,
+            "context": context or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """In-process LRU in front of a SQLite store with TTL and size-based eviction.
+
+    Safe to share between threads (and therefore Streamlit sessions); every
+    public method takes the same lock.
+    """
+
+    def __init__(self, path, table="analysis", max_memory_items=256, ttl_seconds=7 * 24 * 3600, max_disk_bytes=64 * 1024 * 1024):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name: {table!r}")
+        self.path = path
+        self.table = table
+        self.max_memory_items = max_memory_items
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_bytes
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory = OrderedDict()  # key -> (created, value)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+        self._conn.commit()
+
+    def _expired(self, created, now):
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Returns the cached value for ``key`` or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return entry[1]
+                del self._memory[key]
+
+            row = self._conn.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self._expired(created, now):
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, created, value)
+            self.hits_disk += 1
+            return value
+
+    def set(self, key, value):
+        """Stores ``value`` under ``key`` in both tiers and enforces the disk budget."""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._remember(key, now, value)
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """Drops expired rows, then least recently used rows until under the size budget."""
+        if self.ttl_seconds is not None:
+            cur = self._conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl_seconds,))
+            self.evictions += max(cur.rowcount, 0)
+        if self.max_disk_bytes is None:
+            return
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed ASC"):
+            if total <= self.max_disk_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+        for (key,) in victims:
+            self._memory.pop(key, None)
+        self.evictions += len(victims)
+
+    def invalidate(self, key):
+        """Removes a single entry from both tiers."""
+        with self._lock:
+            self._memory.pop(key, None)
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        """Removes every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and current sizes."""
+        with self._lock:
+            rows, size = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}").fetchone()
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": rows,
+                "disk_bytes": size,
+            }
@@ -0,0 +1,88 @@
+"""
+DuckDuckGo tools for the dietary agent with a shared, persistent result cache.
+
+Results are stored in the result-cache SQLite file (table ``web_searches``)
+keyed by the normalized query, so the same search from any session within
+the TTL is answered locally. Identical searches that are already in flight
+wait for the first one instead of hitting DuckDuckGo again.
+
+Imports agno, so only import this module where the agent is built.
+"""
+import functools
+import os
+
+from agno.tools.duckduckgo import DuckDuckGoTools
+
+from analysis import RESULT_CACHE_MAX_MB, RESULT_CACHE_PATH
+from resilience import get_single_flight
+from result_cache import ResultCache, make_key
+
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_cache():
+    """Process-wide cache of DuckDuckGo results, shared by all agents and sessions."""
+    return ResultCache(
+        RESULT_CACHE_PATH,
+        table="web_searches",
+        ttl_seconds=SEARCH_CACHE_TTL_HOURS * 3600,
+        max_disk_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024),
+    )
+
+
+def normalize_query(query):
+    """Lower-cases and collapses whitespace so trivially different queries share an entry."""
+    return " ".join(query.lower().split())
+
+
+def cached_search(kind, query, max_results, search):
+    """Returns the cached result for this search, or runs ``search()`` and stores it.
+
+    Concurrent callers with the same search wait for the first one's result.
+    """
+    cache = get_search_cache()
+    key = make_key(None, kind, 1, {"query": normalize_query(query), "max_results": max_results})
+    result = cache.get(key)
+    if result is not None:
+        return result
+
+    with get_single_flight("web_searches").claim(key) as leader:
+        if not leader:
+            result = cache.get(key)
+            # The first search failed; try on our own
+            return result if result is not None else search()
+        result = search()
+        cache.set(key, result)
+        return result
+
+
+class CachedDuckDuckGoTools(DuckDuckGoTools):
+    """`DuckDuckGoTools` whose search and news results go through the shared search cache."""
+
+    def duckduckgo_search(self, query: str, max_results: int = 5) -> str:
+        """Use this function to search DuckDuckGo for a query.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The result from DuckDuckGo.
+        """
+        full_query = f"{self.modifier} {query}" if self.modifier else query
+        limit = self.fixed_max_results or max_results
+        return cached_search("search", full_query, limit, lambda: super(CachedDuckDuckGoTools, self).duckduckgo_search(query, max_results))
+
+    def duckduckgo_news(self, query: str, max_results: int = 5) -> str:
+        """Use this function to get the latest news from DuckDuckGo.
+
+        Args:
+            query(str): The query to search for.
+            max_results (optional, default=5): The maximum number of results to return.
+
+        Returns:
+            The latest news from DuckDuckGo.
+        """
+        limit = self.fixed_max_results or max_results
+        return cached_search("news", query, limit, lambda: super(CachedDuckDuckGoTools, self).duckduckgo_news(query, max_results))
@@ -0,0 +1,295 @@
+"""
+Compact, bounded storage for the large per-session values of the app.
+
+Streamlit keeps st.session_state in memory for as long as a session lives, so
+big values there (rendered analyses, agent plans, images) add up with every
+concurrent user. The app keeps those in this store instead and only small
+records (the parsed meal, the profile, flags) in st.session_state:
+
+- Values are content-addressed and reference-counted, so the same agent plan
+  or batch analysis shown to many sessions is held once.
+- Text above SESSION_COMPRESS_MIN_BYTES is zlib-compressed.
+- Images are stored as small JPEG thumbnails, never as decoded pixels.
+- Each session is held to SESSION_MAX_KB in memory; beyond that its least
+  recently used values are spilled to disk (SESSION_SPILL_DIR) and read back
+  on demand. Sessions idle for SESSION_IDLE_SECONDS are spilled entirely, and
+  forgotten after SESSION_EXPIRY_HOURS.
+"""
+import functools
+import hashlib
+import io
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from PIL import Image, ImageOps
+
+SESSION_MAX_KB = int(os.getenv("SESSION_MAX_KB", "256"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+SESSION_EXPIRY_HOURS = float(os.getenv("SESSION_EXPIRY_HOURS", "24"))
+SESSION_SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(".cache", "sessions"))
+SESSION_COMPRESS_MIN_BYTES = int(os.getenv("SESSION_COMPRESS_MIN_BYTES", "1024"))
+# Longest side of stored image thumbnails, in pixels
+THUMBNAIL_MAX_DIMENSION = int(os.getenv("THUMBNAIL_MAX_DIMENSION", "640"))
+THUMBNAIL_QUALITY = 80
+# Idle sessions are looked for at most this often, on the next store call
+SWEEP_INTERVAL_SECONDS = 60
+
+TEXT = "text"
+COMPRESSED_TEXT = "text+zlib"
+JPEG = "jpeg"
+
+
+def make_thumbnail(image, max_dimension=THUMBNAIL_MAX_DIMENSION, quality=THUMBNAIL_QUALITY):
+    """
+    JPEG bytes of ``image`` scaled down to ``max_dimension`` and turned upright
+    per its EXIF orientation (the re-encoded thumbnail has no EXIF). A JPEG
+    that has not been loaded yet is decoded at reduced size (Image.draft), so
+    pass a freshly opened image to skip the full-resolution decode.
+    """
+    if getattr(image, "format", None) == "JPEG":
+        image.draft("RGB", (max_dimension, max_dimension))
+    thumbnail = ImageOps.exif_transpose(image)
+    thumbnail.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+    if thumbnail.mode != "RGB":
+        thumbnail = thumbnail.convert("RGB")
+    buf = io.BytesIO()
+    thumbnail.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+class _Blob:
+    __slots__ = ("data", "kind", "refs")
+
+    def __init__(self, data, kind):
+        self.data = data
+        self.kind = kind
+        self.refs = 0
+
+
+class _Entry:
+    __slots__ = ("digest", "kind", "size", "in_memory")
+
+    def __init__(self, digest, kind, size):
+        self.digest = digest
+        self.kind = kind
+        self.size = size
+        self.in_memory = True
+
+
+class _Session:
+    __slots__ = ("entries", "last_access")
+
+    def __init__(self):
+        self.entries = OrderedDict()  # name -> _Entry, least recently used first
+        self.last_access = time.time()
+
+    @property
+    def memory_bytes(self):
+        return sum(entry.size for entry in self.entries.values() if entry.in_memory)
+
+
+class SessionStore:
+    """Named text and image values per session id. Thread-safe; shared by all sessions."""
+
+    def __init__(self, spill_dir=SESSION_SPILL_DIR, max_session_bytes=SESSION_MAX_KB * 1024,
+                 idle_seconds=SESSION_IDLE_SECONDS, expiry_seconds=SESSION_EXPIRY_HOURS * 3600,
+                 compress_min_bytes=SESSION_COMPRESS_MIN_BYTES):
+        self.spill_dir = spill_dir
+        self.max_session_bytes = max_session_bytes
+        self.idle_seconds = idle_seconds
+        self.expiry_seconds = expiry_seconds
+        self.compress_min_bytes = compress_min_bytes
+        self._blobs = {}  # digest -> _Blob held in memory
+        self._disk_refs = {}  # digest -> number of spilled entries using the file
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+
+    # --- Public API ---
+
+    def set_text(self, session_id, name, text):
+        """Stores ``text`` under ``name``; None deletes it."""
+        if text is None:
+            self.delete(session_id, name)
+            return
+        data, kind = text.encode("utf-8"), TEXT
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        if len(data) >= self.compress_min_bytes:
+            data, kind = zlib.compress(data, 6), COMPRESSED_TEXT
+        self._set(session_id, name, data, kind, digest)
+
+    def get_text(self, session_id, name, default=None):
+        found = self._get(session_id, name)
+        if found is None:
+            return default
+        data, kind = found
+        return (zlib.decompress(data) if kind == COMPRESSED_TEXT else data).decode("utf-8")
+
+    def set_image(self, session_id, name, image):
+        """Stores a JPEG thumbnail of a PIL image (or already encoded JPEG bytes)."""
+        data = image if isinstance(image, bytes) else make_thumbnail(image)
+        self._set(session_id, name, data, JPEG, hashlib.blake2b(data, digest_size=20).hexdigest())
+
+    def get_image(self, session_id, name):
+        """The stored thumbnail as JPEG bytes (accepted by st.image), or None."""
+        found = self._get(session_id, name)
+        return found[0] if found is not None else None
+
+    def __contains__(self, key):
+        session_id, name = key
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session is not None and name in session.entries
+
+    def delete(self, session_id, name):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and name in session.entries:
+                self._release(session.entries.pop(name))
+
+    def drop_session(self, session_id):
+        """Forgets everything stored for a session."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                for entry in session.entries.values():
+                    self._release(entry)
+
+    def session_bytes(self, session_id):
+        """Bytes a session currently holds in memory (shared values are counted in full)."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return session.memory_bytes if session is not None else 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "memory_blobs": len(self._blobs),
+                "memory_bytes": sum(len(blob.data) for blob in self._blobs.values()),
+                "spilled_blobs": len(self._disk_refs),
+            }
+
+    def sweep(self, now=None):
+        """Spills idle sessions to disk and drops expired ones. Returns the number of sessions spilled."""
+        now = now if now is not None else time.time()
+        spilled = 0
+        with self._lock:
+            self._last_sweep = time.time()
+            for session_id, session in list(self._sessions.items()):
+                idle = now - session.last_access
+                if idle > self.expiry_seconds:
+                    del self._sessions[session_id]
+                    for entry in session.entries.values():
+                        self._release(entry)
+                elif idle > self.idle_seconds and any(e.in_memory for e in session.entries.values()):
+                    for entry in session.entries.values():
+                        self._spill(entry)
+                    spilled += 1
+        return spilled
+
+    # --- Internals (callers hold the lock unless noted) ---
+
+    def _session(self, session_id):
+        """Returns the session, creating it; sweeps idle sessions now and then. Called without the lock."""
+        if time.time() - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+            self.sweep()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session()
+            session.last_access = time.time()
+            return session
+
+    def _set(self, session_id, name, data, kind, digest):
+        session = self._session(session_id)
+        with self._lock:
+            old = session.entries.pop(name, None)
+            if old is not None:
+                self._release(old)
+            blob = self._blobs.get(digest)
+            if blob is None:
+                blob = self._blobs[digest] = _Blob(data, kind)
+            blob.refs += 1
+            session.entries[name] = _Entry(digest, kind, len(blob.data))
+            self._enforce_limit(session, keep=name)
+
+    def _get(self, session_id, name):
+        session = self._session(session_id)
+        with self._lock:
+            entry = session.entries.get(name)
+            if entry is None:
+                return None
+            session.entries.move_to_end(name)
+            if not entry.in_memory:
+                self._load(entry)
+                self._enforce_limit(session, keep=name)
+            blob = self._blobs[entry.digest]
+            return blob.data, blob.kind
+
+    def _enforce_limit(self, session, keep):
+        """Spills least recently used values until the session fits its ceiling (``keep`` always stays)."""
+        over = session.memory_bytes - self.max_session_bytes
+        for name, entry in session.entries.items():
+            if over <= 0:
+                break
+            if name != keep and entry.in_memory:
+                self._spill(entry)
+                over -= entry.size
+
+    def _path(self, digest):
+        return os.path.join(self.spill_dir, digest[:2], digest)
+
+    def _spill(self, entry):
+        if not entry.in_memory:
+            return
+        blob = self._blobs[entry.digest]
+        path = self._path(entry.digest)
+        if entry.digest not in self._disk_refs:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob.data)
+            os.replace(tmp, path)
+        self._disk_refs[entry.digest] = self._disk_refs.get(entry.digest, 0) + 1
+        entry.in_memory = False
+        self._unref_memory(entry.digest)
+
+    def _load(self, entry):
+        blob = self._blobs.get(entry.digest)
+        if blob is None:
+            with open(self._path(entry.digest), "rb") as f:
+                blob = self._blobs[entry.digest] = _Blob(f.read(), entry.kind)
+        blob.refs += 1
+        self._unref_disk(entry.digest)
+        entry.in_memory = True
+
+    def _release(self, entry):
+        if entry.in_memory:
+            self._unref_memory(entry.digest)
+        else:
+            self._unref_disk(entry.digest)
+
+    def _unref_memory(self, digest):
+        blob = self._blobs[digest]
+        blob.refs -= 1
+        if blob.refs <= 0:
+            del self._blobs[digest]
+
+    def _unref_disk(self, digest):
+        self._disk_refs[digest] -= 1
+        if self._disk_refs[digest] <= 0:
+            del self._disk_refs[digest]
+            try:
+                os.remove(self._path(digest))
+            except FileNotFoundError:
+                pass
+
+
+@functools.lru_cache(maxsize=None)
+def get_session_store():
+    """The session store shared by all Streamlit sessions in this process."""
+    return SessionStore()
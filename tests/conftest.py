@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the caches opened by the modules under test out of the working tree; set before they are imported
+CACHE_DIR = tempfile.mkdtemp()
+os.environ.setdefault("RESULT_CACHE_PATH", os.path.join(CACHE_DIR, "results.sqlite3"))
+os.environ.setdefault("HISTORY_PATH", os.path.join(CACHE_DIR, "history.sqlite3"))
+os.environ.setdefault("SESSION_SPILL_DIR", os.path.join(CACHE_DIR, "sessions"))
@@ -0,0 +1,120 @@
+"""The web-search agent as a background job (jobs.py, dietary_agent.py), driven with the stub agent of benchmarks/fakes.py."""
+import time
+
+import pytest
+
+from benchmarks.fakes import SAMPLE_PLAN, SAMPLE_RESPONSE, FakeAgent, FakeServiceError
+from clients import ClientRegistry
+from dietary_agent import AGENT_NAME, get_agent_cache, planner_request, run_dietary_planner
+from jobs import CANCELLED, DONE, FAILED, FINISHED, RUNNING, TIMED_OUT, JobRunner
+from meal_schema import parse_meal
+
+MEAL = parse_meal(SAMPLE_RESPONSE)
+PROFILE = {
+    "name": "Asha", "age": 31, "weight": 62.0, "height": 165.0, "activity_level": "Moderate",
+    "dietary_preference": "Vegetarian", "fitness_goal": "Weight Loss", "tdee": 2100,
+    "has_bp": "No", "has_sugar": "Yes", "weather": "Summer",
+}
+
+
+def agent_registry(**agent_options):
+    """A registry whose dietary agent pool hands out one stub agent with ``agent_options``."""
+    registry = ClientRegistry()
+    registry.register_agent(AGENT_NAME, lambda: FakeAgent(**agent_options), pool_size=1)
+    return registry
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.005)
+
+
+def wait_finished(runner, job_id, timeout=5.0):
+    wait_until(lambda: runner.get(job_id).status in FINISHED and runner.get(job_id).finished is not None, timeout)
+    return runner.get(job_id)
+
+
+@pytest.fixture
+def runner():
+    return JobRunner(max_workers=2, default_timeout=10)
+
+
+@pytest.fixture(autouse=True)
+def empty_agent_cache():
+    get_agent_cache().clear()
+    yield
+    get_agent_cache().clear()
+
+
+def test_result_is_delivered(runner):
+    registry = agent_registry(latency=0.01, chunk_seconds=0)
+    job = wait_finished(runner, runner.submit(run_dietary_planner, registry, MEAL, PROFILE))
+    assert job.status == DONE
+    assert job.result == job.partial == SAMPLE_PLAN
+    assert job.error is None
+
+
+def test_partial_output_is_visible_while_running(runner):
+    registry = agent_registry(latency=0, chunk_seconds=0.05, chunk_chars=10)
+    job_id = runner.submit(run_dietary_planner, registry, MEAL, PROFILE)
+    wait_until(lambda: runner.get(job_id).partial)
+    job = runner.get(job_id)
+    assert job.status == RUNNING
+    assert SAMPLE_PLAN.startswith(job.partial) and job.partial != SAMPLE_PLAN
+    assert wait_finished(runner, job_id).result == SAMPLE_PLAN
+
+
+def test_cancel_stops_the_agent_and_keeps_the_plan_out_of_the_cache(runner):
+    registry = agent_registry(latency=0, chunk_seconds=0.05, chunk_chars=10)
+    job_id = runner.submit(run_dietary_planner, registry, MEAL, PROFILE)
+    wait_until(lambda: runner.get(job_id).partial)
+    runner.cancel(job_id)
+    job = wait_finished(runner, job_id)
+    assert job.status == CANCELLED
+    assert len(job.partial) < len(SAMPLE_PLAN)
+    assert get_agent_cache().get(planner_request(MEAL, PROFILE)[1]) is None
+
+
+def test_timeout_stops_a_slow_agent(runner):
+    registry = agent_registry(latency=0, chunk_seconds=0.05, chunk_chars=10)
+    job = wait_finished(runner, runner.submit(run_dietary_planner, registry, MEAL, PROFILE, timeout=0.15))
+    assert job.status == TIMED_OUT
+    assert len(job.partial) < len(SAMPLE_PLAN)
+    assert job.elapsed < 1.0
+
+
+def test_job_that_times_out_in_the_queue_never_starts():
+    runner = JobRunner(max_workers=1, default_timeout=10)
+    registry = agent_registry(latency=0.3, chunk_seconds=0)
+    first = runner.submit(run_dietary_planner, registry, MEAL, PROFILE)
+    queued = runner.submit(run_dietary_planner, registry, MEAL, PROFILE, timeout=0.05)
+    job = wait_finished(runner, queued)
+    assert job.status == TIMED_OUT
+    assert job.started is None and job.partial == ""
+    assert wait_finished(runner, first).status == DONE
+
+
+def test_agent_error_fails_the_job(runner):
+    registry = agent_registry(latency=0, chunk_seconds=0, error_rate=1.0)
+    job = wait_finished(runner, runner.submit(run_dietary_planner, registry, MEAL, PROFILE))
+    assert job.status == FAILED
+    assert isinstance(job.error, FakeServiceError)
+
+
+def test_cached_plan_is_returned_without_running_the_agent(runner):
+    wait_finished(runner, runner.submit(run_dietary_planner, agent_registry(latency=0, chunk_seconds=0), MEAL, PROFILE))
+    # Any run of this agent would fail, so a DONE job can only come from the cache
+    failing = agent_registry(latency=0, chunk_seconds=0, error_rate=1.0)
+    job = wait_finished(runner, runner.submit(run_dietary_planner, failing, MEAL, {**PROFILE, "name": "Ravi"}))
+    assert job.status == DONE
+    assert job.result == SAMPLE_PLAN
+
+
+def test_use_cache_false_runs_the_agent_again(runner):
+    wait_finished(runner, runner.submit(run_dietary_planner, agent_registry(latency=0, chunk_seconds=0), MEAL, PROFILE))
+    failing = agent_registry(latency=0, chunk_seconds=0, error_rate=1.0)
+    job = wait_finished(runner, runner.submit(run_dietary_planner, failing, MEAL, PROFILE, use_cache=False))
+    assert job.status == FAILED
@@ -0,0 +1,221 @@
+"""Retries, the circuit breaker and request coalescing (resilience.py), against the fault-injecting fakes of benchmarks/fakes.py."""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import analysis
+from benchmarks.fakes import FakeGenerativeModel, FakeInvalidRequest, FakeServiceError
+from clients import get_registry
+from resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy, SingleFlight, call_with_retries,
+    get_breaker, get_single_flight,
+)
+
+NO_WAIT = RetryPolicy(attempts=3, base_delay=0, max_delay=0)
+
+
+def fake_model(base_latency=0.0, **options):
+    return FakeGenerativeModel(base_latency=base_latency, upload_bytes_per_s=float("inf"), **options)
+
+
+def failing_first(model, failures):
+    """generate_content of ``model`` that raises FakeServiceError on its first ``failures`` calls."""
+    calls = []
+
+    def generate_content(contents):
+        calls.append(contents)
+        if len(calls) <= failures:
+            raise FakeServiceError("injected model failure")
+        return model.generate_content(contents)
+
+    return generate_content, calls
+
+
+def open_breaker(reset_seconds=60.0):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=reset_seconds)
+    model = fake_model(error_rate=1.0)
+    for _ in range(2):
+        with pytest.raises(FakeServiceError):
+            call_with_retries(model.generate_content, ["prompt"], policy=RetryPolicy(attempts=1), breaker=breaker)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_transient_errors_are_retried_until_success():
+    generate_content, calls = failing_first(fake_model(), failures=2)
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    response = call_with_retries(generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert response.text and len(calls) == 3
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+def test_retries_stop_after_the_attempt_limit():
+    model = fake_model(error_rate=1.0)
+    with pytest.raises(FakeServiceError):
+        call_with_retries(model.generate_content, ["prompt"], policy=NO_WAIT)
+    assert model.calls == 3
+
+
+def test_permanent_errors_are_not_retried_or_counted():
+    model = fake_model(fatal_rate=1.0)
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    with pytest.raises(FakeInvalidRequest):
+        call_with_retries(model.generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert model.calls == 1
+    assert breaker.state == CLOSED and breaker.failures == 0
+
+
+@pytest.mark.parametrize("retry", range(6))
+def test_backoff_is_jittered_and_capped(retry):
+    policy = RetryPolicy(base_delay=0.5, max_delay=4)
+    delays = [policy.delay(retry) for _ in range(50)]
+    assert all(0 <= delay <= min(4, 0.5 * 2 ** retry) for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_breaker_opens_and_fails_fast():
+    breaker = open_breaker()
+    model = fake_model()
+    with pytest.raises(CircuitOpenError) as raised:
+        call_with_retries(model.generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert model.calls == 0
+    assert 0 < raised.value.retry_in <= 60
+
+
+def test_retries_stop_once_the_breaker_opens():
+    model = fake_model(error_rate=1.0)
+    breaker = CircuitBreaker("test", failure_threshold=2)
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(model.generate_content, ["prompt"], policy=RetryPolicy(attempts=5, base_delay=0), breaker=breaker)
+    assert model.calls == 2
+
+
+def test_half_open_lets_one_trial_through_and_closes_on_success():
+    breaker = open_breaker(reset_seconds=0.05)
+    time.sleep(0.06)
+    breaker.allow()  # the trial call
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()  # others fail fast while it runs
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = open_breaker(reset_seconds=0.05)
+    time.sleep(0.06)
+    model = fake_model(error_rate=1.0)
+    # The trial fails and reopens the circuit, so the retry fails fast
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(model.generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert breaker.state == OPEN and model.calls == 1
+
+
+def test_permanent_error_in_the_trial_frees_it_for_the_next_call():
+    breaker = open_breaker(reset_seconds=0.05)
+    time.sleep(0.06)
+    with pytest.raises(FakeInvalidRequest):
+        call_with_retries(fake_model(fatal_rate=1.0).generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert breaker.state == HALF_OPEN
+    call_with_retries(fake_model().generate_content, ["prompt"], policy=NO_WAIT, breaker=breaker)
+    assert breaker.state == CLOSED
+
+
+def test_single_flight_has_one_leader_and_followers_wait_for_it():
+    flight = SingleFlight()
+    leader_inside, release = threading.Event(), threading.Event()
+    order = []
+
+    def leader():
+        with flight.claim("key") as is_leader:
+            order.append(("leader", is_leader))
+            leader_inside.set()
+            release.wait(5)
+
+    def follower():
+        leader_inside.wait(5)
+        with flight.claim("key") as is_leader:
+            order.append(("follower", is_leader))
+
+    threads = [threading.Thread(target=leader)] + [threading.Thread(target=follower) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    leader_inside.wait(5)
+    time.sleep(0.05)
+    assert order == [("leader", True)]  # followers are still waiting
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == [("leader", True)] + [("follower", False)] * 3
+
+
+def test_single_flight_leader_error_is_not_raised_to_followers():
+    flight = SingleFlight()
+    leader_inside = threading.Event()
+    followers = []
+
+    def leader():
+        with flight.claim("key"):
+            leader_inside.set()
+            time.sleep(0.05)
+            raise FakeServiceError("leader failed")
+
+    def follower():
+        leader_inside.wait(5)
+        with flight.claim("key") as is_leader:
+            followers.append(is_leader)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leading = pool.submit(leader)
+        waiting = [pool.submit(follower) for _ in range(3)]
+        with pytest.raises(FakeServiceError):
+            leading.result(5)
+        for future in waiting:
+            future.result(5)
+    assert followers == [False] * 3
+    # The key is released, so the next caller leads again
+    with flight.claim("key") as is_leader:
+        assert is_leader
+
+
+@pytest.fixture
+def shared_model():
+    """The fake the analysis calls go to, behind the shared registry, with fresh breakers and in-flight registries."""
+    get_breaker.cache_clear()
+    get_single_flight.cache_clear()
+    get_registry().set_model_factory(lambda model_id, **config: fake_model(base_latency=0.2))
+    yield get_registry().get_model(analysis.MODEL_ID, generation_config=analysis.GENERATION_CONFIG)
+    get_registry().set_model_factory(None)
+    get_breaker.cache_clear()
+    get_single_flight.cache_clear()
+
+
+def noise_image(seed):
+    """A distinct image per seed, so near-duplicate lookups don't match other tests' images."""
+    pixels = np.random.default_rng(seed).integers(0, 255, (96, 128, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def test_identical_analyses_are_coalesced_into_one_model_call(shared_model):
+    image = noise_image(1)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        meals = list(pool.map(lambda _: analysis.analyze_image(image), range(4)))
+    assert shared_model.calls == 1
+    assert all(meal is not None and meal.to_json() == meals[0].to_json() for meal in meals)
+
+
+def test_followers_call_the_model_themselves_when_the_leader_fails(shared_model):
+    image = noise_image(2)
+    errors = []
+    shared_model.replay.fatal_rate = 1.0
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        results = list(pool.map(lambda _: analysis.analyze_image(image, on_error=errors.append), range(3)))
+    # Every caller got its own error rather than the leader's, and no failure was cached
+    assert results == [None] * 3
+    assert shared_model.calls == 3
+    assert len(errors) == 3
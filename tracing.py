@@ -0,0 +1,309 @@
+"""
+Lightweight per-stage timing for the app, the analysis call and the agent.
+
+Code marks its stages with ``with tracing.span("analysis.generate") as s:``
+and attaches numbers such as ``s.set(image_bytes=..., output_tokens=...)``.
+Finished spans are folded into histograms (durations and every numeric
+attribute, labelled by stage) and kept in a short ring buffer for the debug
+panel. The histograms are exported in the Prometheus text format to a file
+(METRICS_PATH) and/or an HTTP endpoint (METRICS_PORT, served at /metrics).
+
+Tracing is off unless TRACING_ENABLED=1. Disabled, span() returns one shared
+no-op object, so instrumented code costs a function call and a global lookup.
+"""
+import atexit
+import bisect
+import functools
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+# Prometheus text export: rewritten every METRICS_INTERVAL_SECONDS and at exit
+METRICS_PATH = os.getenv("METRICS_PATH", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_INTERVAL_SECONDS = float(os.getenv("METRICS_INTERVAL_SECONDS", "15"))
+# Finished spans kept for the debug panel
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "500"))
+
+METRIC_PREFIX = "food_calorie"
+# Upper bounds in seconds for stage durations, and for numeric attributes (bytes, tokens, chars)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+SIZE_BUCKETS = tuple(4 ** i for i in range(13)) + (math.inf,)
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus semantics (bucket counts are exported cumulatively)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the last finite bound for the overflow bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, seen in zip(self.bounds, itertools.accumulate(self.counts)):
+            if seen >= rank:
+                return bound if bound != math.inf else self.bounds[-2]
+        return self.bounds[-2]
+
+
+class Span:
+    """One timed stage. Use as a context manager; nested spans on a thread share a trace id."""
+
+    __slots__ = ("tracer", "name", "attributes", "trace_id", "parent", "start", "seconds", "ended")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = self.parent = None
+        self.start = self.seconds = None
+        self.ended = None
+
+    def set(self, **attributes):
+        """Attaches attributes; numeric ones are aggregated into per-stage histograms."""
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            self.parent = stack[-1].name
+            self.trace_id = stack[-1].trace_id
+        else:
+            self.trace_id = next(self.tracer._trace_ids)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.ended = time.time()
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        # Control flow such as Streamlit's st.rerun() derives from BaseException and isn't an error
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.attributes["error"] = exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Aggregates finished spans into histograms and keeps the most recent ones."""
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._trace_ids = itertools.count(1)
+        self._durations = {}  # stage -> Histogram
+        self._attributes = {}  # (attribute, stage) -> Histogram
+        self._errors = {}  # stage -> count
+        self._recent = deque(maxlen=buffer_size)
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def span(self, name, **attributes):
+        return Span(self, name, attributes)
+
+    def record(self, span):
+        with self._lock:
+            self._observe(span.name, span.seconds, span.attributes)
+            self._recent.append(span)
+
+    def observe(self, name, seconds, **attributes):
+        """Records a stage timed elsewhere (e.g. in a worker process)."""
+        with self._lock:
+            self._observe(name, seconds, attributes)
+
+    def _observe(self, name, seconds, attributes):
+        histogram = self._durations.get(name)
+        if histogram is None:
+            histogram = self._durations[name] = Histogram(DURATION_BUCKETS)
+        histogram.observe(seconds)
+        if "error" in attributes:
+            self._errors[name] = self._errors.get(name, 0) + 1
+        for key, value in attributes.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                histogram = self._attributes.get((key, name))
+                if histogram is None:
+                    histogram = self._attributes[(key, name)] = Histogram(SIZE_BUCKETS)
+                histogram.observe(value)
+
+    def snapshot(self):
+        """Per-stage summary rows for display: count, mean/p50/p95 in ms, errors, mean attributes."""
+        with self._lock:
+            rows = []
+            for name, histogram in sorted(self._durations.items()):
+                row = {
+                    "stage": name,
+                    "count": histogram.count,
+                    "mean_ms": 1000 * histogram.sum / histogram.count,
+                    "p50_ms": 1000 * histogram.quantile(0.5),
+                    "p95_ms": 1000 * histogram.quantile(0.95),
+                    "errors": self._errors.get(name, 0),
+                }
+                for (key, stage), values in sorted(self._attributes.items()):
+                    if stage == name:
+                        row[f"mean_{key}"] = values.sum / values.count
+                rows.append(row)
+            return rows
+
+    def recent(self, limit=50):
+        """The most recently finished spans, newest first."""
+        with self._lock:
+            spans = list(self._recent)[-limit:]
+        return [
+            {"trace": s.trace_id, "stage": s.name, "parent": s.parent, "ms": s.seconds * 1000,
+             "ended": s.ended, **s.attributes}
+            for s in reversed(spans)
+        ]
+
+    def render_prometheus(self):
+        """All histograms in the Prometheus text exposition format."""
+        with self._lock:
+            families = {f"{METRIC_PREFIX}_stage_seconds": [(name, h) for name, h in sorted(self._durations.items())]}
+            for (key, name), histogram in sorted(self._attributes.items()):
+                families.setdefault(f"{METRIC_PREFIX}_stage_{key}", []).append((name, histogram))
+            lines = []
+            for family, series in families.items():
+                lines.append(f"# TYPE {family} histogram")
+                for name, histogram in series:
+                    label = f'stage="{name}"'
+                    for bound, cumulative in zip(histogram.bounds, itertools.accumulate(histogram.counts)):
+                        le = "+Inf" if bound == math.inf else repr(float(bound))
+                        lines.append(f'{family}_bucket{{{label},le="{le}"}} {cumulative}')
+                    lines.append(f"{family}_sum{{{label}}} {histogram.sum!r}")
+                    lines.append(f"{family}_count{{{label}}} {histogram.count}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+            for name, count in sorted(self._errors.items()):
+                lines.append(f'{METRIC_PREFIX}_stage_errors_total{{stage="{name}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the metrics file atomically, so a scraper never reads half of it."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._attributes.clear()
+            self._errors.clear()
+            self._recent.clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_tracer():
+    """The tracer shared by all Streamlit sessions and CLI threads in this process."""
+    return Tracer()
+
+
+def span(name, **attributes):
+    """A timed stage, or the shared no-op span when tracing is disabled."""
+    if not TRACING_ENABLED:
+        return NOOP_SPAN
+    return get_tracer().span(name, **attributes)
+
+
+def observe(name, seconds, **attributes):
+    """Records a stage that was timed elsewhere; ignored when tracing is disabled."""
+    if TRACING_ENABLED:
+        get_tracer().observe(name, seconds, **attributes)
+
+
+def usage_attributes(response):
+    """Token counts from a Gemini response's usage_metadata, if it has any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+        # Part of prompt_tokens served from the backend's prefix (context) cache
+        "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0,
+    }
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_tracer().render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def start_exporter(path=METRICS_PATH, port=METRICS_PORT, interval=METRICS_INTERVAL_SECONDS):
+    """
+    Starts the configured exports once per process: a thread rewriting the
+    metrics file (also written at exit) and an HTTP server for /metrics.
+    Returns the server, or None. Does nothing while tracing is disabled.
+    """
+    if not TRACING_ENABLED:
+        return None
+    tracer = get_tracer()
+    if path:
+        def write_periodically():
+            while True:
+                time.sleep(interval)
+                tracer.write(path)
+
+        threading.Thread(target=write_periodically, name="metrics-writer", daemon=True).start()
+        atexit.register(tracer.write, path)
+    server = None
+    if port:
+        server = ThreadingHTTPServer(("", port), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server